@@ -1,8 +1,12 @@
 # Import necessary modules or packages
-# Add any imports that are required for the functionality of this package
-# For example:
-from .modules import *
-from .notebooks import *
+# Modules are resolved lazily on first attribute access (see modules/__init__.py), so
+# importing the package does no I/O and pulls in no heavy dependencies
+import importlib
+
+def __getattr__(name: str):
+  if name in ('modules', 'notebooks'):
+    return importlib.import_module(f'.{name}', __name__)
+  return getattr(importlib.import_module('.modules', __name__), name)
 
 # Define any global variables or constants if needed
 # For example:
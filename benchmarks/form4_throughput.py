@@ -0,0 +1,61 @@
+"""
+Form 4 parsing throughput in filings per second, serially and with a process pool.
+
+Replicates the sample submission in notebooks/outputs into a temporary directory under
+fresh accession numbers and parses the lot with form4.iter_filing_batches.
+
+  python benchmarks/form4_throughput.py --filings 5000 --processes 4
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+NOTEBOOKS = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'notebooks')
+sys.path.insert(0, NOTEBOOKS)
+
+from form4 import iter_filing_batches
+
+SAMPLE = os.path.join(NOTEBOOKS, 'outputs', '0000950170-24-004354.txt')
+
+
+def make_filings(directory: str, count: int) -> list:
+  with open(SAMPLE, 'r') as f:
+    text = f.read()
+  paths = []
+  for i in range(count):
+    accession = f'0000950170-24-{i:06d}'
+    path = os.path.join(directory, f'{accession}.txt')
+    with open(path, 'w') as f:
+      f.write(text.replace('0000950170-24-004354', accession))
+    paths.append(path)
+  return paths
+
+
+def throughput(paths: list, processes: int, batch_size: int) -> tuple:
+  start = time.perf_counter()
+  rows = sum(len(batch) for batch in iter_filing_batches(paths, processes, batch_size))
+  return len(paths) / (time.perf_counter() - start), rows
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument('--filings', type=int, default=5000)
+  parser.add_argument('--processes', type=int, default=os.cpu_count())
+  parser.add_argument('--batch-size', type=int, default=256)
+  args = parser.parse_args()
+
+  directory = tempfile.mkdtemp(prefix='form4-bench-')
+  try:
+    paths = make_filings(directory, args.filings)
+    for processes in sorted({1, args.processes}):
+      rate, rows = throughput(paths, processes, args.batch_size)
+      print(f'{processes:>3} process(es): {rate:10.0f} filings/s  ({rows} transaction rows)')
+  finally:
+    shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,72 @@
+"""
+Per-call latency of a fresh connection per request versus ImportData's pooled keep-alive session.
+
+Runs against a local HTTP/1.1 stand-in server that answers with a gzipped AlphaVantage-sized
+JSON body, so only connection setup and transfer differ between the two paths.
+
+  python benchmarks/http_session.py --calls 500 --workers 10
+"""
+import argparse
+import gzip
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'notebooks'))
+
+import requests as req
+from data_collection import ImportData
+
+PAYLOAD = gzip.compress(json.dumps({'Time Series (Daily)': {f'2024-01-{day:02d}': {'4. close': '100.0'} for day in range(1, 29)}}).encode())
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+  protocol_version = 'HTTP/1.1'
+  disable_nagle_algorithm = True
+
+  def do_GET(self):
+    self.send_response(200)
+    self.send_header('Content-Type', 'application/json')
+    self.send_header('Content-Encoding', 'gzip')
+    self.send_header('Content-Length', str(len(PAYLOAD)))
+    self.end_headers()
+    self.wfile.write(PAYLOAD)
+
+  def log_message(self, *args):
+    pass
+
+
+def time_calls(call, calls: int, workers: int) -> float:
+  # Mean wall time per call with the given concurrency
+  start = time.perf_counter()
+  with ThreadPoolExecutor(max_workers=workers) as executor:
+    list(executor.map(lambda _: call(), range(calls)))
+  return (time.perf_counter() - start) / calls
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument('--calls', type=int, default=500)
+  parser.add_argument('--workers', type=int, default=10)
+  args = parser.parse_args()
+
+  server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+  threading.Thread(target=server.serve_forever, daemon=True).start()
+  url = f'http://127.0.0.1:{server.server_port}/'
+
+  importer = ImportData(url, 'bench', params={'function': 'TIME_SERIES_DAILY'}, extension='query', max_workers=args.workers)
+  fresh = time_calls(lambda: req.get(url + 'query', params={'function': 'TIME_SERIES_DAILY'}).json(), args.calls, args.workers)
+  pooled = time_calls(lambda: importer.session.get(url + 'query', params=importer.params).json(), args.calls, args.workers)
+
+  print(f'fresh connection per call: {fresh * 1e3:.3f} ms/call')
+  print(f'pooled keep-alive session: {pooled * 1e3:.3f} ms/call')
+  print(f'reduction: {(1 - pooled / fresh) * 100:.1f}%')
+  server.shutdown()
+
+
+if __name__ == '__main__':
+  main()
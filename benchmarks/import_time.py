@@ -0,0 +1,57 @@
+"""
+Import-time budget for the package and the data collection module, measured with
+python -X importtime in a fresh interpreter whose sockets refuse to connect.
+
+Exits non-zero when an import goes over budget or tries to reach the network.
+
+  python benchmarks/import_time.py --repeat 5
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# (module, directory it is imported from, budget in milliseconds)
+TARGETS = [
+  ('modules', ROOT, 100),
+  ('data_collection', os.path.join(ROOT, 'notebooks'), 1500),
+]
+
+# Any connection attempt during import fails the measurement
+NO_NETWORK = "import socket\ndef refuse(*args, **kwargs): raise OSError('network access during import')\nsocket.socket.connect = refuse\nsocket.create_connection = refuse\n"
+
+LINE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \| (\S+)$')
+
+
+def measure(module: str, directory: str) -> float:
+  # Cumulative import time of the module in milliseconds, from a fresh interpreter
+  code = NO_NETWORK + f'import sys\nsys.path.insert(0, {os.path.abspath(directory)!r})\nimport {module}\n'
+  result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], capture_output=True, text=True, cwd=os.path.abspath(os.sep))
+  if result.returncode != 0:
+    raise RuntimeError(f'import {module} failed:\n{result.stderr[-2000:]}')
+  for line in result.stderr.splitlines():
+    match = LINE.match(line)
+    if match and match.group(3) == module:
+      return int(match.group(2)) / 1e3
+  raise RuntimeError(f'no importtime line for {module}')
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument('--repeat', type=int, default=3, help='runs per target, the best is kept')
+  args = parser.parse_args()
+
+  over_budget = False
+  for module, directory, budget in TARGETS:
+    best = min(measure(module, directory) for _ in range(args.repeat))
+    status = 'ok' if best <= budget else 'OVER BUDGET'
+    over_budget |= best > budget
+    print(f'{module:<20} {best:8.1f} ms  (budget {budget} ms)  {status}')
+  sys.exit(1 if over_budget else 0)
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,100 @@
+"""
+Local indicator engine against the per-call AlphaVantage path for SMA, EMA, RSI and BBANDS.
+
+Computes every indicator and window of indicators.DEFAULT_WINDOWS for a synthetic panel in one
+compute_indicators pass, then times a sample of the equivalent per ticker, indicator and window
+calls through ImportData against a local stand-in server answering with AlphaVantage-sized
+indicator payloads. The API path is reported both unthrottled and at the plan's quota.
+
+  python benchmarks/indicators.py --tickers 500 --days 2500 --sample-calls 200
+"""
+import argparse
+import gzip
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'notebooks'))
+
+from data_collection import AlphaVantageDatasets, ImportData
+from indicators import DEFAULT_WINDOWS, compute_indicators, indicator_columns
+
+
+def make_panel(tickers: int, days: int, seed: int = 0) -> pd.DataFrame:
+  rng = np.random.default_rng(seed)
+  dates = pd.bdate_range(end='2024-12-31', periods=days)
+  closes = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, (days, tickers)), axis=0))
+  return pd.DataFrame({'Ticker': np.tile([f'T{i:04d}' for i in range(tickers)], days),
+                       'Date': np.repeat(dates, tickers),
+                       'Close': closes.ravel()})
+
+
+def make_payload(days: int) -> bytes:
+  dates = pd.bdate_range(end='2024-12-31', periods=days).strftime('%Y-%m-%d')
+  return gzip.compress(json.dumps({'Meta Data': {'1: Symbol': 'T0000', '5: Time Period': 50},
+                                   'Technical Analysis: EMA': {date: {'EMA': '100.0000'} for date in dates}}).encode())
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument('--tickers', type=int, default=500)
+  parser.add_argument('--days', type=int, default=2500)
+  parser.add_argument('--sample-calls', type=int, default=200)
+  parser.add_argument('--workers', type=int, default=8)
+  args = parser.parse_args()
+
+  panel = make_panel(args.tickers, args.days)
+  start = time.perf_counter()
+  local = compute_indicators(panel)
+  local_seconds = time.perf_counter() - start
+  calls = args.tickers * sum(len(windows) for windows in DEFAULT_WINDOWS.values())
+  columns = sum(len(indicator_columns(indicator, window)) for indicator, windows in DEFAULT_WINDOWS.items() for window in windows)
+  print(f'local:  {local_seconds:8.2f} s for {args.tickers} tickers x {columns} columns ({local.shape[0]} rows)')
+
+  payload = make_payload(args.days)
+
+  class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+      self.send_response(200)
+      self.send_header('Content-Type', 'application/json')
+      self.send_header('Content-Encoding', 'gzip')
+      self.send_header('Content-Length', str(len(payload)))
+      self.end_headers()
+      self.wfile.write(payload)
+
+    def log_message(self, *args):
+      pass
+
+  server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+  threading.Thread(target=server.serve_forever, daemon=True).start()
+  directory = tempfile.mkdtemp(prefix='indicators-bench-')
+  try:
+    importer = ImportData(f'http://127.0.0.1:{server.server_port}/', 'bench', params={'function': 'EMA', 'interval': 'daily', 'time_period': 50, 'series_type': 'close'}, extension='query', max_workers=args.workers)
+    importer.DATA_FILEPATH = directory + '/'
+    symbols = [f'T{i:04d}' for i in range(args.sample_calls)]
+    start = time.perf_counter()
+    importer.download_datasets('symbol', symbols)
+    per_call = (time.perf_counter() - start) / len(symbols)
+  finally:
+    server.shutdown()
+    shutil.rmtree(directory)
+
+  quota_seconds = calls / AlphaVantageDatasets.AV_CALLS_PER_MINUTE * 60
+  print(f'API:    {per_call * calls:8.2f} s for {calls} calls unthrottled ({per_call * 1e3:.2f} ms/call over {args.sample_calls} sampled)')
+  print(f'API:    {quota_seconds:8.0f} s at {AlphaVantageDatasets.AV_CALLS_PER_MINUTE} calls/minute')
+  print(f'speedup: {per_call * calls / local_seconds:.0f}x unthrottled, {quota_seconds / local_seconds:.0f}x at quota')
+
+
+if __name__ == '__main__':
+  main()
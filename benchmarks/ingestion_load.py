@@ -0,0 +1,76 @@
+"""
+Offline load test of the ingestion pipeline against the local mock API.
+
+Pulls daily series for --tickers synthetic tickers through AlphaVantageDatasets.get_daily_batch
+(rate limiter, retries, per ticker upserts) and parses the written files with
+load_daily_prices, then pulls the live insider window through QuiverDatasets into an
+InsiderStore. Latency, throttling and errors are injected by the mock server.
+
+  python benchmarks/ingestion_load.py --tickers 2000 --days 5040 --latency 0.02 --error-rate 0.01
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'notebooks'))
+
+from data_collection import AlphaVantageDatasets, ImportData, QuiverDatasets
+from insider_store import InsiderStore
+from mock_api import MockApiServer
+from prices import load_daily_prices
+from synthetic import ticker_symbols
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument('--tickers', type=int, default=500)
+  parser.add_argument('--days', type=int, default=5040)
+  parser.add_argument('--outputsize', default='full')
+  parser.add_argument('--workers', type=int, default=8)
+  parser.add_argument('--client-calls-per-minute', type=float, default=1e6)
+  parser.add_argument('--latency', type=float, default=0.0)
+  parser.add_argument('--jitter', type=float, default=0.0)
+  parser.add_argument('--calls-per-minute', type=float, default=None, help='Server side quota')
+  parser.add_argument('--throttle-rate', type=float, default=0.0)
+  parser.add_argument('--error-rate', type=float, default=0.0)
+  parser.add_argument('--processes', type=int, default=None, help='Parse the price files in a process pool')
+  args = parser.parse_args()
+
+  directory = tempfile.mkdtemp(prefix='ingestion-load-')
+  data_filepath = ImportData.DATA_FILEPATH
+  ImportData.DATA_FILEPATH = directory + '/'
+  try:
+    with MockApiServer(days=args.days, latency=args.latency, jitter=args.jitter, calls_per_minute=args.calls_per_minute,
+                       throttle_rate=args.throttle_rate, error_rate=args.error_rate) as server:
+      av = AlphaVantageDatasets(api_key='load-test', base_url=server.url, calls_per_minute=args.client_calls_per_minute,
+                                max_workers=args.workers, sync_state_file=os.path.join(directory, 'sync_state.json'))
+      tickers = list(ticker_symbols(args.tickers))
+      start = time.perf_counter()
+      av.get_daily_batch(tickers, outputsize=args.outputsize)
+      seconds = time.perf_counter() - start
+      files = [os.path.join(directory, name) for name in os.listdir(directory) if name.startswith('av_query_')]
+      written = sum(os.path.getsize(file) for file in files)
+      print(f'daily pull:  {seconds:8.2f} s, {len(files) / seconds:8.1f} tickers/s, {written / seconds / 2**20:6.1f} MB/s written, '
+            f'{args.tickers - len(files)} failed')
+      print(f'server:      {dict(server.counts)}')
+
+      start = time.perf_counter()
+      prices = load_daily_prices(directory, args.processes)
+      seconds = time.perf_counter() - start
+      print(f'parse:       {seconds:8.2f} s, {len(prices) / seconds:12,.0f} bars/s')
+
+      with InsiderStore(os.path.join(directory, 'insiders.sqlite')) as store:
+        qq = QuiverDatasets(api_key='load-test', base_url=server.url, insider_store=store)
+        start = time.perf_counter()
+        live = qq.get_live_insider_set()
+        print(f'live pull:   {time.perf_counter() - start:8.2f} s for {len(live)} trades, {len(store)} stored')
+  finally:
+    ImportData.DATA_FILEPATH = data_filepath
+    shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+  main()
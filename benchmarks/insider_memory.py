@@ -0,0 +1,80 @@
+"""
+Memory footprint of a Quiver insider history loaded the old way (object strings, float64)
+against insider_schema.read_insiders, per column and in total.
+
+Writes a synthetic multi-year insider CSV with a realistic number of distinct tickers and
+insiders to a temporary directory and loads it both ways.
+
+  python benchmarks/insider_memory.py --rows 2000000
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'notebooks'))
+
+from insider_schema import memory_report, read_insiders
+
+
+def make_insiders(path: str, rows: int, tickers: int, names: int, seed: int = 0) -> None:
+  rng = np.random.default_rng(seed)
+  dates = pd.Timestamp('2016-01-01') + pd.to_timedelta(rng.integers(0, 8 * 365, rows), unit='D')
+  pd.DataFrame({
+    'Date': dates.strftime('%Y-%m-%d'),
+    'Ticker': rng.choice([f'T{i:04d}' for i in range(tickers)], rows),
+    'Name': rng.choice([f'Insider Number {i}' for i in range(names)], rows),
+    'AcquiredDisposedCode': rng.choice(['A', 'D'], rows),
+    'TransactionCode': rng.choice(list('PSAMGFC'), rows),
+    'Shares': rng.integers(1, 10**6, rows).astype(float),
+    'PricePerShare': np.round(rng.lognormal(3, 1, rows), 2),
+    'SharesOwnedFollowing': rng.integers(0, 10**7, rows).astype(float),
+    'fileDate': (dates + pd.Timedelta(days=2)).strftime('%Y-%m-%d'),
+  }).to_csv(path)
+
+
+def read_legacy(path: str) -> pd.DataFrame:
+  # What format_qq_insiders did before the compact schema
+  df = pd.read_csv(path)
+  df.dropna(axis=0, inplace=True)
+  df['Date'] = pd.to_datetime(df['Date'])
+  df['Ticker'] = df['Ticker'].astype(str)
+  df['Name'] = df['Name'].astype(str).str.lower()
+  df['fileDate'] = pd.to_datetime(df['fileDate'])
+  df.drop(columns=['Unnamed: 0'], inplace=True)
+  return df
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument('--rows', type=int, default=2_000_000)
+  parser.add_argument('--tickers', type=int, default=5000)
+  parser.add_argument('--names', type=int, default=60000)
+  args = parser.parse_args()
+
+  directory = tempfile.mkdtemp(prefix='insider-memory-')
+  try:
+    path = os.path.join(directory, 'qq_insiders.csv')
+    make_insiders(path, args.rows, args.tickers, args.names)
+    start = time.perf_counter()
+    before = read_legacy(path)
+    legacy_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    after = read_insiders(path)
+    compact_seconds = time.perf_counter() - start
+  finally:
+    shutil.rmtree(directory)
+
+  report = memory_report(before, after)
+  report[['bytes_before', 'bytes_after']] = report[['bytes_before', 'bytes_after']] / 2**20
+  print(report.rename(columns={'bytes_before': 'MiB_before', 'bytes_after': 'MiB_after'}).round(2).to_string())
+  print(f'\nload: {legacy_seconds:.2f}s legacy, {compact_seconds:.2f}s compact')
+
+
+if __name__ == '__main__':
+  main()
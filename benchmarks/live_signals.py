@@ -0,0 +1,116 @@
+"""
+Poll to signal latency of the live signal daemon against a local stand-in for the Quiver
+live insider endpoint.
+
+The stand-in serves a rolling window of synthetic filings, adding a few new ones every
+--change-every requests, and answers conditional requests carrying the current ETag with 304.
+The daemon polls it with a small fitted tree as the model and a JSONL sink in a temporary
+directory.
+
+  python benchmarks/live_signals.py --polls 200 --interval 0.02 --window 1000
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import numpy as np
+import pandas as pd
+from sklearn.tree import DecisionTreeRegressor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'notebooks'))
+
+from live_signals import JsonlSink, LiveSignalDaemon
+from training import FEATURE_COLUMNS
+
+
+class LiveWindow:
+  # A rolling live window of synthetic filings, advanced every change_every requests
+
+  def __init__(self, window: int, change_every: int, new_per_change: int, seed: int = 0):
+    self.rng = np.random.default_rng(seed)
+    self.window = window
+    self.change_every = change_every
+    self.new_per_change = new_per_change
+    self.requests = 0
+    self.filed = pd.Timestamp('2024-06-03 09:00:00')
+    self.records = []
+    self.lock = threading.Lock()
+    self.add(window)
+
+  def add(self, count: int) -> None:
+    for _ in range(count):
+      self.filed += pd.Timedelta(seconds=int(self.rng.integers(1, 600)))
+      self.records.append({'Ticker': f'T{self.rng.integers(0, 500):03d}', 'Name': f'insider {self.rng.integers(0, 5000)}',
+                           'Date': (self.filed - pd.Timedelta(days=2)).strftime('%Y-%m-%d'),
+                           'fileDate': self.filed.strftime('%Y-%m-%dT%H:%M:%S'),
+                           'TransactionCode': str(self.rng.choice(['P', 'S'])), 'AcquiredDisposedCode': 'A',
+                           'Shares': float(self.rng.integers(1, 100_000)), 'PricePerShare': round(float(self.rng.uniform(1, 500)), 2),
+                           'SharesOwnedFollowing': float(self.rng.integers(0, 1_000_000))})
+    self.records = self.records[-self.window:]
+    self.body = json.dumps(self.records).encode()
+    self.etag = '"' + hashlib.md5(self.body).hexdigest() + '"'
+
+  def respond(self, etag: str) -> tuple:
+    with self.lock:
+      self.requests += 1
+      if self.requests % self.change_every == 0:
+        self.add(self.new_per_change)
+      return (304, b'', self.etag) if etag == self.etag else (200, self.body, self.etag)
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument('--polls', type=int, default=200)
+  parser.add_argument('--interval', type=float, default=0.02)
+  parser.add_argument('--window', type=int, default=1000)
+  parser.add_argument('--change-every', type=int, default=5)
+  parser.add_argument('--new-per-change', type=int, default=3)
+  args = parser.parse_args()
+
+  live = LiveWindow(args.window, args.change_every, args.new_per_change)
+
+  class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+      status, body, etag = live.respond(self.headers.get('If-None-Match'))
+      self.send_response(status)
+      self.send_header('ETag', etag)
+      self.send_header('Content-Type', 'application/json')
+      self.send_header('Content-Length', str(len(body)))
+      self.end_headers()
+      self.wfile.write(body)
+
+    def log_message(self, *args):
+      pass
+
+  server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+  threading.Thread(target=server.serve_forever, daemon=True).start()
+  directory = tempfile.mkdtemp(prefix='live-signals-bench-')
+  try:
+    rng = np.random.default_rng(1)
+    model = DecisionTreeRegressor(max_depth=8).fit(rng.random((5000, len(FEATURE_COLUMNS))), rng.random(5000))
+    sink = JsonlSink(os.path.join(directory, 'signals.jsonl'))
+    daemon = LiveSignalDaemon(model, sink, api_key='bench', base_url=f'http://127.0.0.1:{server.server_port}/', interval=args.interval)
+    # The first poll takes in the whole window; only later polls are live traffic
+    asyncio.run(daemon.run(polls=1))
+    daemon.latencies.clear()
+    asyncio.run(daemon.run(polls=args.polls - 1))
+    sink.close()
+    for key, value in daemon.stats().items():
+      print(f'{key:16} {value:10.2f}' if isinstance(value, float) else f'{key:16} {value:10d}')
+  finally:
+    server.shutdown()
+    shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,200 @@
+"""
+Local stand-in for the QuiverQuant and AlphaVantage endpoints the ingestion code calls, with
+configurable latency, throttling and error injection.
+
+Serves synthetic payloads from synthetic.py on demand:
+  GET /query?function=TIME_SERIES_DAILY|TIME_SERIES_DAILY_ADJUSTED&symbol=...&outputsize=compact|full
+  GET /query?function=SMA|EMA|RSI|BBANDS&symbol=...&time_period=...
+  GET /query?function=OVERVIEW&symbol=...
+  GET /beta/live/insiders        The latest --live-window trades of a synthetic feed
+
+AlphaVantage throttling is answered as AlphaVantage does, with 200 and a 'Note' body, and
+Quiver throttling with 429. Injected errors are 500s. Run standalone and point a base_url at it:
+
+  python benchmarks/mock_api.py --port 8000 --latency 0.05 --calls-per-minute 75 --error-rate 0.01
+"""
+import argparse
+import collections
+import functools
+import gzip
+import json
+import random
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+import synthetic
+
+INDICATOR_FUNCTIONS = ('SMA', 'EMA', 'RSI', 'BBANDS')
+THROTTLE_NOTE = ('Thank you for using Alpha Vantage! Our standard API rate limit is 25 requests per day. '
+                 'Please subscribe to any of the premium plans to instantly remove all daily rate limits.')
+
+
+class MockApiServer:
+  """
+  Threaded HTTP server answering AlphaVantage and Quiver style requests with synthetic data.
+
+  Encoded payloads are memoized per request, so after the first call to a ticker the server
+  costs little more than the socket write and the measured throughput is the client's.
+
+  Args:
+    port (int): Port to listen on. 0 picks a free one; see url.
+    days (int): Bars in a full daily history, e.g. 5040 for 20 years.
+    latency (float): Seconds added before every response.
+    jitter (float): Extra uniform random latency, up to this many seconds.
+    calls_per_minute (float, optional): Quota over a sliding minute. Calls beyond it are throttled.
+    throttle_rate (float): Share of calls throttled at random, regardless of the quota.
+    error_rate (float): Share of calls answered with a 500.
+    live_window (int): Trades in the live insider window.
+    live_rate (float): New live filings per second, so polls see the window move.
+    seed (int): Seed of the synthetic data and the injected faults.
+    cache_size (int): Encoded payloads kept for reuse.
+  """
+
+  def __init__(self, port: int = 0, days: int = 5040, latency: float = 0.0, jitter: float = 0.0, calls_per_minute: float = None, throttle_rate: float = 0.0, error_rate: float = 0.0, live_window: int = 1000, live_rate: float = 1.0, seed: int = 0, cache_size: int = 4096):
+    self.days = days
+    self.latency = latency
+    self.jitter = jitter
+    self.calls_per_minute = calls_per_minute
+    self.throttle_rate = throttle_rate
+    self.error_rate = error_rate
+    self.live_window = live_window
+    self.live_rate = live_rate
+    self.seed = seed
+    self.random = random.Random(seed)
+    self.lock = threading.Lock()
+    self.calls = collections.deque()
+    self.counts = collections.Counter()
+    self.started = time.time()
+    self.live = synthetic.live_insider_records(synthetic.insider_trades(live_window + int(live_rate * 86400), tickers=2000, start='2024-01-01', seed=seed))
+    self.payload = functools.lru_cache(maxsize=cache_size)(self.encode)
+    self.server = ThreadingHTTPServer(('127.0.0.1', port), self.handler())
+    self.server.daemon_threads = True
+    self.thread = None
+
+  @property
+  def url(self) -> str:
+    return f'http://127.0.0.1:{self.server.server_port}/'
+
+  def start(self) -> 'MockApiServer':
+    self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+    self.thread.start()
+    return self
+
+  def shutdown(self) -> None:
+    self.server.shutdown()
+    self.server.server_close()
+
+  def __enter__(self):
+    return self.start()
+
+  def __exit__(self, *args):
+    self.shutdown()
+
+  def fault(self) -> str:
+    # 'error', 'throttled' or None for the next call, counting it against the quota
+    with self.lock:
+      now = time.monotonic()
+      self.counts['calls'] += 1
+      if self.random.random() < self.error_rate:
+        self.counts['errors'] += 1
+        return 'error'
+      while self.calls and self.calls[0] <= now - 60:
+        self.calls.popleft()
+      over_quota = self.calls_per_minute is not None and len(self.calls) >= self.calls_per_minute
+      if over_quota or self.random.random() < self.throttle_rate:
+        self.counts['throttled'] += 1
+        return 'throttled'
+      self.calls.append(now)
+      return None
+
+  def live_records(self) -> list:
+    # The window of the feed as of now, advancing by live_rate filings per second
+    end = min(len(self.live), self.live_window + int((time.time() - self.started) * self.live_rate))
+    return self.live[end - self.live_window:end]
+
+  def encode(self, path: str, function: str, symbol: str, outputsize: str, time_period: int) -> bytes:
+    # The gzipped JSON body of a request, None for unknown requests
+    if path == '/query':
+      if function in ('TIME_SERIES_DAILY', 'TIME_SERIES_DAILY_ADJUSTED'):
+        body = synthetic.av_daily_payload(symbol, self.days, outputsize, function.endswith('ADJUSTED'), seed=self.seed)
+      elif function in INDICATOR_FUNCTIONS:
+        body = synthetic.av_indicator_payload(function, symbol, self.days, time_period, seed=self.seed)
+      elif function == 'OVERVIEW':
+        body = synthetic.av_overview_payload(symbol, self.seed)
+      else:
+        body = {'Error Message': f'Invalid API call. Unknown function {function}.'}
+    else:
+      return None
+    return gzip.compress(json.dumps(body).encode(), compresslevel=1)
+
+  def respond(self, path: str, query: dict) -> tuple:
+    # Status and gzipped body of one request, after the configured delay and faults
+    delay = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0.0)
+    if delay:
+      time.sleep(delay)
+    fault = self.fault()
+    quiver = path.startswith('/beta/')
+    if fault == 'error':
+      return 500, gzip.compress(b'Internal Server Error')
+    if fault == 'throttled':
+      if quiver:
+        return 429, gzip.compress(b'Too Many Requests')
+      return 200, gzip.compress(json.dumps({'Note': THROTTLE_NOTE}).encode())
+    if path == '/beta/live/insiders':
+      return 200, gzip.compress(json.dumps(self.live_records()).encode(), compresslevel=1)
+    body = self.payload(path, query.get('function'), query.get('symbol'), query.get('outputsize', 'compact'), int(query.get('time_period', 50)))
+    if body is None:
+      return 404, gzip.compress(b'Not Found')
+    return 200, body
+
+  def handler(self):
+    server = self
+
+    class MockHandler(BaseHTTPRequestHandler):
+      protocol_version = 'HTTP/1.1'
+      disable_nagle_algorithm = True
+
+      def do_GET(self):
+        url = urlparse(self.path)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        status, body = server.respond(url.path, query)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+      def log_message(self, *args):
+        pass
+
+    return MockHandler
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument('--port', type=int, default=8000)
+  parser.add_argument('--days', type=int, default=5040)
+  parser.add_argument('--latency', type=float, default=0.0)
+  parser.add_argument('--jitter', type=float, default=0.0)
+  parser.add_argument('--calls-per-minute', type=float, default=None)
+  parser.add_argument('--throttle-rate', type=float, default=0.0)
+  parser.add_argument('--error-rate', type=float, default=0.0)
+  parser.add_argument('--live-window', type=int, default=1000)
+  parser.add_argument('--live-rate', type=float, default=1.0)
+  parser.add_argument('--seed', type=int, default=0)
+  args = parser.parse_args()
+
+  server = MockApiServer(args.port, args.days, args.latency, args.jitter, args.calls_per_minute, args.throttle_rate,
+                         args.error_rate, args.live_window, args.live_rate, args.seed)
+  print(f'Serving on {server.url}')
+  try:
+    server.server.serve_forever()
+  except KeyboardInterrupt:
+    print(dict(server.counts))
+
+
+if __name__ == '__main__':
+  main()
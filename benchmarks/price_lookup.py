@@ -0,0 +1,70 @@
+"""
+Price lookups per second: one .loc[(ticker, date)] per call, as get_price did, against
+batched PriceIndex.lookup calls for each side.
+
+Builds a synthetic (Ticker, Date) panel of business-day closes and draws random queries,
+a share of which land on weekends or unknown tickers and miss.
+
+  python benchmarks/price_lookup.py --tickers 2000 --days 2500 --queries 1000000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'notebooks'))
+
+from price_index import PriceIndex, SIDES
+
+
+def make_panel(tickers: int, days: int, seed: int = 0) -> pd.DataFrame:
+  rng = np.random.default_rng(seed)
+  dates = pd.bdate_range(end='2024-12-31', periods=days)
+  return pd.DataFrame({'Close': rng.random(tickers * days)},
+                      index=pd.MultiIndex.from_product([[f'T{i:04d}' for i in range(tickers)], dates], names=['Ticker', 'Date']))
+
+
+def get_price(panel: pd.DataFrame, ticker, date):
+  # The per call lookup the preprocessing classes and notebook 03 used
+  try:
+    return panel.loc[(ticker, pd.to_datetime(date)), 'Close']
+  except KeyError:
+    return np.nan
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument('--tickers', type=int, default=2000)
+  parser.add_argument('--days', type=int, default=2500)
+  parser.add_argument('--queries', type=int, default=1_000_000)
+  parser.add_argument('--loc-queries', type=int, default=1000)
+  args = parser.parse_args()
+
+  panel = make_panel(args.tickers, args.days)
+  rng = np.random.default_rng(1)
+  tickers = rng.choice([f'T{i:04d}' for i in range(int(args.tickers * 1.05))], args.queries)
+  first = panel.index.get_level_values('Date')[0]
+  dates = first + pd.to_timedelta(rng.integers(0, int(args.days * 1.4), args.queries), unit='D')
+
+  start = time.perf_counter()
+  index = PriceIndex(panel)
+  print(f'build:          {time.perf_counter() - start:8.3f} s for {len(index)} bars')
+
+  start = time.perf_counter()
+  for ticker, date in zip(tickers[:args.loc_queries], dates[:args.loc_queries]):
+    get_price(panel, ticker, date)
+  rate = args.loc_queries / (time.perf_counter() - start)
+  print(f'.loc per call:  {rate:12,.0f} lookups/s')
+
+  for side in SIDES:
+    start = time.perf_counter()
+    prices = index.lookup(tickers, dates, side=side, tolerance=3 if side != 'exact' else None)
+    rate = args.queries / (time.perf_counter() - start)
+    print(f'{side + " batch:":15} {rate:12,.0f} lookups/s  ({np.isnan(prices).mean():.0%} missed)')
+
+
+if __name__ == '__main__':
+  main()
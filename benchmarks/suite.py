@@ -0,0 +1,311 @@
+"""
+Benchmark suite over the heavy stages of the pipeline, ingest to evaluation, on synthetic
+inputs of any size.
+
+Each stage runs at every --sizes row count. Wall time is the best of up to --repeat runs,
+and peak memory is measured on one extra run under tracemalloc, so it counts Python and NumPy
+allocations but not Arrow buffers. Every measurement is appended to a JSON lines history,
+and a stage is flagged as a regression when its time or peak memory exceeds the median of
+its last --baseline-runs recorded runs on this host by more than --threshold. Slowdowns of
+less than --min-delta seconds are never flagged, as millisecond stages jitter by more than
+any threshold.
+
+  python benchmarks/suite.py --sizes 1000 100000 1000000 --stages combine_data new_attributes
+  python benchmarks/suite.py --sizes 10000000 --repeat 1 --fail-on-regression
+"""
+import argparse
+import contextlib
+import datetime
+import gc
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+BENCHMARK_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARK_DIRECTORY, '..', 'notebooks'))
+sys.path.insert(0, os.path.join(BENCHMARK_DIRECTORY, '..', 'modules', 'model-testing'))
+
+from combine import CombineFrames as MergeFrames
+from evaluate_model import ModelTest
+from preprocess import CombineFrames, FormatData
+from price_store import PriceStore
+from transform import NewAttributeCreator
+import synthetic
+
+HISTORY_FILEPATH = os.path.join(BENCHMARK_DIRECTORY, 'history.jsonl')
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+
+# Bars per synthetic ticker, about ten years of trading days
+TICKER_DAYS = 2520
+
+# Smallest slowdown in seconds flagged as a regression, above timer and scheduler noise
+MIN_TIME_DELTA = 0.01
+
+
+def write_av_files(directory: str, rows: int, seed: int = 0) -> None:
+  # av_query_<TICKER>.csv files as ImportData writes them, totalling about rows bars
+  os.makedirs(directory, exist_ok=True)
+  days = min(rows, TICKER_DAYS)
+  for ticker in synthetic.ticker_symbols(max(1, rows // days)):
+    payload = synthetic.av_daily_payload(ticker, days, 'full', seed=seed)
+    pd.DataFrame(payload).to_csv(os.path.join(directory, f'av_query_{ticker}.csv'), index=True)
+
+
+def price_universe(rows: int, seed: int = 0) -> pd.DataFrame:
+  # A (Ticker, Date) panel of about rows bars with the trade universe's ticker symbols
+  days = min(rows, TICKER_DAYS)
+  return synthetic.daily_panel(max(1, rows // days), days, seed=seed)
+
+
+def trades_on(panel: pd.DataFrame, rows: int, seed: int = 0) -> pd.DataFrame:
+  # Insider trades on the panel's tickers, dated within its history
+  dates = panel.index.get_level_values('Date')
+  tickers = panel.index.get_level_values('Ticker').nunique()
+  return synthetic.insider_trades(rows, tickers, start=dates.min(), end=dates.max(), seed=seed)
+
+
+class Stage:
+  """
+  One benchmarked stage. setup builds the inputs once per size, reset restores anything a run
+  mutates before the next run, and run is the timed call.
+  """
+
+  name = None
+
+  def setup(self, rows: int, directory: str) -> None:
+    pass
+
+  def reset(self) -> None:
+    pass
+
+  def run(self) -> None:
+    raise NotImplementedError
+
+
+class FormatDailyPrices(Stage):
+  # Parse per ticker AlphaVantage files into the price store and read it back, rows = bars
+  name = 'format_daily_prices'
+
+  def setup(self, rows, directory):
+    self.prices_directory = os.path.join(directory, 'compact_daily')
+    self.store_root = os.path.join(directory, 'store')
+    write_av_files(self.prices_directory, rows)
+
+  def reset(self):
+    shutil.rmtree(self.store_root, ignore_errors=True)
+
+  def run(self):
+    FormatData(store_root=self.store_root).format_daily_prices(self.prices_directory)
+
+
+class FormatQqInsiders(Stage):
+  # Read a Quiver insider CSV into the compact schema, rows = trades
+  name = 'format_qq_insiders'
+
+  def setup(self, rows, directory):
+    self.insiders_file = os.path.join(directory, 'qq_insiders.csv')
+    synthetic.insider_trades(rows).to_csv(self.insiders_file)
+
+  def run(self):
+    CombineFrames(insiders_file=self.insiders_file).format_qq_insiders()
+
+
+class CombineData(Stage):
+  # Label trades with twelve weekly forward prices from the price store, rows = trades
+  name = 'combine_data'
+
+  def setup(self, rows, directory):
+    self.store_root = os.path.join(directory, 'store')
+    panel = price_universe(max(rows, 100_000))
+    PriceStore(self.store_root).write(panel)
+    self.trades = trades_on(panel, rows)
+
+  def reset(self):
+    self.insiders = self.trades.copy()
+
+  def run(self):
+    FormatData(insiders_data=self.insiders, store_root=self.store_root).combine_data()
+
+
+class NewAttributes(Stage):
+  # Compact a raw trade frame and derive the value, holdings and activity features, rows = trades
+  name = 'new_attributes'
+
+  def setup(self, rows, directory):
+    self.trades = synthetic.insider_trades(rows)
+
+  def reset(self):
+    self.insiders = self.trades.copy()
+
+  def run(self):
+    # fit returns the compacted frame rather than the creator, as notebook 04 calls it
+    creator = NewAttributeCreator()
+    creator.transform(creator.fit(self.insiders))
+
+
+class MergeFramesStage(Stage):
+  # Left join a price panel with trades on (Date, Ticker), rows = bars
+  name = 'combine_frames'
+
+  def setup(self, rows, directory):
+    panel = price_universe(rows)
+    self.trades = trades_on(panel, max(1, rows // 10))
+    self.prices = panel.reset_index()
+
+  def run(self):
+    MergeFrames(self.prices, self.trades).transform(None)
+
+
+class PartitionedMergeStage(MergeFramesStage):
+  # The same join by ticker batches, streamed to a store, rows = bars
+  name = 'combine_frames_partitioned'
+
+  def setup(self, rows, directory):
+    super().setup(rows, directory)
+    self.store_root = os.path.join(directory, 'combined')
+
+  def reset(self):
+    shutil.rmtree(self.store_root, ignore_errors=True)
+
+  def run(self):
+    MergeFrames(self.prices, self.trades, partitioned=True, store_root=self.store_root).transform(None)
+
+
+class ErrorInterval(Stage):
+  # RMSE confidence interval of one prediction column, rows = predictions
+  name = 'error_interval'
+
+  def setup(self, rows, directory):
+    rng = np.random.default_rng(0)
+    self.actual = rng.lognormal(3.5, 1.0, rows)
+    self.predict = self.actual * rng.lognormal(0, 0.1, rows)
+
+  def run(self):
+    ModelTest(self.predict, self.actual).get_error_confidence_interval(0.95)
+
+
+STAGES = {stage.name: stage for stage in (FormatDailyPrices, FormatQqInsiders, CombineData, NewAttributes, MergeFramesStage, PartitionedMergeStage, ErrorInterval)}
+
+
+def measure(stage: Stage, repeat: int, min_seconds: float) -> tuple:
+  """
+  Times a set up stage and measures its peak traced memory.
+
+  Args:
+    stage (Stage): The stage, after setup.
+    repeat (int): Most timed runs.
+    min_seconds (float): Stop repeating once the runs add up to this long.
+
+  Returns:
+    tuple: Best wall seconds, runs timed and peak traced bytes.
+  """
+  times = []
+  # Stage output is progress printing, which would drown the report
+  with contextlib.redirect_stdout(io.StringIO()):
+    while len(times) < repeat and (not times or sum(times) < min_seconds):
+      stage.reset()
+      gc.collect()
+      start = time.perf_counter()
+      stage.run()
+      times.append(time.perf_counter() - start)
+    stage.reset()
+    gc.collect()
+    tracemalloc.start()
+    try:
+      stage.run()
+      peak = tracemalloc.get_traced_memory()[1]
+    finally:
+      tracemalloc.stop()
+  return min(times), len(times), peak
+
+
+def read_history(path: str) -> list:
+  if not os.path.exists(path):
+    return []
+  with open(path, 'r') as f:
+    return [json.loads(line) for line in f if line.strip()]
+
+
+def baseline(history: list, record: dict, runs: int) -> tuple:
+  # Median seconds and peak bytes of the stage's last runs at the same size on the same host
+  previous = [entry for entry in history if (entry['stage'], entry['rows'], entry['host']) == (record['stage'], record['rows'], record['host'])][-runs:]
+  if not previous:
+    return None, None
+  return float(np.median([entry['seconds'] for entry in previous])), float(np.median([entry['peak_bytes'] for entry in previous]))
+
+
+def git_commit() -> str:
+  try:
+    return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCHMARK_DIRECTORY, capture_output=True, text=True, check=True).stdout.strip()
+  except (OSError, subprocess.CalledProcessError):
+    return None
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument('--stages', nargs='+', choices=list(STAGES), default=list(STAGES))
+  parser.add_argument('--sizes', nargs='+', type=int, default=DEFAULT_SIZES)
+  parser.add_argument('--repeat', type=int, default=3)
+  parser.add_argument('--min-seconds', type=float, default=1.0, help='Stop repeating once the timed runs add up to this long')
+  parser.add_argument('--history', default=HISTORY_FILEPATH)
+  parser.add_argument('--baseline-runs', type=int, default=5)
+  parser.add_argument('--threshold', type=float, default=0.2, help='Relative slowdown or memory growth flagged as a regression')
+  parser.add_argument('--min-delta', type=float, default=MIN_TIME_DELTA, help='Slowdown in seconds below which time is never flagged')
+  parser.add_argument('--no-record', action='store_true', help='Compare against the history without appending to it')
+  parser.add_argument('--fail-on-regression', action='store_true')
+  args = parser.parse_args()
+
+  history = read_history(args.history)
+  context = {'time': datetime.datetime.now().isoformat(timespec='seconds'), 'commit': git_commit(), 'host': platform.node(),
+             'python': platform.python_version(), 'pandas': pd.__version__, 'numpy': np.__version__}
+  records = []
+  print(f'{"stage":<28} {"rows":>10} {"seconds":>9} {"rows/s":>12} {"peak MiB":>9} {"vs base":>8}')
+  for name in args.stages:
+    for rows in args.sizes:
+      directory = tempfile.mkdtemp(prefix=f'bench-{name}-')
+      cwd = os.getcwd()
+      # combine_data writes its labeled CSV to the working directory
+      os.chdir(directory)
+      try:
+        stage = STAGES[name]()
+        stage.setup(rows, directory)
+        seconds, runs, peak = measure(stage, args.repeat, args.min_seconds)
+      finally:
+        os.chdir(cwd)
+        shutil.rmtree(directory)
+      record = {**context, 'stage': name, 'rows': rows, 'seconds': seconds, 'runs': runs, 'peak_bytes': peak, 'rows_per_second': rows / seconds}
+      base_seconds, base_peak = baseline(history, record, args.baseline_runs)
+      record['regression'] = []
+      if base_seconds is not None:
+        if seconds > base_seconds * (1 + args.threshold) and seconds - base_seconds >= args.min_delta:
+          record['regression'].append('time')
+        if peak > base_peak * (1 + args.threshold):
+          record['regression'].append('memory')
+      change = f'{seconds / base_seconds - 1:+8.1%}' if base_seconds else f'{"-":>8}'
+      flag = '  REGRESSION: ' + ', '.join(record['regression']) if record['regression'] else ''
+      print(f'{name:<28} {rows:>10,} {seconds:>9.3f} {rows / seconds:>12,.0f} {peak / 2**20:>9.1f} {change}{flag}')
+      records.append(record)
+
+  if not args.no_record:
+    with open(args.history, 'a') as f:
+      for record in records:
+        f.write(json.dumps(record) + '\n')
+  regressions = [record for record in records if record['regression']]
+  if regressions:
+    print(f'\n{len(regressions)} regression(s) beyond {args.threshold:.0%} of the last {args.baseline_runs} runs')
+    if args.fail_on_regression:
+      sys.exit(1)
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,206 @@
+"""
+Synthetic insider trades and AlphaVantage-shaped price series at any scale, for load tests.
+
+Everything is deterministic in its seed and, for per ticker data, in the ticker itself, so a
+server can produce any ticker's series on demand without holding the whole universe, and two
+runs of a benchmark see identical data.
+
+  python benchmarks/synthetic.py --trades 1000000 --tickers 10000 --out ../data/synthetic/
+"""
+import argparse
+import os
+import zlib
+
+import numpy as np
+import pandas as pd
+
+QUIVER_COLUMNS = ['Ticker', 'Name', 'Date', 'fileDate', 'TransactionCode', 'AcquiredDisposedCode', 'Shares', 'PricePerShare', 'SharesOwnedFollowing']
+
+# Share of open market purchases among P and S trades, roughly as in the Quiver live feed
+PURCHASE_SHARE = 0.2
+
+
+def ticker_symbols(count: int) -> np.ndarray:
+  # Distinct upper case symbols of one to five letters, e.g. A, B, ..., AA, AB, ...
+  symbols, width = [], 1
+  while len(symbols) < count:
+    total = 26 ** width
+    codes = np.arange(min(total, count - len(symbols)))
+    letters = [(codes // 26 ** place) % 26 for place in reversed(range(width))]
+    symbols.extend(''.join(chr(65 + int(letter[i])) for letter in letters) for i in range(len(codes)))
+    width += 1
+  return np.array(symbols[:count])
+
+
+def ticker_seed(ticker: str, seed: int = 0) -> int:
+  # Stable per ticker seed, independent of PYTHONHASHSEED
+  return zlib.crc32(f'{seed}:{ticker}'.encode())
+
+
+def daily_series(ticker: str, days: int, end: str = '2024-12-31', seed: int = 0) -> pd.DataFrame:
+  """
+  One ticker's daily OHLCV bars as a geometric random walk over business days.
+
+  Args:
+    ticker (str): The ticker, which seeds the walk together with seed.
+    days (int): Number of bars, e.g. 5040 for 20 years.
+    end (str): Date of the last bar.
+    seed (int): Universe seed.
+
+  Returns:
+    pd.DataFrame: Date, Open, High, Low, Close and Volume, oldest first.
+  """
+  rng = np.random.default_rng(ticker_seed(ticker, seed))
+  dates = pd.bdate_range(end=end, periods=days)
+  start = rng.lognormal(3.5, 1.0)
+  close = start * np.exp(np.cumsum(rng.normal(0.0002, rng.uniform(0.01, 0.04), days)))
+  open_ = close * np.exp(rng.normal(0, 0.005, days))
+  spread = np.abs(rng.normal(0, 0.01, days))
+  return pd.DataFrame({'Date': dates,
+                       'Open': open_.round(4),
+                       'High': (np.maximum(open_, close) * (1 + spread)).round(4),
+                       'Low': (np.minimum(open_, close) * (1 - spread)).round(4),
+                       'Close': close.round(4),
+                       'Volume': rng.lognormal(13, 1.5, days).astype(np.int64)})
+
+
+def daily_panel(tickers: int, days: int, end: str = '2024-12-31', seed: int = 0) -> pd.DataFrame:
+  # Every ticker's bars stacked into one (Ticker, Date) indexed frame, as load_daily_prices returns
+  frames = [daily_series(ticker, days, end, seed).assign(Ticker=ticker) for ticker in ticker_symbols(tickers)]
+  return pd.concat(frames, ignore_index=True).set_index(['Ticker', 'Date'])
+
+
+def av_daily_payload(ticker: str, days: int, outputsize: str = 'full', adjusted: bool = False, end: str = '2024-12-31', seed: int = 0) -> dict:
+  """
+  A TIME_SERIES_DAILY or TIME_SERIES_DAILY_ADJUSTED response body for one ticker.
+
+  Args:
+    ticker (str): The symbol.
+    days (int): Length of the full history.
+    outputsize (str): 'compact' for the latest 100 bars, 'full' for all of them.
+    adjusted (bool): Use the adjusted series' keys and add adjusted close, dividend and split.
+    end (str): Date of the last bar.
+    seed (int): Universe seed.
+
+  Returns:
+    dict: The JSON body with 'Meta Data' and 'Time Series (Daily)', newest bar first.
+  """
+  bars = daily_series(ticker, days, end, seed)
+  if outputsize == 'compact':
+    bars = bars.iloc[-100:]
+  bars = bars.iloc[::-1]
+  values = {'1. open': bars['Open'], '2. high': bars['High'], '3. low': bars['Low'], '4. close': bars['Close']}
+  if adjusted:
+    values.update({'5. adjusted close': bars['Close'], '6. volume': bars['Volume'], '7. dividend amount': 0.0, '8. split coefficient': 1.0})
+  else:
+    values['5. volume'] = bars['Volume']
+  strings = pd.DataFrame({key: np.broadcast_to(np.asarray(value), len(bars)) for key, value in values.items()}).astype(str)
+  series = dict(zip(bars['Date'].dt.strftime('%Y-%m-%d'), strings.to_dict('records')))
+  function = 'Daily Time Series with Splits and Dividend Events' if adjusted else 'Daily Prices (open, high, low, close) and Volumes'
+  return {'Meta Data': {'1. Information': function,
+                        '2. Symbol': ticker,
+                        '3. Last Refreshed': bars['Date'].iloc[0].strftime('%Y-%m-%d') if len(bars) else None,
+                        '4. Output Size': 'Compact' if outputsize == 'compact' else 'Full size',
+                        '5. Time Zone': 'US/Eastern'},
+          'Time Series (Daily)': series}
+
+
+def av_indicator_payload(function: str, ticker: str, days: int, time_period: int = 50, end: str = '2024-12-31', seed: int = 0) -> dict:
+  # An SMA, EMA, RSI or BBANDS response body over the ticker's closes, newest first
+  close = daily_series(ticker, days, end, seed).set_index('Date')['Close']
+  if function == 'RSI':
+    change = close.diff()
+    gain = change.clip(lower=0).ewm(alpha=1 / time_period).mean()
+    loss = (-change.clip(upper=0)).ewm(alpha=1 / time_period).mean()
+    values = {'RSI': 100 - 100 / (1 + gain / loss)}
+  elif function == 'BBANDS':
+    middle, deviation = close.rolling(time_period).mean(), close.rolling(time_period).std(ddof=0)
+    values = {'Real Upper Band': middle + 2 * deviation, 'Real Middle Band': middle, 'Real Lower Band': middle - 2 * deviation}
+  elif function == 'EMA':
+    values = {'EMA': close.ewm(span=time_period, adjust=False).mean()}
+  else:
+    values = {function: close.rolling(time_period).mean()}
+  frame = pd.DataFrame(values).iloc[time_period:].iloc[::-1].round(4).astype(str)
+  return {'Meta Data': {'1: Symbol': ticker, '2: Indicator': function, '5: Time Period': time_period},
+          f'Technical Analysis: {function}': dict(zip(frame.index.strftime('%Y-%m-%d'), frame.to_dict('records')))}
+
+
+def av_overview_payload(ticker: str, seed: int = 0) -> dict:
+  # A flat OVERVIEW record with the fields the pipeline reads
+  rng = np.random.default_rng(ticker_seed(ticker, seed))
+  return {'Symbol': ticker, 'AssetType': 'Common Stock', 'Name': f'{ticker} Corp', 'Exchange': str(rng.choice(['NYSE', 'NASDAQ'])),
+          'Sector': str(rng.choice(['TECHNOLOGY', 'FINANCE', 'HEALTHCARE', 'ENERGY', 'INDUSTRIALS'])),
+          'MarketCapitalization': str(int(rng.lognormal(22, 1.5))), 'SharesOutstanding': str(int(rng.lognormal(18, 1)))}
+
+
+def insider_trades(rows: int, tickers: int = 5000, insiders: int = 50000, start: str = '2005-01-01', end: str = '2024-12-31', seed: int = 0) -> pd.DataFrame:
+  """
+  Insider trades in the Quiver schema with realistic skews.
+
+  Trade sizes are log-normal, insiders trade a few tickers each and some far more often than
+  others, purchases are a minority, each trade is priced near its ticker's price level, and
+  filings land zero to four days after the trade, during the day.
+
+  Args:
+    rows (int): Number of trades.
+    tickers (int): Size of the ticker universe.
+    insiders (int): Number of distinct insiders.
+    start (str): Earliest trade date.
+    end (str): Latest trade date.
+    seed (int): Seed of the draw.
+
+  Returns:
+    pd.DataFrame: QUIVER_COLUMNS, with Date and fileDate as datetimes, in fileDate order.
+  """
+  rng = np.random.default_rng(seed)
+  symbols = ticker_symbols(tickers)
+  # Zipf-like activity: a few insiders and tickers account for most filings
+  insider = np.minimum(rng.zipf(1.3, rows), insiders) - 1
+  home = rng.integers(0, tickers, insiders)
+  ticker = np.where(rng.random(rows) < 0.9, home[insider], rng.integers(0, tickers, rows))
+  days = pd.bdate_range(start, end)
+  date = days[rng.integers(0, len(days), rows)]
+  filed = date + pd.to_timedelta(rng.integers(0, 5, rows), unit='D') + pd.to_timedelta(rng.integers(6 * 3600, 22 * 3600, rows), unit='s')
+  purchase = rng.random(rows) < PURCHASE_SHARE
+  level = np.exp(rng.normal(3.5, 1.0, tickers))
+  shares = np.ceil(rng.lognormal(7, 1.8, rows))
+  following = np.ceil(shares * rng.lognormal(2, 1.5, rows))
+  df = pd.DataFrame({'Ticker': symbols[ticker],
+                     'Name': np.char.add('insider ', insider.astype(str)),
+                     'Date': date,
+                     'fileDate': filed,
+                     'TransactionCode': np.where(purchase, 'P', 'S'),
+                     'AcquiredDisposedCode': np.where(purchase, 'A', 'D'),
+                     'Shares': shares,
+                     'PricePerShare': (level[ticker] * rng.lognormal(0, 0.3, rows)).round(2),
+                     'SharesOwnedFollowing': following})
+  return df.sort_values('fileDate', kind='stable').reset_index(drop=True)
+
+
+def live_insider_records(df: pd.DataFrame) -> list:
+  # Trades as the live endpoint's JSON records, with ISO date strings
+  records = df.assign(Date=df['Date'].dt.strftime('%Y-%m-%d'), fileDate=df['fileDate'].dt.strftime('%Y-%m-%dT%H:%M:%S'))
+  return records.to_dict('records')
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument('--trades', type=int, default=1_000_000)
+  parser.add_argument('--tickers', type=int, default=10_000)
+  parser.add_argument('--days', type=int, default=0, help='Also write a (Ticker, Date) price panel of this many bars per ticker')
+  parser.add_argument('--seed', type=int, default=0)
+  parser.add_argument('--out', default='../data/synthetic/')
+  args = parser.parse_args()
+
+  os.makedirs(args.out, exist_ok=True)
+  trades = insider_trades(args.trades, args.tickers, seed=args.seed)
+  trades.to_csv(os.path.join(args.out, 'qq_insiders.csv'), index=False)
+  print(f'Wrote {len(trades)} trades to {args.out}')
+  if args.days:
+    panel = daily_panel(args.tickers, args.days, seed=args.seed)
+    panel.to_csv(os.path.join(args.out, 'daily_prices.csv'))
+    print(f'Wrote {len(panel)} bars to {args.out}')
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,71 @@
+"""
+Fits per second of the training sweep, serially and in process pools of increasing size.
+
+Builds a synthetic labeled insider frame into a memory-mapped FeatureMatrix in a temporary
+directory and runs the same horizon x model x parameter sweep at each pool size.
+
+  python benchmarks/training_sweep.py --rows 100000 --processes 1 2 4 8
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'notebooks'))
+
+from labeling import WEEKLY_HORIZONS, horizon_column
+from training import FeatureMatrix, run_sweep
+
+GRID = {'tree': {'max_depth': [4, 8, 12]}, 'forest': {'n_estimators': [20], 'max_depth': [8]}, 'ridge': {'alpha': [1.0, 10.0]}}
+TARGETS = [horizon_column(horizon) for horizon in (14, 28, 56, 84)]
+
+
+def make_trades(rows: int, seed: int = 0) -> pd.DataFrame:
+  rng = np.random.default_rng(seed)
+  df = pd.DataFrame({'Date': pd.Timestamp('2012-01-01') + pd.to_timedelta(rng.integers(0, 4000, rows), unit='D'),
+                     'Shares': rng.lognormal(8, 2, rows),
+                     'PricePerShare': rng.lognormal(3, 1, rows),
+                     'SharesOwnedFollowing': rng.lognormal(10, 2, rows),
+                     'TransactionCode': rng.choice(['P', 'S'], rows),
+                     'AcquiredDisposedCode': rng.choice(['A', 'D'], rows),
+                     'TraderFrequency': rng.integers(1, 100, rows),
+                     'individual_transactions_per_trade': rng.integers(1, 10, rows),
+                     'investors_per_trade': rng.integers(1, 10, rows)})
+  df['total_value'] = df['Shares'] * df['PricePerShare']
+  df['change_in_holdings'] = df['Shares'] / (df['Shares'] + df['SharesOwnedFollowing'])
+  for horizon in WEEKLY_HORIZONS:
+    df[horizon_column(horizon)] = df['PricePerShare'] * np.exp(rng.normal(0, 0.01 * np.sqrt(horizon), rows))
+  return df
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument('--rows', type=int, default=100_000)
+  parser.add_argument('--splits', type=int, default=5)
+  parser.add_argument('--processes', type=int, nargs='+', default=[1, os.cpu_count()])
+  args = parser.parse_args()
+
+  directory = tempfile.mkdtemp(prefix='training-bench-')
+  try:
+    start = time.perf_counter()
+    matrix = FeatureMatrix.build(make_trades(args.rows), directory, base_column='PricePerShare')
+    print(f'build:       {time.perf_counter() - start:8.2f} s')
+    baseline = None
+    for processes in args.processes:
+      start = time.perf_counter()
+      results = run_sweep(matrix, GRID, targets=TARGETS, n_splits=args.splits, processes=processes, path=None)
+      seconds = time.perf_counter() - start
+      baseline = baseline or seconds
+      fits = len(results) * args.splits
+      print(f'{processes:2d} processes: {seconds:8.2f} s, {fits / seconds:6.2f} fits/s, {baseline / seconds:4.1f}x')
+  finally:
+    shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+  main()
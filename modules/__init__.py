@@ -1,6 +1,21 @@
-from ..modules import data_collection
-from ..notebooks import *
+import importlib
 
-# Import specific functions or classes from the modules
-from ..modules.data_collection import QuiverDatasets
-from ..modules.data_collection import AlphaVantageDatasets
\ No newline at end of file
+# Submodules and their classes are imported on first attribute access, so importing the
+# package stays cheap and never touches the network or the plotting stack
+_LAZY_ATTRIBUTES = {
+  'data_collection': ('.data_collection', None),
+  'QuiverDatasets': ('.data_collection', 'QuiverDatasets'),
+  'AlphaVantageDatasets': ('.data_collection', 'AlphaVantageDatasets'),
+}
+
+def __getattr__(name: str):
+  if name not in _LAZY_ATTRIBUTES:
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+  module_name, attribute = _LAZY_ATTRIBUTES[name]
+  module = importlib.import_module(module_name, __name__)
+  value = module if attribute is None else getattr(module, attribute)
+  globals()[name] = value
+  return value
+
+def __dir__() -> list:
+  return sorted(list(globals()) + list(_LAZY_ATTRIBUTES))
@@ -1,11 +1,17 @@
 import pandas as pd
 import numpy as np
 import requests as req
-import quiverquant as qq
 import sys
+import functools
+import threading
+from types import MappingProxyType
 from datetime import datetime, timedelta
 from concurrent.futures import ThreadPoolExecutor
 
+SP500_CONSTITUENTS_URL = 'https://datahub.io/core/s-and-p-500-companies/r/constituents.csv'
+
+# Keys and the S&P 500 universe are resolved on first use, never at import, and cached
+@functools.lru_cache(maxsize=None)
 def read_api_key(filename: str) -> str:
   try:
     with open(filename, 'r') as f:
@@ -14,24 +20,49 @@ def read_api_key(filename: str) -> str:
     print(f'File {filename} not found.')
     return None
   
-def make_qq_header(self, api_key: str) -> dict:
+@functools.lru_cache(maxsize=None)
+def sp500_tickers() -> list:
+  return pd.read_csv(SP500_CONSTITUENTS_URL).Symbol.tolist()
+  
+def make_qq_header(api_key: str) -> dict:
   return {'Accept': 'application/json',
           'Authorization': f'Bearer {api_key}'}
   
+# Large enough that max_workers threads can each keep a connection alive to the same host
+HTTP_POOL_MAXSIZE = 64
+_session = None
+_session_lock = threading.Lock()
+
+def shared_session() -> req.Session:
+  # One keep-alive, gzip-enabled connection pool shared by every ImportData in the process
+  global _session
+  with _session_lock:
+    if _session is None:
+      _session = req.Session()
+      adapter = req.adapters.HTTPAdapter(pool_connections=HTTP_POOL_MAXSIZE, pool_maxsize=HTTP_POOL_MAXSIZE)
+      _session.mount('https://', adapter)
+      _session.mount('http://', adapter)
+      _session.headers.update({'Accept-Encoding': 'gzip, deflate'})
+    return _session
+  
 class ImportData:
   
   DATA_FILEPATH = '../data/'
   
-  def __init__(self, base_url: str, api_name: str, headers = None, params = None, extension = ''):
+  def __init__(self, base_url: str, api_name: str, headers = None, params = None, extension = '', max_workers: int = 10, session: req.Session = None):
     self.base_url = base_url
-    self.headers = headers if headers is not None else {}
-    self.params = params if params is not None else {}
+    self.headers = dict(headers) if headers is not None else {}
+    # Read-only so worker threads can only build per-request copies
+    self.params = MappingProxyType(dict(params) if params is not None else {})
     self.api_name = api_name
     self.extension = extension
+    self.max_workers = max_workers
+    self.session = session if session is not None else shared_session()
     
-  def __get_single_dataset(self) -> pd.DataFrame:
-    # Get a single dataset from any API
-    response = req.get(self.base_url + self.extension, headers=self.headers, params = self.params)
+  def __get_single_dataset(self, params: dict = None) -> pd.DataFrame:
+    # Get a single dataset from any API over the pooled keep-alive session
+    params = self.params if params is None else params
+    response = self.session.get(self.base_url + self.extension, headers=self.headers, params=params)
     if response.status_code != 200:
       raise Exception(f'Error: {response.status_code}. Failed to fetch dataset: {response.text}')
     df = pd.DataFrame(response.json())
@@ -40,14 +71,12 @@ class ImportData:
     return df
       
   def download_datasets(self, param: str, values: list) -> [pd.DataFrame]:
-    dfs = []
     
     def get_parameter_dataset(value: str) -> pd.DataFrame:
-    # Get dataset with specified param from any API
-      self.params[param] = value
-      return self.__get_single_dataset(self.extension)
+    # Get dataset with specified param from any API, each call with its own params
+      return self.__get_single_dataset(dict(self.params, **{param: value}))
     
-    with ThreadPoolExecutor(max_workers=10) as executor:
+    with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
       dfs = list(executor.map(get_parameter_dataset, values))
       
     return dfs
@@ -58,15 +87,26 @@ class ImportData:
   
 class QuiverDatasets:
   
-  SP500_TICKERS = pd.read_csv('https://datahub.io/core/s-and-p-500-companies/r/constituents.csv').Symbol.tolist()
   QQ_BASE_URL = 'https://api.quiverquant.com/'
+  QQ_KEY_FILE = 'keys/qq_api_key.txt'
   
-  def __init__(self, api_key = read_api_key('keys/qq_api_key.txt'), base_url = QQ_BASE_URL, tickers = SP500_TICKERS):
-    self.api_key = api_key
+  def __init__(self, api_key = None, base_url = QQ_BASE_URL, tickers = None):
+    self.api_key = api_key if api_key is not None else read_api_key(self.QQ_KEY_FILE)
     self.base_url = base_url
-    self.tickers = tickers
+    self._tickers = tickers
     self.header = make_qq_header(self.api_key)
     
+  @property
+  def tickers(self) -> list:
+    # The S&P 500 universe is only downloaded when the tickers are actually needed
+    if self._tickers is None:
+      self._tickers = sp500_tickers()
+    return self._tickers
+  
+  @tickers.setter
+  def tickers(self, tickers: list) -> None:
+    self._tickers = tickers
+    
   def get_live_insider_set(self):
     # Get the insider trading data from QuiverQuant
     header = {'Accept': 'application/json',
@@ -76,16 +116,13 @@ class QuiverDatasets:
     importer = ImportData(self.base_url, 'qq', header, params, extension)
     return importer.download_dataset()
 
-import sched
-import time
-
 class AlphaVantageDatasets:
     
   AV_BASE_URL = 'https://www.alphavantage.co/'
-  AV_API_KEY = read_api_key('keys/av_api_key.txt')
+  AV_KEY_FILE = 'keys/av_api_key.txt'
   
-  def __init__(self, api_key = AV_API_KEY, base_url = AV_BASE_URL):
-    self.api_key = api_key
+  def __init__(self, api_key = None, base_url = AV_BASE_URL):
+    self.api_key = api_key if api_key is not None else read_api_key(self.AV_KEY_FILE)
     self.base_url = base_url
     self.header = {'Accept': 'application/json'}
     self.extension = 'query'
@@ -1,13 +1,237 @@
 from scipy import stats
 import numpy as np
+import pandas as pd
 from numpy.typing import ArrayLike
 
+# Metrics summarized and bootstrapped per prediction column
+METRICS = ['rmse', 'mae', 'r2', 'hit_rate']
+
+# Bootstrap weights drawn at a time, replicates times rows: 32 MiB of float64 per block
+BOOTSTRAP_BLOCK = 2 ** 22
+
+
+def _merge_moments(n_a, mean_a, m2_a, n_b, mean_b, m2_b) -> tuple:
+  # Chan et al. pairwise merge of counts, means and sums of squared deviations
+  n = n_a + n_b
+  delta = mean_b - mean_a
+  with np.errstate(divide='ignore', invalid='ignore'):
+    share = np.where(n > 0, n_b / n, 0.0)
+  mean = mean_a + delta * share
+  m2 = m2_a + m2_b + delta ** 2 * n_a * share
+  return n, mean, m2
+
+
+def _chunk_moments(values: np.ndarray, valid: np.ndarray) -> tuple:
+  # Per column count, mean and sum of squared deviations of a chunk, skipping invalid entries
+  n = valid.sum(axis=0).astype(np.float64)
+  with np.errstate(divide='ignore', invalid='ignore'):
+    mean = np.where(n > 0, np.where(valid, values, 0).sum(axis=0) / n, 0.0)
+  m2 = (np.where(valid, values - mean, 0) ** 2).sum(axis=0)
+  return n, mean, m2
+
+
+class ErrorMoments:
+  """
+  Streaming error statistics of one or more prediction columns, updated chunk by chunk.
+
+  Each chunk's count, mean and sum of squared deviations are computed with array operations
+  and merged into the running totals with the pairwise (Chan et al.) form of Welford's update,
+  so the full prediction and actual arrays never need to be in memory at once. Columns are
+  independent models or horizons scored against the same rows, and NaN entries are skipped
+  per column.
+
+  With n_boot > 0 the accumulator also keeps a Poisson bootstrap: every row gets an
+  independent Poisson(1) weight per replicate, and the weighted sums of each replicate are
+  accumulated with one matrix product per block of rows, at most BOOTSTRAP_BLOCK weights at a
+  time so memory stays bounded whatever the chunk size and n_boot. Unlike resampling indices this needs no
+  second pass, and all columns share the same replicates so models can be compared pairwise.
+
+  Args:
+    columns (int): Number of prediction columns.
+    n_boot (int): Bootstrap replicates to accumulate. 0 to skip the bootstrap.
+    seed (int, optional): Seed of the bootstrap weights. Accumulators merged later need
+                          different seeds, or their rows get the same weights.
+    shift (ArrayLike, optional): Level the bootstrap sums of the actuals are taken around, per
+                                 column or shared, e.g. a rough mean of the target. Defaults to
+                                 the first chunk's mean; accumulators merged later must be given
+                                 the same shift.
+  """
+
+  def __init__(self, columns: int = 1, n_boot: int = 0, seed: int = None, shift: ArrayLike = None):
+    self.columns = columns
+    self.n_boot = n_boot
+    self.rng = np.random.default_rng(seed)
+    zeros = lambda: np.zeros(columns)
+    self.n = zeros()
+    self.errors = (zeros(), zeros())      # Mean and M2 of predict - actual
+    self.squared = (zeros(), zeros())     # Mean and M2 of squared errors
+    self.actual = (zeros(), zeros())      # Mean and M2 of the actuals
+    self.absolute = zeros()               # Mean absolute error
+    self.hits = zeros()                   # Rows predicting the direction of the actual
+    # Weighted sums per replicate: count, squared error, absolute error, hits, actual, actual squared
+    self.boot = np.zeros((6, n_boot, columns))
+    self.shift = None if shift is None else np.broadcast_to(np.asarray(shift, dtype=np.float64), (columns,)).copy()
+
+  def update(self, predict: ArrayLike, actual: ArrayLike, base: ArrayLike = 0.0) -> 'ErrorMoments':
+    """
+    Folds a chunk of rows into the statistics.
+
+    Args:
+      predict (ArrayLike): Predictions, (rows,) or (rows, columns).
+      actual (ArrayLike): Actuals, (rows,) or broadcastable to predict, e.g. one target
+                          shared by every model column.
+      base (ArrayLike): Level the direction of predictions and actuals is taken against, e.g.
+                        the price at the trade for price targets. 0 for return targets.
+
+    Returns:
+      ErrorMoments: self.
+    """
+    predict = np.asarray(predict, dtype=np.float64).reshape(len(predict), -1)
+    actual = np.asarray(actual, dtype=np.float64).reshape(len(actual), -1)
+    base = np.asarray(base, dtype=np.float64)
+    base = base.reshape(len(base), -1) if base.ndim else base
+    predict, actual = np.broadcast_arrays(predict, actual)
+    valid = ~(np.isnan(predict) | np.isnan(actual))
+    errors = predict - actual
+    squared = errors ** 2
+    hits = (np.sign(predict - base) == np.sign(actual - base)) & valid
+
+    n, mean, m2 = _chunk_moments(errors, valid)
+    actual_moments = _chunk_moments(actual, valid)
+    self.errors = _merge_moments(self.n, *self.errors, n, mean, m2)[1:]
+    self.squared = _merge_moments(self.n, *self.squared, *_chunk_moments(squared, valid))[1:]
+    self.actual = _merge_moments(self.n, *self.actual, *actual_moments)[1:]
+    with np.errstate(divide='ignore', invalid='ignore'):
+      absolute = np.where(valid, np.abs(errors), 0).sum(axis=0)
+      self.absolute = np.where(self.n + n > 0, (self.absolute * self.n + absolute) / (self.n + n), 0.0)
+    self.hits += hits.sum(axis=0)
+    self.n += n
+
+    if self.n_boot:
+      if self.shift is None:
+        # Actual sums are taken around the first chunk's means, so the replicate variances
+        # do not cancel catastrophically for price level targets
+        self.shift = actual_moments[1].copy()
+      shifted = np.where(valid, actual - self.shift, 0)
+      # All six sums of every column in a single product per block of rows
+      values = np.concatenate([valid, np.where(valid, squared, 0), np.where(valid, np.abs(errors), 0), hits, shifted, shifted ** 2], axis=1)
+      rows = max(1, BOOTSTRAP_BLOCK // self.n_boot)
+      for start in range(0, len(values), rows):
+        block = values[start:start + rows]
+        weights = self.rng.poisson(1.0, (self.n_boot, len(block))).astype(np.float64)
+        self.boot += (weights @ block).reshape(self.n_boot, 6, self.columns).transpose(1, 0, 2)
+    return self
+
+  def merge(self, other: 'ErrorMoments') -> 'ErrorMoments':
+    # Combine with statistics accumulated over other rows, e.g. by another worker. Both sides
+    # need the same columns and n_boot, or the replicates would cover only part of the rows
+    if (self.columns, self.n_boot) != (other.columns, other.n_boot):
+      raise ValueError(f'cannot merge {other.columns} columns with {other.n_boot} replicates into {self.columns} columns with {self.n_boot}')
+    # An accumulator without rows has no shift yet and contributes nothing to the bootstrap
+    if self.n_boot and self.shift is not None and other.shift is not None and not np.array_equal(self.shift, other.shift):
+      raise ValueError('bootstrap sums can only be merged when both accumulators share the same shift')
+    for name in ('errors', 'squared', 'actual'):
+      _, mean, m2 = _merge_moments(self.n, *getattr(self, name), other.n, *getattr(other, name))
+      setattr(self, name, (mean, m2))
+    n = self.n + other.n
+    with np.errstate(divide='ignore', invalid='ignore'):
+      self.absolute = np.where(n > 0, (self.absolute * self.n + other.absolute * other.n) / n, 0.0)
+    self.hits = self.hits + other.hits
+    self.n = n
+    if self.n_boot:
+      if self.shift is None and other.shift is not None:
+        self.shift = other.shift.copy()
+      self.boot = self.boot + other.boot
+    return self
+
+  def metrics(self) -> dict:
+    # Point estimates per column
+    with np.errstate(divide='ignore', invalid='ignore'):
+      return {'n': self.n.copy(),
+              'bias': self.errors[0].copy(),
+              'rmse': np.sqrt(self.squared[0]),
+              'mae': self.absolute.copy(),
+              'r2': 1 - self.n * self.squared[0] / self.actual[1],
+              'hit_rate': self.hits / self.n}
+
+  def bootstrap_metrics(self) -> dict:
+    # Each metric per replicate and column, (n_boot, columns)
+    count, squared, absolute, hits, actual, actual_squared = self.boot
+    with np.errstate(divide='ignore', invalid='ignore'):
+      total = actual_squared - actual ** 2 / count
+      return {'rmse': np.sqrt(squared / count),
+              'mae': absolute / count,
+              'r2': 1 - squared / total,
+              'hit_rate': hits / count}
+
+  def mse_interval(self, confidence: float) -> tuple:
+    # Student t interval of the mean squared error, from the streamed squared error moments
+    with np.errstate(divide='ignore', invalid='ignore'):
+      sem = np.sqrt(self.squared[1] / (self.n - 1) / self.n)
+      return stats.t.interval(confidence, self.n - 1, loc=self.squared[0], scale=sem)
+
+
 class ModelTest:
-  
-  def __init__(self, predict: ArrayLike, actual: ArrayLike) -> None:
+
+  def __init__(self, predict: ArrayLike, actual: ArrayLike, base: ArrayLike = 0.0, labels: list = None) -> None:
     self.predict = np.array(predict)
     self.actual = np.array(actual)
+    self.base = base
+    self.labels = labels
+    self.moments = None
+
+  @classmethod
+  def from_chunks(cls, chunks, columns: int = 1, n_boot: int = 0, seed: int = None, labels: list = None, shift: ArrayLike = None) -> 'ModelTest':
+    # Evaluation over an iterable of (predict, actual) or (predict, actual, base) chunks, keeping
+    # only the streamed moments rather than the arrays
+    model_test = cls(np.empty((0, columns)), np.empty((0, columns)), labels=labels)
+    model_test.moments = ErrorMoments(columns, n_boot, seed, shift)
+    for chunk in chunks:
+      model_test.moments.update(*chunk)
+    return model_test
+
+  def get_moments(self, chunk_size: int = 1_000_000, n_boot: int = 0, seed: int = None) -> ErrorMoments:
+    # Moments of the held arrays, streamed in row chunks to bound the temporaries
+    if self.moments is not None and self.moments.n_boot >= n_boot:
+      return self.moments
+    predict = self.predict.reshape(len(self.predict), -1)
+    self.moments = ErrorMoments(predict.shape[1], n_boot, seed)
+    base = np.asarray(self.base)
+    for start in range(0, len(predict), chunk_size):
+      chunk = slice(start, start + chunk_size)
+      self.moments.update(predict[chunk], self.actual[chunk] if self.actual.ndim else self.actual, base[chunk] if base.ndim else base)
+    return self.moments
 
   def get_error_confidence_interval(self, confidence: float):
-    errors_squared = (self.predict - self.actual) ** 2
-    return np.sqrt(stats.t.interval(confidence, len(errors_squared) -1, loc=errors_squared.mean(), scale=stats.sem(errors_squared)))
\ No newline at end of file
+    # RMSE interval from a t interval on the mean squared error, per prediction column
+    low, high = self.get_moments().mse_interval(confidence)
+    interval = np.sqrt(np.clip(low, 0, None)), np.sqrt(high)
+    if self.predict.ndim < 2 and len(low) == 1:
+      return interval[0][0], interval[1][0]
+    return interval
+
+  def get_bootstrap_intervals(self, confidence: float = 0.95, n_boot: int = 1000, seed: int = None) -> pd.DataFrame:
+    """
+    Percentile bootstrap intervals of RMSE, MAE, R2 and directional hit rate per column.
+
+    Args:
+      confidence (float): Coverage of the intervals.
+      n_boot (int): Poisson bootstrap replicates.
+      seed (int, optional): Seed of the bootstrap weights.
+
+    Returns:
+      pd.DataFrame: One row per column with each metric's estimate and its _low and _high bounds.
+    """
+    moments = self.get_moments(n_boot=n_boot, seed=seed)
+    estimates = moments.metrics()
+    replicates = moments.bootstrap_metrics()
+    tails = [(1 - confidence) / 2, (1 + confidence) / 2]
+    columns = {}
+    for metric in METRICS:
+      low, high = np.nanquantile(replicates[metric], tails, axis=0)
+      columns.update({metric: estimates[metric], f'{metric}_low': low, f'{metric}_high': high})
+    return pd.DataFrame(columns, index=self.labels)
+
+  def summary(self) -> pd.DataFrame:
+    # Point estimates of every metric, one row per prediction column
+    return pd.DataFrame(self.get_moments().metrics(), index=self.labels)
@@ -1,10 +1,196 @@
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
-import sys
+import json
+import os
 from data_collection import QuiverDatasets
 
+SCALER_FILEPATH = '../data/models/insider_scaler.json'
+
+# Rows read per chunk: a few hundred MB of parsed insider rows at most
+CHUNK_SIZE = 500_000
+
+# Raw numeric columns normalized alongside the row features
+NUMERIC_COLUMNS = ['Shares', 'PricePerShare', 'SharesOwnedFollowing', 'Total', 'HoldingsPercent']
+
+
+def read_insider_chunks(file_path: str, chunksize: int = CHUNK_SIZE):
+  # The insider CSV as a generator of raw frames of up to chunksize rows
+  with pd.read_csv(file_path, chunksize=chunksize) as reader:
+    yield from reader
+
+
+def clean_chunk(df: pd.DataFrame) -> pd.DataFrame:
+  """
+  Cleans one chunk of raw insider rows in a single pass.
+
+  Rows with missing values, zero shares or a zero price are removed with one combined mask
+  and one selection instead of a drop per condition, then the key columns are typed.
+
+  Args:
+    df (pd.DataFrame): Raw insider rows, e.g. a chunk of read_insider_chunks.
+
+  Returns:
+    pd.DataFrame: The kept rows, without the CSV index column.
+  """
+  df = df.drop(columns=[column for column in df.columns if str(column).startswith('Unnamed: ')])
+  keep = df.notna().all(axis=1) & (df['Shares'] != 0) & (df['PricePerShare'] != 0)
+  df = df[keep]
+  return df.assign(Date=pd.to_datetime(df['Date']),
+                   Ticker=df['Ticker'].astype(str),
+                   Name=df['Name'].astype(str).str.lower(),
+                   fileDate=pd.to_datetime(df['fileDate']))
+
+
+def add_row_features(df: pd.DataFrame) -> pd.DataFrame:
+  # The features computed from each row alone, so any chunk can get them independently. A sale
+  # of the whole holding leaves SharesOwnedFollowing at 0, whose percent is missing, not infinite
+  holdings = df['Shares'] / df['SharesOwnedFollowing'] * 100
+  return df.assign(Total=df['Shares'] * df['PricePerShare'],
+                   HoldingsPercent=holdings.where(np.isfinite(holdings)))
+
+
+class OnlineScaler:
+  """
+  Standardizes numeric columns with a mean and standard deviation fitted chunk by chunk.
+
+  Each chunk's count, mean and sum of squared deviations per column are merged into the
+  running totals with the pairwise (Chan et al.) update, so fitting over a stream of chunks
+  gives the same statistics as over the concatenated frame, in bounded memory. The fitted
+  statistics are saved as JSON, so inference applies exactly the training normalization.
+
+  Args:
+    columns (list, optional): Columns to standardize. Defaults to the numeric columns of the
+                              first chunk fitted.
+  """
+
+  def __init__(self, columns: list = None):
+    self.columns = columns
+    self.n = None
+    self.mean = None
+    self.m2 = None
+
+  def partial_fit(self, df: pd.DataFrame) -> 'OnlineScaler':
+    # Fold one chunk into the statistics, skipping missing and infinite values per column
+    if self.columns is None:
+      self.columns = list(df.select_dtypes('number').columns)
+    values = df[self.columns].to_numpy(dtype=np.float64)
+    valid = np.isfinite(values)
+    n = valid.sum(axis=0).astype(np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+      mean = np.where(n > 0, np.where(valid, values, 0).sum(axis=0) / n, 0.0)
+    m2 = (np.where(valid, values - mean, 0) ** 2).sum(axis=0)
+    if self.n is None:
+      self.n, self.mean, self.m2 = n, mean, m2
+      return self
+    total = self.n + n
+    delta = mean - self.mean
+    with np.errstate(divide='ignore', invalid='ignore'):
+      share = np.where(total > 0, n / total, 0.0)
+    self.mean = self.mean + delta * share
+    self.m2 = self.m2 + m2 + delta ** 2 * self.n * share
+    self.n = total
+    return self
+
+  def fit(self, chunks) -> 'OnlineScaler':
+    # Fit over an iterable of frames, e.g. a generator of cleaned chunks
+    for chunk in chunks:
+      self.partial_fit(chunk)
+    return self
+
+  @property
+  def std(self) -> np.ndarray:
+    # Sample standard deviation, as DataFrame.std
+    with np.errstate(divide='ignore', invalid='ignore'):
+      return np.sqrt(self.m2 / (self.n - 1))
+
+  def transform(self, df: pd.DataFrame) -> pd.DataFrame:
+    # Standardize the fitted columns, leaving every other column as it is. Constant columns
+    # are centred only, rather than divided by zero
+    missing = [column for column in self.columns if column not in df.columns]
+    if missing:
+      raise ValueError(f'Frame lacks the scaler\'s fitted columns {missing}')
+    std = self.std
+    scale = np.where(np.isfinite(std) & (std > 0), std, 1.0)
+    values = (df[self.columns].to_numpy(dtype=np.float64) - self.mean) / scale
+    return df.assign(**{column: values[:, i] for i, column in enumerate(self.columns)})
+
+  def save(self, path: str = SCALER_FILEPATH) -> None:
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w') as f:
+      json.dump({'columns': self.columns, 'n': self.n.tolist(), 'mean': self.mean.tolist(), 'm2': self.m2.tolist()}, f)
+
+  @classmethod
+  def load(cls, path: str = SCALER_FILEPATH) -> 'OnlineScaler':
+    with open(path, 'r') as f:
+      state = json.load(f)
+    scaler = cls(state['columns'])
+    scaler.n, scaler.mean, scaler.m2 = (np.array(state[key], dtype=np.float64) for key in ('n', 'mean', 'm2'))
+    return scaler
+
+
+def prepare_chunks(chunks):
+  # Cleaned chunks with their row features, skipping chunks that clean down to nothing
+  for chunk in chunks:
+    chunk = add_row_features(clean_chunk(chunk))
+    if len(chunk):
+      yield chunk
+
+
+def fit_scaler(file_path: str, scaler_path: str = SCALER_FILEPATH, chunksize: int = CHUNK_SIZE, columns: list = NUMERIC_COLUMNS) -> OnlineScaler:
+  """
+  Fits the normalization over an insider history of any size and saves it.
+
+  Args:
+    file_path (str): The insider CSV.
+    scaler_path (str, optional): Where the fitted statistics are saved. None to skip saving.
+    chunksize (int): Rows read at a time.
+    columns (list): Columns to standardize, after cleaning and the row features.
+
+  Returns:
+    OnlineScaler: The fitted scaler.
+  """
+  scaler = OnlineScaler(columns).fit(prepare_chunks(read_insider_chunks(file_path, chunksize)))
+  if scaler_path is not None:
+    scaler.save(scaler_path)
+  return scaler
+
+
+def preprocess_chunks(chunks, scaler: OnlineScaler):
+  # Cleaned, featured and standardized chunks, e.g. new filings under the training statistics
+  for chunk in prepare_chunks(chunks):
+    yield scaler.transform(chunk)
+
+
+def preprocess_file(file_path: str, output_path: str, scaler: OnlineScaler = None, chunksize: int = CHUNK_SIZE) -> int:
+  """
+  Writes the preprocessed insider history chunk by chunk.
+
+  Args:
+    file_path (str): The insider CSV.
+    output_path (str): CSV the cleaned, featured and standardized rows are written to.
+    scaler (OnlineScaler, optional): Fitted statistics to apply. Defaults to loading
+                                     SCALER_FILEPATH.
+    chunksize (int): Rows read at a time.
+
+  Returns:
+    int: Rows written.
+  """
+  scaler = OnlineScaler.load() if scaler is None else scaler
+  rows = 0
+  for chunk in preprocess_chunks(read_insider_chunks(file_path, chunksize), scaler):
+    chunk.to_csv(output_path, mode='w' if rows == 0 else 'a', header=rows == 0, index=False)
+    rows += len(chunk)
+  return rows
+
+
+def write_stats(insiders: pd.DataFrame, f) -> None:
+  # describe, info, head, tail, shape and the Ticker and Name counts of an insider frame, in that order
+  f.write(f'{insiders.describe()}\n')
+  insiders.info(buf=f)
+  for section in (insiders.head(), insiders.tail(), insiders.shape, insiders.Ticker.value_counts(), insiders.Name.value_counts()):
+    f.write(f'{section}\n')
+
+
 class InsiderSetAnalysis:
   
   def __init__(self, insiders: pd.DataFrame):
@@ -12,73 +198,56 @@ class InsiderSetAnalysis:
     
   def __visualize_ticker_freq(self) -> None:
     # Visualize the data
+    import seaborn as sns
     sns.histplot(data=self.insiders, x=self.insiders.Ticker.value_counts())
     
   def analyze_data(self) -> None:
     self.__visualize_ticker_freq()
     
   def generate_stats(self, suffix:str = '') -> None:
-    with open('insider_stats.txt', 'w') as f:
-      sys.stdout = f
-    print(self.insiders.describe())
-    print(self.insiders.info())
-    print(self.insiders.head())
-    print(self.insiders.tail())
-    print(self.insiders.shape)
-    print(self.insiders.Ticker.value_counts())
-    print(self.insiders.Name.value_counts())
-    sys.stdout = sys.__stdout__
+    # Write the summaries straight to the file rather than redirecting the process's stdout
+    with open(f'insider_stats{suffix}.txt', 'w') as f:
+      write_stats(self.insiders, f)
     
 
 class PreprocessingInsiderSet:
   
-  def __init__(self, df: pd.DataFrame):
+  def __init__(self, df: pd.DataFrame, scaler: OnlineScaler = None):
     self.insidersdf = df
+    self.df = df
+    # A fitted scaler, e.g. OnlineScaler.load(), normalizes with the training statistics
+    self.scaler = scaler
     
   def __visualize_ticker_freq(self) -> None:
     # Visualize the data
-    sns.histplot(data=self.insiders, x=self.insiders.Ticker.value_counts())
+    import seaborn as sns
+    sns.histplot(data=self.df, x=self.df.Ticker.value_counts())
     
   def analyze_data(self) -> None:
     self.__visualize_ticker_freq()
     
   def generate_stats(self, suffix:str = '') -> None:
-    with open('insider_stats.txt', 'w') as f:
-      sys.stdout = f
-    print(self.insiders.describe())
-    print(self.insiders.info())
-    print(self.insiders.head())
-    print(self.insiders.tail())
-    print(self.insiders.shape)
-    print(self.insiders.Ticker.value_counts())
-    print(self.insiders.Name.value_counts())
-    sys.stdout = sys.__stdout__
+    # Write the summaries straight to the file rather than redirecting the process's stdout
+    with open(f'insider_stats{suffix}.txt', 'w') as f:
+      write_stats(self.df, f)
     
   def __clean_data(self) -> pd.DataFrame:
-    # Drop rows with missing values
-    self.df.dropna(axis=0, inplace=True)
-    self.df.drop(self.df[self.df['Shares'] == 0].index, inplace=True)
-    self.df.drop(self.df[self.df['PricePerShare'] == 0].index, inplace=True)
-    self.df['Date'] = pd.to_datetime(self.df['Date'])
-    self.df['Ticker'] = self.df['Ticker'].astype(str)
-    self.df['Name'] = self.df['Name'].astype(str).str.lower()
-    self.df['fileDate'] = pd.to_datetime(self.df['fileDate'])
-    return self.df
-  
-  def __generate_features(self) -> pd.DataFrame:
-    # Generate features
-    self.df['Total'] = self.df['Shares'] * self.df['PricePerShare']
-    self.df['HoldingsPercent'] = (self.df['Shares'] / self.df['SharesOwnedFollowing']) * 100
-    self.df['TraderFrequency'] = self.df.groupby('Name')['Name'].transform('count')
+    # Drop rows with missing values, zero shares or zero prices in one pass, and add the row
+    # features, as the chunked path does before a scaler is fitted
+    self.df = add_row_features(clean_chunk(self.df))
     return self.df
   
   def __normalize_data(self) -> pd.DataFrame:
-    # Normalize the data
-    self.df = (self.df - self.df.mean()) / self.df.std()
+    # Standardize the numeric columns, fitting the statistics here unless a fitted scaler was given
+    if self.scaler is None:
+      self.scaler = OnlineScaler().partial_fit(self.df)
+    self.df = self.scaler.transform(self.df)
     return self.df
   
   def __visualize_data(self) -> None:
-    # Visualize the data
+    # Visualize the data, importing the plotting stack only when plotting
+    import matplotlib.pyplot as plt
+    import seaborn as sns
     sns.set()
     self.df.plot(figsize=(10, 5))
     plt.ylabel('Price')
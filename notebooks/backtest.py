@@ -0,0 +1,263 @@
+import pandas as pd
+import numpy as np
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from sklearn.model_selection import ParameterGrid
+from price_store import PriceStore
+from price_index import PriceIndex, to_days
+
+logger = logging.getLogger(__name__)
+
+TRADING_DAYS = 252
+
+# Trade direction of each insider transaction code: open market purchases go long, sales short
+DIRECTIONS = {'P': 1, 'S': -1}
+
+# Strategy parameters and their defaults. Any subset can be varied over a grid
+DEFAULT_PARAMS = {
+  'horizon': 20,       # Trading days each position is held
+  'entry_lag': 1,      # Trading days between the first bar on or after fileDate and the entry
+  'side': 'long',      # 'long' (purchases), 'short' (sales) or 'both'
+  'min_decile': 1,     # Only trade signals whose total_value decile is at least this
+  'sizing': 'equal',   # 'equal' weights every signal alike, 'decile' weights by total_value decile
+  'cost_bps': 10.0,    # Cost per unit of turnover, in basis points
+}
+
+SIDES = {'long': ('P',), 'short': ('S',), 'both': ('P', 'S')}
+
+
+def total_value_deciles(values, breakpoints: np.ndarray = None) -> tuple:
+  """
+  Decile (1 to 10) of each signal's total_value.
+
+  Args:
+    values (array-like): total_value of each signal.
+    breakpoints (np.ndarray, optional): The nine inner decile edges. Defaults to the deciles
+                                        of values themselves, which looks ahead within the sample;
+                                        pass edges fitted on an earlier period to avoid that.
+
+  Returns:
+    tuple: The deciles, 0 where the value is missing, and the breakpoints used.
+  """
+  values = np.abs(np.asarray(values, dtype=np.float64))
+  if breakpoints is None:
+    breakpoints = np.nanquantile(values, np.linspace(0.1, 0.9, 9)) if np.isfinite(values).any() else np.zeros(9)
+  deciles = np.searchsorted(breakpoints, values, side='right') + 1
+  return np.where(np.isnan(values), 0, deciles), breakpoints
+
+
+class Backtester:
+  """
+  Vectorized walk-forward backtest of insider signals over a daily price panel.
+
+  Every signal enters on the close of the trading day entry_lag bars after the first bar on or
+  after its fileDate, so a filing is only traded once it is public, and exits horizon bars
+  later, or on the ticker's last bar when its series ends first. The panel is laid out once as
+  a dense (date x ticker) matrix of daily returns; a strategy variant then builds its positions
+  with one bincount of entry and exit weights and a cumulative sum, so scoring a variant costs
+  a few array passes over that matrix rather than a loop over trades or days.
+
+  Held positions are rescaled every day to a gross exposure of 1 (fully invested across the
+  open signals, flat when there are none), and turnover, the daily sum of absolute weight
+  changes, is charged at cost_bps.
+
+  Args:
+    prices (pd.DataFrame or PriceStore): Daily prices with Ticker and Date as columns or as the
+                                         index, or a PriceStore to read only the signalled tickers from.
+    signals (pd.DataFrame): Insider trades with Ticker, fileDate and TransactionCode, and either
+                            total_value or Shares and PricePerShare.
+    pricepoint (str): The price column positions are marked to.
+    breakpoints (np.ndarray, optional): total_value decile edges, see total_value_deciles.
+  """
+
+  def __init__(self, prices, signals: pd.DataFrame, pricepoint: str = 'Close', breakpoints: np.ndarray = None):
+    signals = signals[signals['TransactionCode'].astype(str).isin(DIRECTIONS)]
+    if isinstance(prices, PriceStore):
+      self.index = PriceIndex.from_store(prices, signals['Ticker'].astype(str).unique(), pricepoint)
+    else:
+      self.index = PriceIndex(prices, pricepoint)
+
+    # Dense return matrix over every date any ticker traded, with prices carried over gaps
+    self.dates = np.unique(self.index.days)
+    self.rows = np.searchsorted(self.dates, self.index.days)
+    close = np.full((len(self.dates), len(self.index.tickers)), np.nan)
+    close[self.rows, self.index.codes] = self.index.values
+    close = pd.DataFrame(close).ffill().to_numpy()
+    self.returns = np.zeros_like(close)
+    with np.errstate(divide='ignore', invalid='ignore'):
+      self.returns[1:] = close[1:] / close[:-1] - 1
+    self.returns[~np.isfinite(self.returns)] = 0
+
+    if 'total_value' in signals.columns:
+      values = signals['total_value']
+    else:
+      values = signals['Shares'] * signals['PricePerShare']
+    self.deciles, self.breakpoints = total_value_deciles(values, breakpoints)
+    self.directions = signals['TransactionCode'].astype(str).map(DIRECTIONS).to_numpy(dtype=np.int64)
+    self.codes = self.index.ticker_codes(signals['Ticker'].astype(str))
+    self.days, self.missing = to_days(signals['fileDate'])
+    self._events = {}
+
+  @classmethod
+  def from_store(cls, store: PriceStore, signals: pd.DataFrame, pricepoint: str = 'Close', breakpoints: np.ndarray = None) -> 'Backtester':
+    return cls(store, signals, pricepoint, breakpoints)
+
+  def events(self, horizon: int, entry_lag: int) -> tuple:
+    # Entry row, exit row and return of every signal for a horizon and lag, NaN where untradable
+    key = (horizon, entry_lag)
+    if key not in self._events:
+      first, found = self.index.locate(self.codes, self.days, 'forward')
+      entry, found = self.index.offset(first, found & ~self.missing, entry_lag)
+      # Exit early on the ticker's last bar rather than dropping the trade
+      last = np.searchsorted(self.index.codes, self.index.codes[entry], side='right') - 1
+      exit_ = np.minimum(entry + horizon, last)
+      found &= exit_ > entry
+      values = self.index.values
+      with np.errstate(divide='ignore', invalid='ignore'):
+        returns = np.where(found, values[exit_] / values[entry] - 1, np.nan)
+      self._events[key] = (self.rows[entry], self.rows[exit_], returns)
+    return self._events[key]
+
+  def positions(self, params: dict) -> tuple:
+    # Summed signal sizes held each day (date x traded ticker), the tickers' codes and the mask
+    # of signals the variant trades. Only tickers the variant trades get a column
+    if params['side'] not in SIDES:
+      raise ValueError(f'side must be one of {tuple(SIDES)}, not {params["side"]}')
+    if params['sizing'] not in ('equal', 'decile'):
+      raise ValueError(f"sizing must be 'equal' or 'decile', not {params['sizing']}")
+    entries, exits, returns = self.events(params['horizon'], params['entry_lag'])
+    sides = [DIRECTIONS[code] for code in SIDES[params['side']]]
+    traded = ~np.isnan(returns) & np.isin(self.directions, sides) & (self.deciles >= params['min_decile'])
+
+    size = (self.directions * (self.deciles if params['sizing'] == 'decile' else 1))[traded]
+    tickers, columns = np.unique(self.codes[traded], return_inverse=True)
+    shape = (len(self.dates), len(tickers))
+    # Add each signal's size on its entry row and take it off on its exit row, in one bincount
+    cells = np.concatenate([entries[traded] * shape[1] + columns, exits[traded] * shape[1] + columns])
+    changes = np.bincount(cells, np.concatenate([size, -size]), minlength=shape[0] * shape[1]).reshape(shape)
+    return np.cumsum(changes, axis=0, out=changes), tickers, traded
+
+  def weights(self, **params) -> pd.DataFrame:
+    """
+    Daily target weights of one strategy variant.
+
+    Args:
+      **params: Any of DEFAULT_PARAMS. The rest keep their defaults.
+
+    Returns:
+      pd.DataFrame: Weights indexed by Date with a column per traded ticker, each row summing
+                    to a gross exposure of 1 or 0.
+    """
+    positions, tickers, _ = self.positions({**DEFAULT_PARAMS, **params})
+    gross = np.abs(positions).sum(axis=1, keepdims=True)
+    positions = np.divide(positions, gross, out=positions, where=gross > 0)
+    return pd.DataFrame(positions, columns=self.index.tickers[tickers], index=pd.DatetimeIndex(self.dates.astype('datetime64[D]'), name='Date'))
+
+  def portfolio(self, params: dict) -> tuple:
+    # Daily portfolio frame of a variant and the mask of signals it trades. Works on the
+    # unscaled positions and rescales in place, as each pass over the matrix dominates the cost
+    params = {**DEFAULT_PARAMS, **params}
+    positions, tickers, traded = self.positions(params)
+    returns = self.returns if len(tickers) == self.returns.shape[1] else self.returns[:, tickers]
+    exposure = np.abs(positions).sum(axis=1)
+    net_exposure = positions.sum(axis=1)
+    held = exposure > 0
+    scale = np.divide(1, exposure, out=np.zeros_like(exposure), where=held)
+
+    gross = np.zeros(len(self.dates))
+    gross[1:] = np.einsum('ij,ij->i', positions[:-1], returns[1:]) * scale[:-1]
+    weights = np.multiply(positions, scale[:, None], out=positions)
+    turnover = np.concatenate([[np.abs(weights[0]).sum()], np.abs(np.subtract(weights[1:], weights[:-1])).sum(axis=1)])
+    net = gross - turnover * params['cost_bps'] / 1e4
+    equity = np.cumprod(1 + net)
+    tilt = net_exposure * scale
+    return pd.DataFrame({'gross_return': gross,
+                         'return': net,
+                         'turnover': turnover,
+                         'long': np.where(held, (1 + tilt) / 2, 0),
+                         'short': np.where(held, -(1 - tilt) / 2, 0),
+                         'equity': equity,
+                         'drawdown': equity / np.maximum.accumulate(equity) - 1},
+                        index=pd.DatetimeIndex(self.dates.astype('datetime64[D]'), name='Date')), traded
+
+  def run(self, **params) -> pd.DataFrame:
+    """
+    Daily portfolio of one strategy variant.
+
+    Args:
+      **params: Any of DEFAULT_PARAMS. The rest keep their defaults.
+
+    Returns:
+      pd.DataFrame: Indexed by Date, with the gross and net daily return, turnover, long and
+                    short exposure, the net equity curve and its drawdown.
+    """
+    return self.portfolio(params)[0]
+
+  def score(self, **params) -> dict:
+    """
+    Summary statistics of one strategy variant.
+
+    Args:
+      **params: Any of DEFAULT_PARAMS. The rest keep their defaults.
+
+    Returns:
+      dict: The variant's parameters with its total and annualized return, volatility, Sharpe
+            ratio, max drawdown, mean daily turnover, trade count, hit rate and mean trade return.
+    """
+    params = {**DEFAULT_PARAMS, **params}
+    daily, traded = self.portfolio(params)
+    _, _, returns = self.events(params['horizon'], params['entry_lag'])
+    trades = returns[traded] * self.directions[traded]
+    net = daily['return'].to_numpy()
+    years = len(net) / TRADING_DAYS
+    equity = daily['equity'].iloc[-1] if len(net) else 1.0
+    deviation = net.std(ddof=1) if len(net) > 1 else np.nan
+    return {**params,
+            'total_return': equity - 1,
+            'annual_return': equity ** (1 / years) - 1 if years > 0 and equity > 0 else np.nan,
+            'volatility': deviation * np.sqrt(TRADING_DAYS),
+            'sharpe': net.mean() / deviation * np.sqrt(TRADING_DAYS) if deviation > 0 else np.nan,
+            'max_drawdown': daily['drawdown'].min() if len(net) else 0.0,
+            'turnover': daily['turnover'].mean() if len(net) else 0.0,
+            'trades': int(traded.sum()),
+            'hit_rate': (trades > 0).mean() if len(trades) else np.nan,
+            'mean_trade_return': trades.mean() if len(trades) else np.nan}
+
+
+# The backtester each pool worker scores against, set once per worker process
+_WORKER_BACKTESTER = None
+
+
+def _init_worker(backtester: Backtester) -> None:
+  global _WORKER_BACKTESTER
+  _WORKER_BACKTESTER = backtester
+
+
+def _score_variant(params: dict) -> dict:
+  return _WORKER_BACKTESTER.score(**params)
+
+
+def run_grid(backtester: Backtester, grid, processes: int = None) -> pd.DataFrame:
+  """
+  Scores every strategy variant of a parameter grid.
+
+  Args:
+    backtester (Backtester): The signals and price panel to score against.
+    grid (dict or list): Parameter values to combine, as for sklearn's ParameterGrid, e.g.
+                         {'horizon': [5, 20, 60], 'min_decile': [1, 5, 9]}.
+    processes (int, optional): Score in a process pool of this size. Each worker receives the
+                               backtester once, when it starts, rather than with every variant.
+                               Defaults to scoring serially in this process.
+
+  Returns:
+    pd.DataFrame: One row of parameters and statistics per variant, ordered by horizon and entry_lag.
+  """
+  # Consecutive variants sharing a horizon and lag reuse the events cached for them
+  variants = sorted(ParameterGrid(grid), key=lambda params: ({**DEFAULT_PARAMS, **params}['horizon'], {**DEFAULT_PARAMS, **params}['entry_lag']))
+  logger.info('Scoring %d strategy variants', len(variants))
+  if processes is not None and processes > 1:
+    with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker, initargs=(backtester,)) as executor:
+      scores = list(executor.map(_score_variant, variants, chunksize=max(1, len(variants) // (processes * 4))))
+  else:
+    scores = [backtester.score(**params) for params in variants]
+  return pd.DataFrame(scores)
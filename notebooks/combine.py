@@ -1,15 +1,250 @@
 import pandas as pd
+import numpy as np
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
 from sklearn.base import BaseEstimator, TransformerMixin
+from metrics import METRICS
+from price_store import PriceStore
+
+JOIN_KEYS = ['Date', 'Ticker']
+COMBINED_STORE_FILEPATH = '../data/combined/store/'
+
+# Tickers joined per batch: enough to amortize the per call overhead of the join and of
+# pickling pool tasks, few enough to keep a batch's output small
+TICKERS_PER_BATCH = 64
+
+
+def join_schema(prices: pd.DataFrame, insiders: pd.DataFrame) -> pd.Series:
+  # Column dtypes of the full left merge. Bars without a trade leave the trade columns missing,
+  # which upcasts them (int to float, bool to object), so the probe merges a bar with a trade
+  # whose Date cannot match
+  probe = insiders.iloc[:1].assign(Date=lambda df: df['Date'].where(np.zeros(len(df), dtype=bool)))
+  return prices.iloc[:1].merge(probe, on=JOIN_KEYS, how='left').dtypes
+
+
+def column_take(values: pd.Series, indices: np.ndarray) -> pd.api.extensions.ExtensionArray:
+  # Rows of a column by position, missing where the position is -1, upcasting as merge does
+  if isinstance(values.dtype, pd.api.extensions.ExtensionDtype):
+    return values.array.take(indices, allow_fill=True)
+  return pd.api.extensions.take(values.to_numpy(), indices, allow_fill=True)
+
+
+def sorted_left_join(bars: pd.DataFrame, trades: pd.DataFrame) -> pd.DataFrame:
+  """
+  Left join of a few tickers' bars with their trades on Date and Ticker by binary search.
+
+  Both keys are coded against the bars' distinct tickers and dates into one integer, the
+  trades are stable sorted by it once, and each bar's matching trades are the range between
+  two searchsorted bounds. The join is a handful of array passes rather than a hash join.
+  Rows come out as from merge: bars in order, each followed by its trades in their
+  original order, or once with missing trade columns.
+
+  Args:
+    bars (pd.DataFrame): Bars with Date and Ticker columns.
+    trades (pd.DataFrame): Trades with Date and Ticker columns.
+
+  Returns:
+    pd.DataFrame: The bar columns followed by the trade columns other than the keys.
+  """
+  ticker_codes, tickers = pd.factorize(bars['Ticker'], use_na_sentinel=False)
+  bar_dates = bars['Date'].to_numpy()
+  dates, date_codes = np.unique(bar_dates, return_inverse=True)
+  bar_keys = ticker_codes.astype(np.int64) * len(dates) + date_codes
+
+  trade_tickers = pd.Index(tickers).get_indexer(trades['Ticker'])
+  trade_dates = trades['Date'].to_numpy().astype(bar_dates.dtype)
+  trade_date_codes = np.minimum(np.searchsorted(dates, trade_dates), max(len(dates) - 1, 0))
+  # Trades on a ticker or date without a bar can never match, and are keyed past every bar
+  known = (trade_tickers >= 0) & (dates[trade_date_codes] == trade_dates) if len(dates) else np.zeros(len(trades), dtype=bool)
+  trade_keys = np.where(known, trade_tickers.astype(np.int64) * len(dates) + trade_date_codes, np.iinfo(np.int64).max)
+  order = np.argsort(trade_keys, kind='stable')
+  sorted_keys = trade_keys[order]
+
+  lower = np.searchsorted(sorted_keys, bar_keys, side='left')
+  matches = np.searchsorted(sorted_keys, bar_keys, side='right') - lower
+  repeats = np.maximum(matches, 1)
+  left = np.repeat(np.arange(len(bars)), repeats)
+  # Offset of each output row within its bar's run, i.e. into the bar's range of trades
+  offset = np.arange(len(left)) - np.repeat(np.cumsum(repeats) - repeats, repeats)
+  matched = np.repeat(matches, repeats) > 0
+  right = np.full(len(left), -1, dtype=np.int64)
+  right[matched] = order[(np.repeat(lower, repeats) + offset)[matched]]
+  columns = {column: column_take(bars[column], left) for column in bars.columns}
+  columns.update({column: column_take(trades[column], right) for column in trades.columns if column not in JOIN_KEYS})
+  return pd.DataFrame(columns)
+
+
+def partition_rows(df: pd.DataFrame) -> dict:
+  # Row positions of each ticker, in order of first appearance
+  return df.groupby('Ticker', sort=False, observed=True, dropna=False).indices
+
+
+def chunks(values: list, size: int):
+  # Consecutive lists of up to size values
+  values = iter(values)
+  return iter(lambda: list(islice(values, size)), [])
+
+
+class PartitionMerger:
+  """
+  Left merges a batch of tickers' bars with their trades and either returns the result or
+  writes each ticker's rows to its store partition. Bars are read from the source store when
+  a batch carries none.
+
+  Args:
+    schema (pd.Series): Output dtypes from join_schema.
+    source_root (str, optional): Price store the bars are read from.
+    target_root (str, optional): Store the merged partitions are written to.
+  """
+
+  def __init__(self, schema: pd.Series, source_root: str = None, target_root: str = None):
+    self.schema = schema
+    self.source = PriceStore(source_root) if source_root is not None else None
+    self.target = PriceStore(target_root) if target_root is not None else None
+
+  def merge(self, tickers: list, bars: pd.DataFrame, trades: pd.DataFrame) -> pd.DataFrame:
+    if bars is None:
+      bars = self.source.read_tickers(tickers).reset_index()
+    merged = sorted_left_join(bars, trades)[self.schema.index]
+    # Cast only the columns the batch's matches left narrower than the full merge's
+    for column, dtype in self.schema.items():
+      if merged[column].dtype != dtype:
+        merged[column] = merged[column].astype(dtype)
+    return merged
+
+  def __call__(self, batch: tuple):
+    # The merged frame of a batch of (tickers, bars, trades), or its row count when writing
+    merged = self.merge(*batch)
+    if self.target is None:
+      return merged
+    for ticker, rows in partition_rows(merged).items():
+      self.target.write_partition(ticker, merged.iloc[rows])
+    return len(merged)
+
+
+# The merger each pool worker runs batches through, built once per worker process
+_WORKER_MERGER = None
+
+
+def _init_worker(schema: pd.Series, source_root: str, target_root: str) -> None:
+  global _WORKER_MERGER
+  _WORKER_MERGER = PartitionMerger(schema, source_root, target_root)
+
+
+def _merge_task(batch: tuple):
+  return _WORKER_MERGER(batch)
+
+
+def partitioned_merge(prices, insiders: pd.DataFrame, store: PriceStore = None, processes: int = None):
+  """
+  The left merge of daily bars with insider trades on Date and Ticker, done a batch of
+  tickers at a time.
+
+  Both inputs are partitioned by ticker and each batch of TICKERS_PER_BATCH tickers' bars is
+  joined with only those tickers' trades by sorted_left_join. Bars can be read batch by
+  batch from a PriceStore instead of an in-memory panel, and the output can be streamed to
+  a store, one Arrow partition per ticker, instead of collected, so peak memory is a batch's
+  output rather than the whole joined panel. Pool tasks are submitted a few at a time, so
+  only a bounded number of batches are ever in flight.
+
+  Args:
+    prices (pd.DataFrame or PriceStore): Daily bars with Date and Ticker columns or index
+                                         levels, or the store to read them from.
+    insiders (pd.DataFrame): Insider trades with Date and Ticker columns.
+    store (PriceStore, optional): Store to write each ticker's merged rows to. Defaults to
+                                  returning the merged frame.
+    processes (int, optional): Merge in a process pool of this size. Defaults to merging serially.
+
+  Returns:
+    pd.DataFrame or PriceStore: The same rows, columns, dtypes and row order as
+                                prices.merge(insiders, on=['Date', 'Ticker'], how='left'), or the
+                                store holding them by ticker. Trade columns take the dtypes they
+                                have with missing values, as in any merge where some bar has no trade.
+  """
+  from_store = isinstance(prices, PriceStore)
+  reorder = False
+  trade_rows = partition_rows(insiders)
+  def trades_of(tickers):
+    rows = [trade_rows[ticker] for ticker in tickers if ticker in trade_rows]
+    return insiders.iloc[np.concatenate(rows)] if rows else insiders.iloc[:0]
+
+  if from_store:
+    tickers = prices.tickers()
+    schema = join_schema(prices.read_tickers(tickers[:1]).reset_index().head(1), insiders)
+    batches = ((batch, None, trades_of(batch)) for batch in chunks(tickers, TICKERS_PER_BATCH))
+  else:
+    # Index level keys come out of the merge as columns, in the merged frame's column order
+    schema = join_schema(prices, insiders)
+    prices = prices.reset_index([key for key in JOIN_KEYS if key not in prices.columns], drop=False)
+    bar_rows = partition_rows(prices)
+    # The merge keeps the panel's row order, which ticker by ticker output only matches when
+    # each ticker's bars are contiguous. Otherwise the output is sorted back by bar position
+    positions = np.concatenate(list(bar_rows.values())) if bar_rows else np.empty(0, dtype=np.int64)
+    reorder = store is None and not np.array_equal(positions, np.arange(len(prices)))
+    if reorder:
+      prices = prices.assign(_bar_position=np.arange(len(prices)))
+      schema['_bar_position'] = np.dtype(np.int64)
+    batches = ((batch, prices.iloc[np.concatenate([bar_rows[ticker] for ticker in batch])], trades_of(batch))
+               for batch in chunks(list(bar_rows), TICKERS_PER_BATCH))
+  source_root = prices.root if from_store else None
+  target_root = store.root if store is not None else None
+
+  with METRICS.span('partitioned_merge') as span:
+    results = []
+    if processes is not None and processes > 1:
+      with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker, initargs=(schema, source_root, target_root)) as executor:
+        pending = deque()
+        for batch in batches:
+          pending.append(executor.submit(_merge_task, batch))
+          if len(pending) >= 2 * processes:
+            results.append(pending.popleft().result())
+        while pending:
+          results.append(pending.popleft().result())
+    else:
+      merger = PartitionMerger(schema, source_root, target_root)
+      results = [merger(batch) for batch in batches]
+
+    if store is not None:
+      span['rows'] = sum(results)
+      return store
+    if not results:
+      return pd.DataFrame({column: pd.Series(dtype=dtype) for column, dtype in schema.items() if column != '_bar_position'})
+    merged = pd.concat(results, ignore_index=True)
+    if reorder:
+      order = np.argsort(merged['_bar_position'].to_numpy(), kind='stable')
+      merged = merged.drop(columns='_bar_position').iloc[order].reset_index(drop=True)
+    span['rows'] = len(merged)
+    return merged
+
 
 class CombineFrames(BaseEstimator, TransformerMixin):
-  
-  def __init__(self, daily_prices: pd.DataFrame, qq_insiders: pd.DataFrame):
+  """
+  Joins the daily price panel with the insider trades on Date and Ticker.
+
+  Args:
+    daily_prices (pd.DataFrame or PriceStore): Daily bars, or with partitioned set the store to
+                                               read them from batch by batch.
+    qq_insiders (pd.DataFrame): Insider trades.
+    partitioned (bool): Merge by ticker partitions with partitioned_merge, bounding peak memory.
+    store_root (str, optional): With partitioned set, stream the joined rows to a store at
+                                this root and return the store instead of a frame.
+    processes (int, optional): With partitioned set, merge in a process pool of this size.
+  """
+
+  def __init__(self, daily_prices: pd.DataFrame, qq_insiders: pd.DataFrame, partitioned: bool = False, store_root: str = None, processes: int = None):
     self.daily_prices = daily_prices
     self.qq_insiders = qq_insiders
-  
+    self.partitioned = partitioned
+    self.store_root = store_root
+    self.processes = processes
+
   def fit(self, X, y=None):
     return self
-  
+
   def transform(self, X, y=None):
+    if self.partitioned:
+      store = PriceStore(self.store_root) if self.store_root is not None else None
+      return partitioned_merge(self.daily_prices, self.qq_insiders, store, self.processes)
     self.daily_prices = self.daily_prices.merge(self.qq_insiders, on=['Date', 'Ticker'], how='left')
-    return self.daily_prices
\ No newline at end of file
+    return self.daily_prices
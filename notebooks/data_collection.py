@@ -1,47 +1,124 @@
 import pandas as pd
 import numpy as np
 import requests as req
-import quiverquant as qq
 import sys
 import os
-import glob
+import functools
+import logging
+import random
+import re
+import threading
+import time
+from types import MappingProxyType
 from datetime import datetime, timedelta
 from concurrent.futures import ThreadPoolExecutor
+from rate_limit import RateLimiter
+from sync_state import HighWaterMarks, business_days_since
+from response_cache import ResponseCache
+from jobs import JobJournal
+from insider_store import InsiderStore, KEY_COLUMNS
+from metrics import METRICS, METRICS_FILEPATH
+
+logger = logging.getLogger(__name__)
 
+# Keys and ticker lists are read on first use, never at import, and cached for the process
+@functools.lru_cache(maxsize=None)
 def read_api_key(filename: str) -> str:
   try:
     with open(filename, 'r') as f:
       return f.read().strip()
   except FileNotFoundError:
-    print(f'File {filename} not found.')
+    logger.warning('File %s not found.', filename)
     return None
   
 def make_qq_header(api_key: str) -> dict:
   return {'Accept': 'application/json',
           'Authorization': f'Bearer {api_key}'}
   
+@functools.lru_cache(maxsize=None)
 def read_ticker_file(filename: str) -> list:
   try:
     with open(filename, 'r') as f:
       return f.read().strip().split('\n')
   except FileNotFoundError:
-    print(f'File {filename} not found.')
+    logger.warning('File %s not found.', filename)
     return None
   
+# Large enough that max_workers threads can each keep a connection alive to the same host
+HTTP_POOL_MAXSIZE = 64
+_session = None
+_session_lock = threading.Lock()
+
+def shared_session() -> req.Session:
+  # One keep-alive, gzip-enabled connection pool shared by every ImportData in the process
+  global _session
+  with _session_lock:
+    if _session is None:
+      _session = req.Session()
+      adapter = req.adapters.HTTPAdapter(pool_connections=HTTP_POOL_MAXSIZE, pool_maxsize=HTTP_POOL_MAXSIZE)
+      _session.mount('https://', adapter)
+      _session.mount('http://', adapter)
+      _session.headers.update({'Accept-Encoding': 'gzip, deflate'})
+    return _session
+  
+def payload_frame(data) -> pd.DataFrame:
+  # Flat records such as OVERVIEW become a single row, nested payloads a frame as before
+  if isinstance(data, dict) and not any(isinstance(value, (dict, list)) for value in data.values()):
+    return pd.DataFrame([data])
+  return pd.DataFrame(data)
+  
+def comparable_values(values: pd.Series) -> pd.Series:
+  # A column compared by value, whether read back from CSV or fresh from JSON: numbers as
+  # numbers (100 and 100.0 match) and every kind of missing value as one
+  numbers = pd.to_numeric(values, errors='coerce')
+  if numbers.notna().sum() == values.notna().sum():
+    return numbers
+  return values.astype(object).where(values.notna(), None).astype(str)
+  
+class ThrottledError(Exception):
+  # Raised when an API answers with a rate limit notice instead of data
+  pass
+  
 class ImportData:
   
   DATA_FILEPATH = '../data/'
+  # AlphaVantage answers over-quota calls with 200 and a 'Note' in place of data, or an
+  # 'Information' in the rate limit wording. Other 'Information' bodies, such as premium
+  # endpoint or invalid key rejections, fail the same way on every retry
+  THROTTLE_KEY = 'Note'
+  MESSAGE_KEY = 'Information'
+  RATE_LIMIT_PATTERN = re.compile(r'rate limit|call frequency|requests per (?:minute|day)', re.IGNORECASE)
   
-  def __init__(self, base_url: str, api_name: str, headers = None, params = None, extension = ''):
+  def __init__(self, base_url: str, api_name: str, headers = None, params = None, extension = '', rate_limiter: RateLimiter = None, max_workers: int = 10, retries: int = 5, backoff: float = 2.0, session: req.Session = None, high_water_marks: HighWaterMarks = None, cache: ResponseCache = None, journal: JobJournal = None, tag: str = None):
     self.base_url = base_url
-    self.headers = headers if headers is not None else {}
-    self.params = params if params is not None else {}
+    self.headers = dict(headers) if headers is not None else {}
+    # Read-only so worker threads can only build per-request copies
+    self.params = MappingProxyType(dict(params) if params is not None else {})
     self.api_name = api_name
     self.extension = extension
+    self.rate_limiter = rate_limiter
+    self.max_workers = max_workers
+    self.retries = retries
+    self.backoff = backoff
+    self.session = session if session is not None else shared_session()
+    self.high_water_marks = high_water_marks
+    self.cache = cache
+    # AlphaVantage multiplexes endpoints through one URL by 'function'
+    self.endpoint = self.params.get('function', self.extension)
+    # tag names a variant (e.g. EMA-50) in per value file names and journal entries
+    self.journal = journal
+    self.tag = tag
+    self.unit = tag if tag is not None else self.endpoint
     
-  def __get_single_dataset(self) -> pd.DataFrame:
-    # Get a single dataset from any API
-    response = req.get(self.base_url + self.extension, headers=self.headers, params=self.params)
+  def __get_single_payload(self, params: dict):
+    # Get a single decoded JSON payload from any API over the pooled keep-alive session
+    start = time.perf_counter()
+    response = self.session.get(self.base_url + self.extension, headers=self.headers, params=params)
+    METRICS.observe('http_request_seconds', time.perf_counter() - start, api=self.api_name, endpoint=self.endpoint)
+    METRICS.inc('http_requests_total', api=self.api_name, endpoint=self.endpoint, status=response.status_code)
+    METRICS.inc('http_response_bytes_total', len(response.content), api=self.api_name, endpoint=self.endpoint)
+    if response.status_code == 429:
+      raise ThrottledError(f'Error: {response.status_code}. {response.text}')
     if response.status_code != 200:
       raise Exception(f'Error: {response.status_code}. Failed to fetch dataset: {response.text}')
     data = response.json()
@@ -49,83 +126,317 @@ class ImportData:
     if isinstance(data, dict):
       if 'Error Message' in data.keys():
         raise Exception(f'JSON Error Message: {data["Error Message"]}')
-      print(f'JSON Keys: {data.keys()}')
+      # A body of nothing but notices carries no data
+      if data and set(data.keys()) <= {self.THROTTLE_KEY, self.MESSAGE_KEY}:
+        if self.THROTTLE_KEY in data:
+          raise ThrottledError(data[self.THROTTLE_KEY])
+        if self.RATE_LIMIT_PATTERN.search(str(data[self.MESSAGE_KEY])):
+          raise ThrottledError(data[self.MESSAGE_KEY])
+        raise Exception(f'JSON Information: {data[self.MESSAGE_KEY]}')
+    return data
+  
+  def __get_with_retry(self, params: dict = None) -> pd.DataFrame:
+    # Serve fresh cached responses without touching the quota
+    params = self.params if params is None else params
+    if self.cache is not None:
+      data = self.cache.get(self.endpoint, params)
+      if data is not None:
+        return payload_frame(data)
+    # Wait for the rate limiter before every attempt and back off exponentially when throttled
+    for attempt in range(self.retries + 1):
+      if self.rate_limiter is not None:
+        METRICS.inc('rate_limit_wait_seconds_total', self.rate_limiter.acquire(), api=self.api_name, endpoint=self.endpoint)
+      try:
+        data = self.__get_single_payload(params)
+        if self.cache is not None:
+          self.cache.put(self.endpoint, params, data)
+        return payload_frame(data)
+      except ThrottledError as e:
+        if attempt == self.retries:
+          raise
+        delay = self.backoff * 2 ** attempt + random.uniform(0, self.backoff)
+        METRICS.inc('http_throttled_total', api=self.api_name, endpoint=self.endpoint)
+        logger.warning('Throttled: %s Retrying in %.1fs', e, delay)
+        time.sleep(delay)
       
-    df = pd.DataFrame(response.json())
+  def __upsert_csv(self, df: pd.DataFrame, path: str, by_index: bool = True) -> pd.DataFrame:
+    # Merge new rows into the stored file, newer rows replacing stored ones with the same key
+    if os.path.exists(path):
+      existing = pd.read_csv(path, index_col=0)
+      if by_index:
+        df = pd.concat([existing, df])
+        df = df[~df.index.duplicated(keep='last')]
+        # Metadata rows stay ahead of the date rows, as in the raw AlphaVantage frame
+        is_date = df.index.astype(str).str.match(r'\d{4}-\d{2}-\d{2}$')
+        df = pd.concat([df[~is_date], df[is_date].sort_index()])
+      else:
+        df = pd.concat([existing, df], ignore_index=True)
+        # Insider records are the same trade when their natural key matches once normalized as
+        # the store does it. Other records have no key, so every column is compared by value
+        if set(KEY_COLUMNS) <= set(df.columns):
+          keys = InsiderStore.normalize(df)[KEY_COLUMNS]
+        else:
+          keys = df.apply(comparable_values)
+        df = df[~keys.duplicated(keep='last')].reset_index(drop=True)
+    df.to_csv(path, index=True)
     return df
       
-  def __download_datasets(self, param: str, values: list) -> [pd.DataFrame]:
-    dfs = []
-    
-    for value in values:
-      try:
-        self.params[param] = value
-        print("Params: {}".format(self.params))
-        df= self.__get_single_dataset()
-        if glob.glob(f'{self.DATA_FILEPATH}{self.api_name}_{self.extension.replace("/", "-")}_{value}\.csv'):
-          df = pd.concat([pd.read_csv(f) for f in glob.glob(f'{self.DATA_FILEPATH}{self.api_name}_{self.extension.replace("/", "-")}_{value}\.csv')])
-        df.to_csv(f'{self.DATA_FILEPATH}{self.api_name}_{self.extension.replace("/", "-")}_{value}.csv', index=True)
-        dfs.append(df)
-      except Exception as e:
-        print(f'Error: {e}')
-        continue
+  def value_path(self, value: str) -> str:
+    # The file a single value's rows are upserted into, e.g. av_query_AAPL.csv or av_EMA-50_AAPL.csv
+    name = self.tag if self.tag is not None else self.extension
+    return f'{self.DATA_FILEPATH}{self.api_name}_{name.replace("/", "-")}_{value}.csv'
       
-    return dfs
+  def __fetch_value(self, param: str, value: str, overrides: dict = None) -> pd.DataFrame:
+    # Each call gets its own copy of the params so concurrent workers never share state
+    params = dict(self.params, **{param: value}, **(overrides or {}))
+    df = self.__get_with_retry(params)
+    df = self.__upsert_csv(df, self.value_path(value))
+    if self.high_water_marks is not None:
+      self.high_water_marks.update(self.endpoint, value, df.index)
+    return df
+      
+  def __download_value(self, param: str, value: str, overrides: dict = None) -> pd.DataFrame:
+    # The value's file is flushed before the unit is journaled, so a crash never loses finished work
+    if self.journal is not None:
+      return self.journal.run_unit(self.unit, value, lambda: self.__fetch_value(param, value, overrides))
+    try:
+      return self.__fetch_value(param, value, overrides)
+    except Exception as e:
+      METRICS.inc('download_errors_total', api=self.api_name, endpoint=self.unit)
+      logger.error('Error: %s: %s', value, e)
+      return None
   
-  def download_datasets(self, param: str, values: list) -> [pd.DataFrame]:
-    with ThreadPoolExecutor() as executor:
-      return executor.submit(self.__download_datasets, param, values).result()
+  def download_datasets(self, param: str, values: list, overrides: dict = None) -> [pd.DataFrame]:
+    # At most max_workers requests in flight, each one paced by the shared rate limiter.
+    # overrides maps a value to extra params for its request only, e.g. a per ticker outputsize.
+    # With a journal, values already done in this run are skipped and failures are recorded
+    overrides = overrides if overrides is not None else {}
+    if self.journal is not None:
+      values = self.journal.pending(self.unit, values)
+    with METRICS.span('download_datasets', api=self.api_name, endpoint=self.unit) as span:
+      with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+        dfs = list(executor.map(lambda value: self.__download_value(param, value, overrides.get(value)), values))
+      dfs = [df for df in dfs if df is not None]
+      span['rows'] = sum(len(df) for df in dfs)
+    return dfs
+      
+  def get_dataset(self) -> pd.DataFrame:
+    # The decoded frame alone, for callers that persist it themselves
+    return self.__get_with_retry()
       
   def download_dataset(self) -> pd.DataFrame:
     with ThreadPoolExecutor(max_workers=10) as executor:
-      df = executor.submit(self.__get_single_dataset).result()
+      df = executor.submit(self.__get_with_retry).result()
       if self.extension is not None:
-        if glob.glob(f'{self.DATA_FILEPATH}{self.api_name}_{self.extension.replace("/", "-")}.csv'):
-          df = pd.concat([pd.read_csv(f) for f in glob.glob(f'{self.DATA_FILEPATH}{self.api_name}_{self.extension.replace("/", "-")}.csv')])
-        df.to_csv(f'{self.DATA_FILEPATH}{self.api_name}_{self.extension.replace("/", "-")}.csv', index=True)
-        return df
+        # Record style responses have no natural index, so repeats are whole duplicate rows
+        return self.__upsert_csv(df, f'{self.DATA_FILEPATH}{self.api_name}_{self.extension.replace("/", "-")}.csv', by_index=False)
   
 class QuiverDatasets:
   
   #SP500_TICKERS = pd.read_csv('https://datahub.io/core/s-and-p-500-companies/r/constituents.csv').Symbol.tolist()
   QQ_BASE_URL = 'https://api.quiverquant.com/'
+  QQ_KEY_FILE = 'keys/qq_api_key.txt'
   
-  def __init__(self, api_key = read_api_key('keys/qq_api_key.txt'), base_url = QQ_BASE_URL, tickers = []):
-    self.api_key = api_key
+  def __init__(self, api_key = None, base_url = QQ_BASE_URL, tickers = [], cache: ResponseCache = None, insider_store: InsiderStore = None):
+    self.api_key = api_key if api_key is not None else read_api_key(self.QQ_KEY_FILE)
     self.base_url = base_url
     self.tickers = tickers
-    self.header = make_qq_header(api_key)
+    self.header = make_qq_header(self.api_key)
+    self.cache = cache
+    self.insider_store = insider_store
     
   def get_live_insider_set(self):
-    # Get the insider trading data from QuiverQuant
+    # Get the insider trading data from QuiverQuant. With a store the pull is upserted on the
+    # trades' natural key, costing only the rows pulled, instead of rewriting the whole CSV
     header = {'Accept': 'application/json',
                 'Authorization': f'Bearer {self.api_key}'}
     extension = 'beta/live/insiders'
     params = {'limit_codes': 'true'}
-    importer = ImportData(self.base_url, 'qq', header, params, extension)
-    return importer.download_dataset()
+    importer = ImportData(self.base_url, 'qq', header, params, extension, cache=self.cache)
+    if self.insider_store is None:
+      return importer.download_dataset()
+    df = importer.get_dataset()
+    upserted = self.insider_store.upsert(df)
+    METRICS.inc('rows_upserted_total', upserted, table='insiders')
+    logger.info('Upserted %d insider trades', upserted)
+    return df
+  
+class EdgarDatasets:
+  """
+  Backfills Form 4 submissions straight from EDGAR for a list of insider or issuer CIKs.
+
+  Submissions JSON and archive documents are fetched concurrently over the shared session,
+  with every request paced by one rate limiter held under SEC's 10 requests/second fair
+  access cap and sent with the User-Agent SEC requires. Archives are stored as
+  <accession>.txt, and accessions already stored are never fetched again.
+
+  Args:
+    user_agent (str): Company name and contact email, as SEC requires.
+    data_url (str): Base URL of the submissions API. Point at a local stand-in for tests.
+    archives_url (str): Base URL of the EDGAR archives.
+    calls_per_second (float): Request rate shared by all workers.
+    max_workers (int): Requests in flight at once.
+    filings_directory (str): Where submission .txt files are stored.
+  """
+  
+  SEC_DATA_URL = 'https://data.sec.gov/'
+  SEC_ARCHIVES_URL = 'https://www.sec.gov/Archives/edgar/data/'
+  SEC_USER_AGENT = 'XtraByte Consulting, Inc., bkowalczyk@xtrabyteconsulting.com'
+  SEC_CALLS_PER_SECOND = 10
+  FILINGS_FILEPATH = '../data/insider-trades/filings/'
+  
+  def __init__(self, user_agent: str = SEC_USER_AGENT, data_url: str = SEC_DATA_URL, archives_url: str = SEC_ARCHIVES_URL, calls_per_second: float = SEC_CALLS_PER_SECOND, max_workers: int = 8, filings_directory: str = FILINGS_FILEPATH, retries: int = 5, backoff: float = 1.0):
+    self.user_agent = user_agent
+    self.data_url = data_url
+    self.archives_url = archives_url
+    self.rate_limiter = RateLimiter(calls_per_second=calls_per_second)
+    self.max_workers = max_workers
+    self.filings_directory = filings_directory
+    self.retries = retries
+    self.backoff = backoff
+    self.session = shared_session()
+    self.headers = {'User-Agent': user_agent, 'Accept-Encoding': 'gzip, deflate'}
+    
+  def __get(self, url: str) -> req.Response:
+    # Paced GET that backs off when SEC answers 429 or 503
+    endpoint = 'submissions' if url.startswith(self.data_url) else 'archives'
+    for attempt in range(self.retries + 1):
+      METRICS.inc('rate_limit_wait_seconds_total', self.rate_limiter.acquire(), api='sec', endpoint=endpoint)
+      start = time.perf_counter()
+      response = self.session.get(url, headers=self.headers)
+      METRICS.observe('http_request_seconds', time.perf_counter() - start, api='sec', endpoint=endpoint)
+      METRICS.inc('http_requests_total', api='sec', endpoint=endpoint, status=response.status_code)
+      METRICS.inc('http_response_bytes_total', len(response.content), api='sec', endpoint=endpoint)
+      if response.status_code not in (429, 503):
+        break
+      if attempt < self.retries:
+        delay = self.backoff * 2 ** attempt + random.uniform(0, self.backoff)
+        METRICS.inc('http_throttled_total', api='sec', endpoint=endpoint)
+        logger.warning('Throttled by SEC on %s. Retrying in %.1fs', url, delay)
+        time.sleep(delay)
+    if response.status_code != 200:
+      raise Exception(f'Error: {response.status_code}. Failed to fetch {url}')
+    return response
+  
+  def get_submissions(self, cik: str, include_history: bool = True) -> pd.DataFrame:
+    # All filings listed for one CIK, including the older pages when include_history is set
+    cik = f'{int(cik):010d}'
+    data = self.__get(f'{self.data_url}submissions/CIK{cik}.json').json()
+    pages = [pd.DataFrame(data['filings']['recent'])]
+    if include_history:
+      for page in data['filings'].get('files', []):
+        pages.append(pd.DataFrame(self.__get(f'{self.data_url}submissions/{page["name"]}').json()))
+    df = pd.concat(pages, ignore_index=True)
+    df.insert(0, 'cik', cik)
+    # Archive paths use the unpadded CIK and the accession number without dashes
+    folder = self.archives_url + str(int(cik)) + '/' + df['accessionNumber'].str.replace('-', '', regex=False) + '/'
+    df['fileURL'] = folder + df['accessionNumber'] + '.txt'
+    df['documentURL'] = folder + df['primaryDocument']
+    return df
+  
+  def get_submissions_batch(self, ciks: list, include_history: bool = True) -> pd.DataFrame:
+    # Submissions for many CIKs fetched concurrently, skipping CIKs that fail
+    def get_or_none(cik: str) -> pd.DataFrame:
+      try:
+        return self.get_submissions(cik, include_history)
+      except Exception as e:
+        METRICS.inc('download_errors_total', api='sec', endpoint='submissions')
+        logger.error('Error: CIK %s: %s', cik, e)
+        return None
+    with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+      frames = [df for df in executor.map(get_or_none, ciks) if df is not None]
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+  
+  def stored_accessions(self) -> set:
+    if not os.path.isdir(self.filings_directory):
+      return set()
+    return {filename[:-len('.txt')] for filename in os.listdir(self.filings_directory) if filename.endswith('.txt')}
+  
+  def __download_archive(self, accession: str, url: str) -> str:
+    path = os.path.join(self.filings_directory, f'{accession}.txt')
+    try:
+      content = self.__get(url).content
+    except Exception as e:
+      METRICS.inc('download_errors_total', api='sec', endpoint='archives')
+      logger.error('Error: %s: %s', accession, e)
+      return None
+    with open(path + '.tmp', 'wb') as f:
+      f.write(content)
+    os.replace(path + '.tmp', path)
+    return path
+  
+  def download_archives(self, filings: pd.DataFrame) -> list:
+    # Fetch the full submission text of every filing not stored yet
+    os.makedirs(self.filings_directory, exist_ok=True)
+    new = filings[~filings['accessionNumber'].isin(self.stored_accessions())].drop_duplicates('accessionNumber')
+    logger.info('Downloading %d of %d filings', len(new), len(filings))
+    with METRICS.span('download_archives', api='sec') as span:
+      with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+        paths = [path for path in executor.map(self.__download_archive, new['accessionNumber'], new['fileURL']) if path is not None]
+      span['rows'] = len(paths)
+    return paths
+  
+  def ingest(self, ciks: list, forms: tuple = ('4',), include_history: bool = True) -> list:
+    """
+    Downloads every new filing of the given forms for a list of CIKs.
+
+    Args:
+      ciks (list): Insider or issuer CIKs.
+      forms (tuple, optional): Form types to keep. Defaults to Form 4 only.
+      include_history (bool, optional): Also walk the older submissions pages. Defaults to True.
+
+    Returns:
+      list: Paths of the submission files written by this run.
+    """
+    filings = self.get_submissions_batch(ciks, include_history)
+    if filings.empty:
+      return []
+    return self.download_archives(filings[filings['form'].isin(forms)])
   
 class SecApiIO:
   SAIO_BASE_URL = 'https://api.sec-api.io/'
   f = 'https://api.sec-api.io/insider-trading?limit=100&sort=-transaction_date&filter=%7B%22transaction_date%22%3A%7B%22gt%22%3A%222021-01-01%22%7D%7D'
 
 
-import sched
-import time
-
 class AlphaVantageDatasets:
     
   AV_BASE_URL = 'https://www.alphavantage.co/'
-  AV_API_KEY = read_api_key('keys/av_api_key.txt')
-  ABOVE_MEDIAN_TICKERS = read_ticker_file('outputs/tickers_value_over_median.txt')
+  AV_KEY_FILE = 'keys/av_api_key.txt'
+  ABOVE_MEDIAN_TICKERS_FILE = 'outputs/tickers_value_over_median.txt'
+  # Quota of the current plan, shared by every call made through one instance
+  AV_CALLS_PER_MINUTE = 30
+  AV_CALLS_PER_DAY = None
+  # outputsize=compact returns the latest 100 bars
+  AV_COMPACT_SIZE = 100
+  SYNC_STATE_FILE = '../data/sync_state.json'
   
-  def __init__(self, api_key = AV_API_KEY, base_url = AV_BASE_URL):
-    self.api_key = api_key
+  def __init__(self, api_key = None, base_url = AV_BASE_URL, calls_per_minute: float = AV_CALLS_PER_MINUTE, calls_per_day: float = AV_CALLS_PER_DAY, max_workers: int = 8, sync_state_file: str = SYNC_STATE_FILE, cache: ResponseCache = None, journal: JobJournal = None):
+    self.api_key = api_key if api_key is not None else read_api_key(self.AV_KEY_FILE)
     self.base_url = base_url
     self.header = {'Accept': 'application/json'}
     self.extension = 'query'
     self.params = {'apikey': self.api_key}
     self.series_frame = pd.DataFrame()
+    self.rate_limiter = RateLimiter(calls_per_minute=calls_per_minute, calls_per_day=calls_per_day)
+    self.max_workers = max_workers
+    self.high_water_marks = HighWaterMarks(sync_state_file)
+    self.cache = cache
+    self.journal = journal
+    
+  def __sync_plan(self, function: str, tickers: list) -> tuple:
+    # Tickers that may have new bars, with compact requests for those whose gap fits in one
+    to_fetch, overrides = [], {}
+    for ticker in tickers:
+      mark = self.high_water_marks.get(function, ticker)
+      if mark is None:
+        overrides[ticker] = {'outputsize': 'full'}
+      else:
+        gap = business_days_since(mark)
+        if gap == 0:
+          continue
+        overrides[ticker] = {'outputsize': 'compact' if gap <= self.AV_COMPACT_SIZE else 'full'}
+      to_fetch.append(ticker)
+    return to_fetch, overrides
     
   def get_daily(self, ticker: str, outputsize: str = 'full') -> pd.DataFrame:
     # Get the daily data from AlphaVantage
@@ -133,56 +444,44 @@ class AlphaVantageDatasets:
               'symbol': ticker,
               'outputsize': outputsize,
               'apikey': self.api_key}
-    importer = ImportData(self.base_url, 'av', self.header, params, self.extension)
+    importer = ImportData(self.base_url, 'av', self.header, params, self.extension, rate_limiter=self.rate_limiter, cache=self.cache)
     return importer.download_dataset()
-  
-  def __get_daily_batch(self, start: int, tickers: list, scheduler: sched.scheduler, outputsize: str = 'full') -> None:
-
-    if start + 30 > len(tickers) - 1:
-      print("Downloading final tickers {} to {}".format(start, len(tickers)-1))
-      t_30 = tickers[start:]
-      finished = True
-    else:
-      t_30 = tickers[start:start+25]
-      print("Downloading tickers {} to {}".format(tickers.index(t_30[0]), tickers.index(t_30[-1])))
-      finished = False
-
-    # Get the daily timeseries data from AlphaVantage
-    params = {'function': 'TIME_SERIES_DAILY',
-          'outputsize': outputsize,
-          'apikey': self.api_key}
-    importer = ImportData(self.base_url, 'av', self.header, params=params, extension=self.extension)
-    frames = importer.download_datasets('symbol', t_30)
-    frame = pd.concat(frames)
-    print("Downloaded frame size: {}".format(frame.shape))
-    self.series_frame = pd.concat([self.series_frame, frame])
-    print("Series frame size: {}".format(self.series_frame.shape))
-
-    if finished:
-      self.series_frame.to_csv(f'../data/ticker-prices/av_agg_daily_series.csv', index=True)
-      return
-    else:
-      scheduler.enter(70, 1, self.__get_daily_batch, (start+25, tickers, scheduler, outputsize))
     
-  def get_daily_batch(self, tickers: list = ABOVE_MEDIAN_TICKERS, outputsize: str = 'compact') -> pd.DataFrame:
+  def get_daily_batch(self, tickers: list = None, outputsize: str = 'compact', incremental: bool = False) -> pd.DataFrame:
     """
-    Downloads daily series of ticker data from AlphaVantage API with the 30 call/min limit.
+    Downloads daily series of ticker data from AlphaVantage API as fast as the quota allows.
+
+    Up to max_workers requests are in flight at once and every request waits on the instance's
+    token bucket rate limiter, so the run is paced by calls_per_minute and calls_per_day
+    rather than by fixed blocks and sleeps. Throttle notices are retried with backoff.
+    New bars are upserted into each ticker's file and its high-water mark is recorded. With a
+    journal, each finished ticker is checkpointed, so a rerun after a crash skips it.
 
     Args:
-      start (int): The starting index of the tickers list.
-      tickers (list): List of ticker symbols.
+      tickers (list, optional): List of ticker symbols. Defaults to the tickers in
+                                ABOVE_MEDIAN_TICKERS_FILE.
       outputsize (str, optional): The size of the output data. Options are 'compact' or 'full.
-                                  Defaults to 'full'.
+                                  Defaults to 'compact'.
+      incremental (bool, optional): Skip tickers already up to date and choose outputsize per
+                                    ticker from its high-water mark: compact when the gap fits
+                                    in the latest 100 bars, full otherwise. Defaults to False.
 
     Returns:
-      pd.DataFrame: The dataframe of the daily series data for all tickers.
-
-    Raises:
-      Exception: If the response status code is not 200.
+      pd.DataFrame: The daily series data for the tickers downloaded in this call.
     """
-    scheduler = sched.scheduler(time.time, time.sleep)
-    scheduler.enter(0, 1, self.__get_daily_batch, (0, tickers, scheduler, outputsize))
-    scheduler.run()
+    tickers = read_ticker_file(self.ABOVE_MEDIAN_TICKERS_FILE) if tickers is None else tickers
+    overrides = None
+    if incremental:
+      tickers, overrides = self.__sync_plan('TIME_SERIES_DAILY', tickers)
+    logger.info('Downloading %d tickers', len(tickers))
+    params = {'function': 'TIME_SERIES_DAILY',
+          'outputsize': outputsize,
+          'apikey': self.api_key}
+    importer = ImportData(self.base_url, 'av', self.header, params=params, extension=self.extension, rate_limiter=self.rate_limiter, max_workers=self.max_workers, high_water_marks=self.high_water_marks, cache=self.cache, journal=self.journal)
+    # Every ticker is already flushed to its own file, so nothing is held back for a final write
+    frames = importer.download_datasets('symbol', tickers, overrides)
+    self.series_frame = pd.concat(frames) if frames else pd.DataFrame()
+    logger.info('Series frame size: %s', self.series_frame.shape)
     return self.series_frame
     
   def get_daily_adjusted(self, ticker: str, outputsize: str = 'full') -> pd.DataFrame:
@@ -191,30 +490,33 @@ class AlphaVantageDatasets:
               'symbol': ticker,
               'outputsize': outputsize,
               'apikey': self.api_key}
-    importer = ImportData(self.base_url, 'av', self.header, params, self.extension)
+    importer = ImportData(self.base_url, 'av', self.header, params, self.extension, rate_limiter=self.rate_limiter, cache=self.cache)
     return importer.download_dataset()
   
-  def get_daily_adjusted_batch(self, tickers: list, outputsize: str = 'full') -> [pd.DataFrame]:
-    # Get the daily adjusted data from AlphaVantage
+  def get_daily_adjusted_batch(self, tickers: list, outputsize: str = 'full', incremental: bool = False) -> [pd.DataFrame]:
+    # Get the daily adjusted data from AlphaVantage, only the missing bars when incremental
+    overrides = None
+    if incremental:
+      tickers, overrides = self.__sync_plan('TIME_SERIES_DAILY_ADJUSTED', tickers)
     params = {'function': 'TIME_SERIES_DAILY_ADJUSTED',
               'outputsize': outputsize,
               'apikey': self.api_key}
-    importer = ImportData(self.base_url, 'av', self.header, params=params, extension=self.extension)
-    return importer.download_datasets('symbol', tickers)
+    importer = ImportData(self.base_url, 'av', self.header, params=params, extension=self.extension, rate_limiter=self.rate_limiter, max_workers=self.max_workers, high_water_marks=self.high_water_marks, cache=self.cache, journal=self.journal, tag='TIME_SERIES_DAILY_ADJUSTED')
+    return importer.download_datasets('symbol', tickers, overrides)
   
   def get_company_overview(self, ticker: str) -> pd.DataFrame:
     # Get the company overview data from AlphaVantage
     params = {'function': 'OVERVIEW',
               'symbol': ticker,
               'apikey': self.api_key}
-    importer = ImportData(self.base_url, 'av', self.header, params, self.extension)
+    importer = ImportData(self.base_url, 'av', self.header, params, self.extension, rate_limiter=self.rate_limiter, cache=self.cache)
     return importer.download_dataset()
   
   def get_company_overview_batch(self, tickers: list) -> [pd.DataFrame]:
     # Get the company overview data from AlphaVantage
     params = {'function': 'OVERVIEW',
               'apikey': self.api_key}
-    importer = ImportData(self.base_url, 'av', self.header, params=params, extension=self.extension)
+    importer = ImportData(self.base_url, 'av', self.header, params=params, extension=self.extension, rate_limiter=self.rate_limiter, max_workers=self.max_workers, cache=self.cache, journal=self.journal, tag='OVERVIEW')
     return importer.download_datasets('symbol', tickers)
   
   def get_income_statement(self, ticker: str, period: str = 'annual') -> pd.DataFrame:
@@ -223,9 +525,27 @@ class AlphaVantageDatasets:
               'symbol': ticker,
               'period': period,
               'apikey': self.api_key}
-    importer = ImportData(self.base_url, 'av', self.header, params, self.extension)
+    importer = ImportData(self.base_url, 'av', self.header, params, self.extension, rate_limiter=self.rate_limiter, cache=self.cache)
     return importer.download_dataset()
   
+  def get_income_statement_batch(self, tickers: list, period: str = 'annual') -> [pd.DataFrame]:
+    # Get the income statement data from AlphaVantage, one file and journal unit per ticker
+    params = {'function': 'INCOME_STATEMENT',
+              'period': period,
+              'apikey': self.api_key}
+    importer = ImportData(self.base_url, 'av', self.header, params=params, extension=self.extension, rate_limiter=self.rate_limiter, max_workers=self.max_workers, cache=self.cache, journal=self.journal, tag=f'INCOME_STATEMENT-{period}')
+    return importer.download_datasets('symbol', tickers)
+  
+  def __indicator_batch(self, function: str, tickers: list, interval: str, time_period: int, series_type: str) -> [pd.DataFrame]:
+    # One technical indicator for many tickers, each window length getting its own files and journal units
+    params = {'function': function,
+              'interval': interval,
+              'time_period': time_period,
+              'series_type': series_type,
+              'apikey': self.api_key}
+    importer = ImportData(self.base_url, 'av', self.header, params=params, extension=self.extension, rate_limiter=self.rate_limiter, max_workers=self.max_workers, cache=self.cache, journal=self.journal, tag=f'{function}-{interval}-{time_period}-{series_type}')
+    return importer.download_datasets('symbol', tickers)
+  
   def get_emas(self, ticker: str, interval: str = 'daily', time_period: int = 50, series_type = 'close') -> pd.DataFrame:
     # Get the ema data from AlphaVantage
     params = {'function': 'EMA',
@@ -234,9 +554,14 @@ class AlphaVantageDatasets:
               'time_period': time_period,
               'series_type': series_type,
               'apikey': self.api_key}
-    importer = ImportData(self.base_url, 'av', self.header, params, self.extension)
+    importer = ImportData(self.base_url, 'av', self.header, params, self.extension, rate_limiter=self.rate_limiter, cache=self.cache)
     return importer.download_dataset()
   
+  def get_emas_batch(self, tickers: list, interval: str = 'daily', time_period: int = 50, series_type = 'close') -> [pd.DataFrame]:
+    # Get the ema data from AlphaVantage for many tickers. indicators.compute_indicators
+    # derives the same values from stored prices without spending quota
+    return self.__indicator_batch('EMA', tickers, interval, time_period, series_type)
+  
   def get_sma(self, ticker: str, interval: str = 'daily', time_period: int = 50, series_type = 'close') -> pd.DataFrame:
     # Get the sma data from AlphaVantage
     params = {'function': 'SMA',
@@ -245,9 +570,14 @@ class AlphaVantageDatasets:
               'time_period': time_period,
               'series_type': series_type,
               'apikey': self.api_key}
-    importer = ImportData(self.base_url, 'av', self.header, params, self.extension)
+    importer = ImportData(self.base_url, 'av', self.header, params, self.extension, rate_limiter=self.rate_limiter, cache=self.cache)
     return importer.download_dataset()
   
+  def get_sma_batch(self, tickers: list, interval: str = 'daily', time_period: int = 50, series_type = 'close') -> [pd.DataFrame]:
+    # Get the sma data from AlphaVantage for many tickers. indicators.compute_indicators
+    # derives the same values from stored prices without spending quota
+    return self.__indicator_batch('SMA', tickers, interval, time_period, series_type)
+  
   def get_rsi(self, ticker: str, interval: str = 'daily', time_period: int = 50, series_type = 'close') -> pd.DataFrame:
     # Get the rsi data from AlphaVantage
     params = {'function': 'RSI',
@@ -256,9 +586,14 @@ class AlphaVantageDatasets:
               'time_period': time_period,
               'series_type': series_type,
               'apikey': self.api_key}
-    importer = ImportData(self.base_url, 'av', self.header, params, self.extension)
+    importer = ImportData(self.base_url, 'av', self.header, params, self.extension, rate_limiter=self.rate_limiter, cache=self.cache)
     return importer.download_dataset()
   
+  def get_rsi_batch(self, tickers: list, interval: str = 'daily', time_period: int = 50, series_type = 'close') -> [pd.DataFrame]:
+    # Get the rsi data from AlphaVantage for many tickers. indicators.compute_indicators
+    # derives the same values from stored prices without spending quota
+    return self.__indicator_batch('RSI', tickers, interval, time_period, series_type)
+  
   def get_bbands(self, ticker: str, interval: str = 'daily', time_period: int = 50, series_type = 'close') -> pd.DataFrame:
     # Get the bbands data from AlphaVantage
     params = {'function': 'BBANDS',
@@ -267,27 +602,33 @@ class AlphaVantageDatasets:
               'time_period': time_period,
               'series_type': series_type,
               'apikey': self.api_key}
-    importer = ImportData(self.base_url, 'av', self.header, params, self.extension)
+    importer = ImportData(self.base_url, 'av', self.header, params, self.extension, rate_limiter=self.rate_limiter, cache=self.cache)
     return importer.download_dataset()
   
+  def get_bbands_batch(self, tickers: list, interval: str = 'daily', time_period: int = 50, series_type = 'close') -> [pd.DataFrame]:
+    # Get the bbands data from AlphaVantage for many tickers. indicators.compute_indicators
+    # derives the same values from stored prices without spending quota
+    return self.__indicator_batch('BBANDS', tickers, interval, time_period, series_type)
+  
 if __name__ == '__main__':
-  # Get the insider trading data from QuiverQuant
-  qq = QuiverDatasets()
-  insiders = qq.get_live_insider_set()
-  print(insiders.head())
+  logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+  # Every unit of the pull is checkpointed, so rerunning after a crash resumes where it stopped
+  journal = JobJournal()
+  # Get the insider trading data from QuiverQuant, once per run
+  insider_store = InsiderStore()
+  qq = QuiverDatasets(insider_store=insider_store)
+  journal.run_unit('beta/live/insiders', journal.run, qq.get_live_insider_set)
+  insiders = insider_store.query(columns=['Ticker', 'Name'])
   print(insiders.shape)
-  print(insiders.tail())
   print(insiders.Ticker.value_counts())
   print(insiders.Name.value_counts())
   tickers = insiders.Ticker.value_counts().index.tolist()
   # Get the daily timeseries data from AlphaVantage
-  av = AlphaVantageDatasets()
+  av = AlphaVantageDatasets(journal=journal)
   #with open('outputs/missing_tickers.txt', 'r') as f:
   # tickers = f.read().split('\n')
   print(f'Starting download of {len(tickers)} Ticker price sets...')
-  df = av.get_daily_batch(tickers, outputsize='compact')
-  df.to_csv(f'../data/ticker-prices/av_agg_daily.csv', index=True)
-  print(f'Frame downloaded {df.shape}')
+  av.get_daily_batch(tickers, outputsize='compact')
   # Get the daily adjusted data from AlphaVantage
   #av.get_daily_adjusted_batch(tickers)
   # Get the company overview data from AlphaVantage
@@ -301,4 +642,13 @@ if __name__ == '__main__':
   # Get the rsi data from AlphaVantage
   #av.get_rsi_batch(tickers)
   # Get the bbands data from AlphaVantage
-  #av.get_bbands_batch(tickers)
\ No newline at end of file
+  #av.get_bbands_batch(tickers)
+  # Report the run and keep the tickers that failed for a targeted retry
+  print(journal.summary())
+  failed = sorted({key for (endpoint, key) in journal.failed() if endpoint != 'beta/live/insiders'})
+  with open('outputs/missing_tickers.txt', 'w') as f:
+    f.write('\n'.join(failed))
+  print(f'{len(failed)} tickers failed')
+  # Where the run spent its time: request latencies, rate limit waits, cache hits and stage spans
+  METRICS.write_jsonl(METRICS_FILEPATH + 'data_collection.jsonl')
+  METRICS.write_prometheus(METRICS_FILEPATH + 'data_collection.prom')
@@ -0,0 +1,211 @@
+import pandas as pd
+import os
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+
+# SEC-HEADER fields kept for every row, and the column each lands in
+HEADER_FIELDS = {
+  'ACCESSION NUMBER': 'accessionNumber',
+  'CONFORMED SUBMISSION TYPE': 'submissionType',
+  'FILED AS OF DATE': 'fileDate',
+}
+
+# Column name and dtype of every extracted field. Names shared with the Quiver insider
+# frame (Ticker, Name, Date, fileDate, TransactionCode, ...) match it so the two line up
+COLUMNS = {
+  'accessionNumber': 'string',
+  'submissionType': 'string',
+  'fileDate': 'datetime64[ns]',
+  'periodOfReport': 'datetime64[ns]',
+  'issuerCik': 'string',
+  'issuerName': 'string',
+  'Ticker': 'string',
+  'rptOwnerCik': 'string',
+  'Name': 'string',
+  'rptOwnerCount': 'int64',
+  'isDirector': 'boolean',
+  'isOfficer': 'boolean',
+  'isTenPercentOwner': 'boolean',
+  'isOther': 'boolean',
+  'officerTitle': 'string',
+  'table': 'category',
+  'securityTitle': 'string',
+  'Date': 'datetime64[ns]',
+  'TransactionCode': 'category',
+  'equitySwapInvolved': 'boolean',
+  'Shares': 'float64',
+  'PricePerShare': 'float64',
+  'AcquiredDisposedCode': 'category',
+  'SharesOwnedFollowing': 'float64',
+  'DirectOrIndirectOwnership': 'category',
+  'conversionOrExercisePrice': 'float64',
+  'exerciseDate': 'datetime64[ns]',
+  'expirationDate': 'datetime64[ns]',
+  'underlyingSecurityTitle': 'string',
+  'underlyingSecurityShares': 'float64',
+}
+
+# Paths inside a (non)derivativeTransaction element. Most leaves wrap their text in <value>
+TRANSACTION_FIELDS = {
+  'securityTitle': 'securityTitle',
+  'Date': 'transactionDate',
+  'TransactionCode': 'transactionCoding/transactionCode',
+  'equitySwapInvolved': 'transactionCoding/equitySwapInvolved',
+  'Shares': 'transactionAmounts/transactionShares',
+  'PricePerShare': 'transactionAmounts/transactionPricePerShare',
+  'AcquiredDisposedCode': 'transactionAmounts/transactionAcquiredDisposedCode',
+  'SharesOwnedFollowing': 'postTransactionAmounts/sharesOwnedFollowingTransaction',
+  'DirectOrIndirectOwnership': 'ownershipNature/directOrIndirectOwnership',
+  'conversionOrExercisePrice': 'conversionOrExercisePrice',
+  'exerciseDate': 'exerciseDate',
+  'expirationDate': 'expirationDate',
+  'underlyingSecurityTitle': 'underlyingSecurity/underlyingSecurityTitle',
+  'underlyingSecurityShares': 'underlyingSecurity/underlyingSecurityShares',
+}
+
+OWNER_FIELDS = {
+  'rptOwnerCik': 'reportingOwnerId/rptOwnerCik',
+  'Name': 'reportingOwnerId/rptOwnerName',
+  'isDirector': 'reportingOwnerRelationship/isDirector',
+  'isOfficer': 'reportingOwnerRelationship/isOfficer',
+  'isTenPercentOwner': 'reportingOwnerRelationship/isTenPercentOwner',
+  'isOther': 'reportingOwnerRelationship/isOther',
+  'officerTitle': 'reportingOwnerRelationship/officerTitle',
+}
+
+ISSUER_FIELDS = {
+  'issuerCik': 'issuerCik',
+  'issuerName': 'issuerName',
+  'Ticker': 'issuerTradingSymbol',
+}
+
+TRANSACTION_TAGS = {'nonDerivativeTransaction': 'nonDerivative', 'derivativeTransaction': 'derivative'}
+
+
+def _text(element: ET.Element, path: str) -> str:
+  # Text of path/value, falling back to path itself, or None when absent or empty
+  node = element.find(path + '/value')
+  if node is None:
+    node = element.find(path)
+  if node is None or node.text is None:
+    return None
+  return node.text.strip() or None
+
+
+def _fields(element: ET.Element, fields: dict) -> dict:
+  return {column: _text(element, path) for column, path in fields.items()}
+
+
+def iter_submission_rows(file_path: str):
+  """
+  Streams one EDGAR full-text submission and yields a dict per reported transaction.
+
+  The SEC-HEADER is read line by line and every <XML> block is fed to an incremental
+  XMLPullParser, so only the transaction being parsed is held as a tree. Each transaction
+  is joined with the issuer and the primary (first) reporting owner; joint filers are
+  counted in rptOwnerCount.
+
+  Args:
+    file_path (str): A <accession>.txt submission file.
+  """
+  header = {}
+  in_header = in_xml = False
+  parser = None
+
+  with open(file_path, 'rb') as f:
+    for line in f:
+      stripped = line.strip()
+      if stripped == b'<XML>':
+        in_xml = True
+        parser = ET.XMLPullParser(events=('end',))
+        issuer, owners, transactions, period = {}, [], [], None
+      elif stripped == b'</XML>':
+        in_xml = False
+        parser.close()
+        if not owners:
+          owners.append(dict.fromkeys(OWNER_FIELDS))
+        for transaction in transactions:
+          yield {**header, 'periodOfReport': period, **issuer, **owners[0], 'rptOwnerCount': len(owners), **transaction}
+      elif stripped.startswith(b'<SEC-HEADER>'):
+        in_header = True
+      elif stripped == b'</SEC-HEADER>':
+        in_header = False
+      elif in_xml:
+        parser.feed(line)
+        for _, element in parser.read_events():
+          tag = element.tag
+          if tag in TRANSACTION_TAGS:
+            transactions.append({'table': TRANSACTION_TAGS[tag], **_fields(element, TRANSACTION_FIELDS)})
+            element.clear()
+          elif tag == 'reportingOwner':
+            owners.append(_fields(element, OWNER_FIELDS))
+            element.clear()
+          elif tag == 'issuer':
+            issuer = _fields(element, ISSUER_FIELDS)
+          elif tag == 'periodOfReport':
+            period = element.text
+      elif in_header:
+        key, _, value = line.decode('latin-1').partition(':')
+        column = HEADER_FIELDS.get(key.strip())
+        if column is not None and column not in header:
+          header[column] = value.strip()
+
+
+def to_frame(columns: dict) -> pd.DataFrame:
+  # Typed frame from column lists, parsing dates, numbers and 0/1/true/false flags
+  df = pd.DataFrame(columns, columns=list(COLUMNS))
+  for column, dtype in COLUMNS.items():
+    if dtype == 'datetime64[ns]':
+      df[column] = pd.to_datetime(df[column], errors='coerce', format='mixed').astype(dtype)
+    elif dtype == 'float64':
+      df[column] = pd.to_numeric(df[column], errors='coerce').astype(dtype)
+    elif dtype == 'boolean':
+      df[column] = df[column].str.lower().map({'1': True, 'true': True, '0': False, 'false': False}).astype('boolean')
+    else:
+      df[column] = df[column].astype(dtype)
+  return df
+
+
+def parse_submissions(file_paths: list) -> pd.DataFrame:
+  # One columnar batch for a list of submission files
+  columns = {column: [] for column in COLUMNS}
+  for file_path in file_paths:
+    try:
+      rows = list(iter_submission_rows(file_path))
+    except ET.ParseError as e:
+      print(f'Skipping {file_path}: {e}')
+      continue
+    for row in rows:
+      for column, values in columns.items():
+        values.append(row.get(column))
+  return to_frame(columns)
+
+
+def iter_filing_batches(file_paths: list, processes: int = None, batch_size: int = 256):
+  """
+  Parses many local filings into typed columnar batches, optionally in a process pool.
+
+  Args:
+    file_paths (list): Submission files to parse.
+    processes (int, optional): Size of the process pool. Defaults to parsing in this process.
+    batch_size (int, optional): Filings per batch, and per task sent to a worker. Defaults to 256.
+
+  Yields:
+    pd.DataFrame: One typed frame per batch of filings, in input order.
+  """
+  batches = [file_paths[i:i + batch_size] for i in range(0, len(file_paths), batch_size)]
+  if processes is not None and processes > 1:
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+      yield from executor.map(parse_submissions, batches)
+  else:
+    for batch in batches:
+      yield parse_submissions(batch)
+
+
+def read_filings(directory: str, processes: int = None, batch_size: int = 256) -> pd.DataFrame:
+  # Every *.txt submission in a directory as one frame
+  file_paths = sorted(os.path.join(directory, filename) for filename in os.listdir(directory) if filename.endswith('.txt'))
+  frames = list(iter_filing_batches(file_paths, processes, batch_size))
+  if not frames:
+    return to_frame({column: [] for column in COLUMNS})
+  return pd.concat(frames, ignore_index=True)
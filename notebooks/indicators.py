@@ -0,0 +1,214 @@
+import pandas as pd
+import numpy as np
+from scipy.signal import lfilter
+from price_store import PriceStore
+
+INDICATORS = ('SMA', 'EMA', 'RSI', 'BBANDS')
+
+# Windows computed when none are given, the lengths the AlphaVantage calls were made with
+DEFAULT_WINDOWS = {'SMA': [20, 50, 200], 'EMA': [20, 50, 200], 'RSI': [14], 'BBANDS': [20]}
+
+# AlphaVantage's value keys under 'Technical Analysis: <function>', by local column prefix
+AV_VALUE_KEYS = {
+  'SMA': {'SMA': 'SMA'},
+  'EMA': {'EMA': 'EMA'},
+  'RSI': {'RSI': 'RSI'},
+  'BBANDS': {'Real Upper Band': 'BBANDS_upper', 'Real Middle Band': 'BBANDS_middle', 'Real Lower Band': 'BBANDS_lower'},
+}
+
+# AlphaVantage reports indicator values to 4 decimals
+AV_TOLERANCE = 1e-4
+
+
+def indicator_columns(indicator: str, window: int) -> list:
+  if indicator == 'BBANDS':
+    return [f'BBANDS_{band}_{window}' for band in ('upper', 'middle', 'lower')]
+  return [f'{indicator}_{window}']
+
+
+def positional_matrix(prices: pd.DataFrame, pricepoint: str = 'Close') -> tuple:
+  """
+  Lays a long (Ticker, Date) price panel out as a 2-D array with one column per ticker and
+  one row per bar position, so every ticker is processed by the same array operations.
+
+  Rows are positions in each ticker's own series rather than calendar dates, which is how
+  AlphaVantage counts windows, and shorter series are padded with trailing NaN.
+
+  Args:
+    prices (pd.DataFrame): Daily prices with Ticker and Date as columns or as the index.
+    pricepoint (str): The price column to lay out.
+
+  Returns:
+    tuple: The (positions x tickers) array, the row index as a (Ticker, Date) MultiIndex, and
+           the position and ticker code of every row.
+  """
+  if not {'Ticker', 'Date'}.issubset(prices.columns):
+    prices = prices.reset_index()
+  prices = prices[['Ticker', 'Date', pricepoint]].dropna()
+  # Sorting integer ticker codes rather than the strings themselves
+  codes, uniques = pd.factorize(prices['Ticker'].astype(str), sort=True)
+  dates = pd.to_datetime(prices['Date']).to_numpy()
+  order = np.lexsort((dates, codes))
+  codes = codes[order]
+  starts = np.flatnonzero(np.append(True, codes[1:] != codes[:-1]))
+  positions = np.arange(len(codes)) - np.repeat(starts, np.diff(np.append(starts, len(codes))))
+
+  matrix = np.full((positions.max() + 1 if len(positions) else 0, len(uniques)), np.nan)
+  matrix[positions, codes] = prices[pricepoint].to_numpy(dtype=np.float64)[order]
+  index = pd.MultiIndex.from_arrays([uniques[codes], dates[order]], names=['Ticker', 'Date'])
+  return matrix, index, positions, codes
+
+
+def rolling_moments(matrix: np.ndarray, window: int) -> tuple:
+  # Rolling mean and population standard deviation down each column from windowed cumulative
+  # sums. Columns are shifted by their first value first to keep the sums small
+  mean = np.full(matrix.shape, np.nan)
+  std = np.full(matrix.shape, np.nan)
+  if len(matrix) < window:
+    return mean, std
+  shifted = matrix - matrix[0]
+  sums = np.cumsum(np.vstack([np.zeros((1, matrix.shape[1])), shifted]), axis=0)
+  squares = np.cumsum(np.vstack([np.zeros((1, matrix.shape[1])), shifted ** 2]), axis=0)
+  window_sums = sums[window:] - sums[:-window]
+  window_squares = squares[window:] - squares[:-window]
+  mean[window - 1:] = window_sums / window + matrix[0]
+  std[window - 1:] = np.sqrt(np.clip(window_squares / window - (window_sums / window) ** 2, 0, None))
+  return mean, std
+
+
+def smooth(values: np.ndarray, alpha: float, seed: np.ndarray) -> np.ndarray:
+  # y[t] = alpha * x[t] + (1 - alpha) * y[t-1] down each column, starting from y[-1] = seed
+  if not len(values):
+    return values.copy()
+  smoothed, _ = lfilter([alpha], [1, alpha - 1], values, axis=0, zi=((1 - alpha) * seed)[None, :])
+  return smoothed
+
+
+def sma(matrix: np.ndarray, window: int) -> np.ndarray:
+  return rolling_moments(matrix, window)[0]
+
+
+def ema(matrix: np.ndarray, window: int) -> np.ndarray:
+  # Seeded with the SMA of the first window bars, then smoothed with alpha = 2 / (window + 1)
+  out = np.full(matrix.shape, np.nan)
+  if len(matrix) < window:
+    return out
+  out[window - 1] = matrix[:window].mean(axis=0)
+  out[window:] = smooth(matrix[window:], 2 / (window + 1), out[window - 1])
+  return out
+
+
+def rsi(matrix: np.ndarray, window: int) -> np.ndarray:
+  # Wilder's RSI: average gains and losses seeded with their mean over the first window
+  # changes, then smoothed with alpha = 1 / window
+  out = np.full(matrix.shape, np.nan)
+  if len(matrix) <= window:
+    return out
+  changes = np.diff(matrix, axis=0)
+  gains = np.clip(changes, 0, None)
+  losses = np.clip(-changes, 0, None)
+  average_gains = np.vstack([gains[:window].mean(axis=0), smooth(gains[window:], 1 / window, gains[:window].mean(axis=0))])
+  average_losses = np.vstack([losses[:window].mean(axis=0), smooth(losses[window:], 1 / window, losses[:window].mean(axis=0))])
+  total = average_gains + average_losses
+  with np.errstate(invalid='ignore', divide='ignore'):
+    out[window:] = np.where(total == 0, 0.0, 100 * average_gains / total)
+  return out
+
+
+def bbands(matrix: np.ndarray, window: int, nbdev: float = 2.0) -> tuple:
+  # Upper, middle and lower Bollinger Bands around the SMA, nbdev population deviations wide
+  mean, std = rolling_moments(matrix, window)
+  return mean + nbdev * std, mean, mean - nbdev * std
+
+
+def compute_indicators(prices: pd.DataFrame, windows=None, indicators: tuple = INDICATORS, pricepoint: str = 'Close', nbdev: float = 2.0) -> pd.DataFrame:
+  """
+  Computes SMA, EMA, RSI and Bollinger Bands for every ticker and window in one vectorized pass
+  over a daily price panel, replacing a remote AlphaVantage call per ticker, indicator and window.
+
+  Definitions follow AlphaVantage (TA-Lib): EMA is seeded with the SMA of its first window,
+  RSI uses Wilder smoothing seeded with plain averages, and BBANDS uses the SMA and the
+  population standard deviation. Values before a ticker has a full window are NaN.
+
+  Args:
+    prices (pd.DataFrame): Daily prices with Ticker and Date as columns or as the index.
+    windows (list or dict, optional): Window lengths for every indicator, or a dict of lengths per
+                                      indicator. Defaults to DEFAULT_WINDOWS.
+    indicators (tuple, optional): Which of INDICATORS to compute. Defaults to all of them.
+    pricepoint (str, optional): The price column, AlphaVantage's series_type. Defaults to 'Close'.
+    nbdev (float, optional): Band width in standard deviations. Defaults to 2.0.
+
+  Returns:
+    pd.DataFrame: One column per indicator and window (e.g. EMA_50, BBANDS_upper_20), indexed by (Ticker, Date).
+  """
+  if windows is None:
+    windows = DEFAULT_WINDOWS
+  if not isinstance(windows, dict):
+    windows = {indicator: list(windows) for indicator in indicators}
+  matrix, index, positions, codes = positional_matrix(prices, pricepoint)
+
+  columns = {}
+  for indicator in indicators:
+    if indicator not in INDICATORS:
+      raise ValueError(f'indicator must be one of {INDICATORS}, not {indicator}')
+    for window in windows.get(indicator, []):
+      if indicator == 'BBANDS':
+        results = bbands(matrix, window, nbdev)
+      else:
+        results = ({'SMA': sma, 'EMA': ema, 'RSI': rsi}[indicator](matrix, window),)
+      for column, result in zip(indicator_columns(indicator, window), results):
+        columns[column] = result[positions, codes]
+  return pd.DataFrame(columns, index=index)
+
+
+def indicators_from_store(store: PriceStore, tickers: list = None, windows=None, indicators: tuple = INDICATORS, pricepoint: str = 'Close', nbdev: float = 2.0) -> pd.DataFrame:
+  # Indicators for stored tickers, reading only the price column from the store
+  return compute_indicators(store.read_tickers(tickers, columns=[pricepoint]), windows, indicators, pricepoint, nbdev)
+
+
+def alphavantage_indicator(payload: dict) -> pd.DataFrame:
+  """
+  Parses an AlphaVantage technical indicator response into local column names.
+
+  Args:
+    payload (dict): Decoded JSON of an SMA, EMA, RSI or BBANDS call.
+
+  Returns:
+    pd.DataFrame: Float columns named as compute_indicators names them, indexed by Date ascending.
+  """
+  key = next(key for key in payload if key.startswith('Technical Analysis: '))
+  function = key[len('Technical Analysis: '):]
+  window = int(next(value for name, value in payload['Meta Data'].items() if name.endswith('Time Period')))
+  df = pd.DataFrame.from_dict(payload[key], orient='index').astype(np.float64)
+  df = df.rename(columns={name: f'{column}_{window}' for name, column in AV_VALUE_KEYS[function].items()})
+  df.index = pd.to_datetime(df.index)
+  df.index.name = 'Date'
+  return df.sort_index()
+
+
+def validate_against_alphavantage(local: pd.DataFrame, ticker: str, payload: dict, warmup: int = 0, tolerance: float = AV_TOLERANCE) -> pd.DataFrame:
+  """
+  Compares locally computed indicators with an AlphaVantage response for the same ticker.
+
+  EMA and RSI depend on where the series starts, so the local panel should cover the same
+  history AlphaVantage used (outputsize='full'), or warmup should skip the leading dates
+  until the two have converged. AlphaVantage may compute on adjusted closes, in which case
+  the local panel should be built from the adjusted series.
+
+  Args:
+    local (pd.DataFrame): Output of compute_indicators.
+    ticker (str): The ticker the payload was requested for.
+    payload (dict): Decoded JSON of the AlphaVantage indicator call.
+    warmup (int, optional): Leading overlapping dates to leave out. Defaults to 0.
+    tolerance (float, optional): Largest absolute difference accepted. Defaults to AV_TOLERANCE.
+
+  Returns:
+    pd.DataFrame: Dates compared, maximum absolute error and pass or fail per column.
+  """
+  remote = alphavantage_indicator(payload)
+  mine = local.xs(ticker, level='Ticker')[remote.columns].dropna()
+  dates = mine.index.intersection(remote.index)[warmup:]
+  errors = (mine.loc[dates] - remote.loc[dates]).abs()
+  return pd.DataFrame({'dates': len(dates),
+                       'max_abs_error': errors.max(),
+                       'within_tolerance': errors.max() <= tolerance})
@@ -0,0 +1,179 @@
+import pandas as pd
+import numpy as np
+import heapq
+import os
+import pickle
+
+# Feature name -> (group columns, aggregation). 'count' counts rows per group and 'nunique'
+# counts distinct Names per group, as the groupby(...)['Name'].transform(...) calls do
+FEATURES = {
+  'TraderFrequency': (('Name',), 'count'),
+  'individual_transactions_per_trade': (('Name', 'Ticker'), 'count'),
+  'investors_per_trade': (('TransactionCode', 'Ticker'), 'nunique'),
+}
+
+
+def feature_column(feature: str, window: pd.Timedelta = None) -> str:
+  # Windowed variants get the window as a suffix so both can live in one frame
+  if window is None:
+    return feature
+  return f'{feature}_{pd.Timedelta(window).days}d'
+
+
+def _group_keys(X: pd.DataFrame, columns: tuple) -> pd.Series:
+  # One hashable key per row, None where any part of the key is missing (groupby drops those)
+  frame = X[list(columns)]
+  valid = frame.notna().all(axis=1).to_numpy()
+  if len(columns) == 1:
+    keys = frame[columns[0]].to_numpy(dtype=object)
+  else:
+    keys = np.empty(len(frame), dtype=object)
+    keys[:] = list(zip(*(frame[column].to_numpy(dtype=object) for column in columns)))
+  keys[~valid] = None
+  return pd.Series(keys, index=X.index, dtype=object)
+
+
+def _to_ns(dates) -> np.ndarray:
+  return pd.to_datetime(pd.Series(dates)).to_numpy(dtype='datetime64[ns]').astype(np.int64)
+
+
+def batch_features(X: pd.DataFrame, window: pd.Timedelta = None, date_column: str = 'fileDate') -> pd.DataFrame:
+  """
+  The full history groupby computation of the insider features, kept as the reference the
+  incremental engine has to agree with.
+
+  Args:
+    X (pd.DataFrame): Insider trades with Name, Ticker and TransactionCode columns.
+    window (pd.Timedelta, optional): Only count trades whose date_column falls in the window
+                                     ending at the latest date in X. Defaults to all history.
+    date_column (str, optional): The date the window is measured on. Defaults to 'fileDate'.
+
+  Returns:
+    pd.DataFrame: One column per feature, aligned with X.
+  """
+  counted = X
+  if window is not None:
+    dates = pd.to_datetime(X[date_column])
+    counted = X[dates > dates.max() - pd.Timedelta(window)]
+  features = pd.DataFrame(index=X.index)
+  for feature, (columns, aggregation) in FEATURES.items():
+    totals = counted.groupby(list(columns), observed=True)['Name'].agg(aggregation)
+    keys = pd.MultiIndex.from_frame(X[list(columns)]) if len(columns) > 1 else pd.Index(X[columns[0]])
+    values = pd.Series(totals.reindex(keys).to_numpy(), index=X.index).fillna(0)
+    values[X[list(columns)].isna().any(axis=1)] = np.nan
+    features[feature_column(feature, window)] = values.astype(np.int64) if values.notna().all() else values
+  return features
+
+
+class InsiderFeatureEngine:
+  """
+  Keeps the grouped count and distinct count state behind TraderFrequency,
+  individual_transactions_per_trade and investors_per_trade, so a new batch of filings costs
+  O(batch) instead of a groupby over the whole history.
+
+  Counts live in dicts keyed by Name, (Name, Ticker) and (TransactionCode, Ticker); distinct
+  Names per (TransactionCode, Ticker) are kept as a multiplicity dict so they can be taken
+  back out again. With a window, every (key, date) contribution is also pushed on a min-heap
+  by date and expired once it falls out of the window ending at the latest date seen, which
+  lets late filings still inside the window be counted correctly.
+
+  After update() has seen exactly the rows of X, transform(X) equals batch_features(X).
+
+  Args:
+    window (pd.Timedelta, optional): Trailing window to count over, e.g. '90D'. Defaults to all history.
+    date_column (str, optional): The date the window is measured on. Defaults to 'fileDate'.
+  """
+
+  def __init__(self, window: pd.Timedelta = None, date_column: str = 'fileDate'):
+    self.window = None if window is None else pd.Timedelta(window)
+    self.date_column = date_column
+    self.counts = {feature: {} for feature, (_, aggregation) in FEATURES.items() if aggregation == 'count'}
+    self.distinct = {feature: {} for feature, (_, aggregation) in FEATURES.items() if aggregation == 'nunique'}
+    self.expiry = []
+    self.pushed = 0
+    self.watermark = None
+    self.rows = 0
+
+  def __add(self, feature: str, key, name, n: int) -> None:
+    # Add (or with a negative n remove) n rows for one group key
+    if feature in self.counts:
+      counts = self.counts[feature]
+      total = counts.get(key, 0) + n
+      if total:
+        counts[key] = total
+      else:
+        del counts[key]
+    else:
+      names = self.distinct[feature].setdefault(key, {})
+      total = names.get(name, 0) + n
+      if total:
+        names[name] = total
+      else:
+        del names[name]
+        if not names:
+          del self.distinct[feature][key]
+
+  def update(self, X: pd.DataFrame):
+    # Fold a batch of new trades into the state, looping over its distinct groups rather than rows
+    if self.window is not None:
+      dates = pd.Series(_to_ns(X[self.date_column]), index=X.index)
+      latest = dates.max()
+      self.watermark = latest if self.watermark is None else max(self.watermark, latest)
+      cutoff = self.watermark - self.window.value
+
+    for feature, (columns, _) in FEATURES.items():
+      keys = _group_keys(X, columns)
+      names = X['Name'].astype(object)
+      valid = keys.notna() & names.notna()
+      groups = pd.DataFrame({'key': keys[valid], 'name': names[valid]})
+      if self.window is not None:
+        groups['date'] = dates[valid]
+        groups = groups[groups['date'] > cutoff]
+      sizes = groups.groupby(list(groups.columns), sort=False).size()
+      for group, n in sizes.items():
+        self.__add(feature, group[0], group[1], n)
+        if self.window is not None:
+          # The push counter breaks date ties so keys of different types are never compared
+          heapq.heappush(self.expiry, (group[2], self.pushed, feature, group[0], group[1], n))
+          self.pushed += 1
+
+    if self.window is not None:
+      self.expire()
+    self.rows += len(X)
+    return self
+
+  def expire(self) -> None:
+    # Drop contributions that fell out of the window ending at the watermark
+    cutoff = self.watermark - self.window.value
+    while self.expiry and self.expiry[0][0] <= cutoff:
+      _, _, feature, key, name, n = heapq.heappop(self.expiry)
+      self.__add(feature, key, name, -n)
+
+  def transform(self, X: pd.DataFrame) -> pd.DataFrame:
+    # Current feature values for each row of X, NaN where a key column is missing
+    features = pd.DataFrame(index=X.index)
+    for feature, (columns, _) in FEATURES.items():
+      keys = _group_keys(X, columns)
+      if feature in self.counts:
+        state = self.counts[feature]
+        values = np.array([np.nan if key is None else state.get(key, 0) for key in keys], dtype=np.float64)
+      else:
+        state = self.distinct[feature]
+        values = np.array([np.nan if key is None else len(state.get(key, ())) for key in keys], dtype=np.float64)
+      missing = np.isnan(values)
+      features[feature_column(feature, self.window)] = values if missing.any() else values.astype(np.int64)
+    return features
+
+  def save(self, path: str) -> None:
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path + '.tmp', 'wb') as f:
+      pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(path + '.tmp', path)
+
+  @classmethod
+  def load(cls, path: str, window: pd.Timedelta = None, date_column: str = 'fileDate'):
+    # The persisted state, or a fresh engine when nothing has been saved yet
+    if not os.path.exists(path):
+      return cls(window, date_column)
+    with open(path, 'rb') as f:
+      return pickle.load(f)
@@ -0,0 +1,127 @@
+import pandas as pd
+import numpy as np
+
+# Low cardinality string columns, stored dictionary encoded as pandas categoricals
+CATEGORICAL_COLUMNS = ['Ticker', 'Name', 'TransactionCode', 'AcquiredDisposedCode']
+
+# Numeric columns, downcast to float32 where every value survives within its FLOAT_TOLERANCES entry
+NUMERIC_COLUMNS = ['Shares', 'PricePerShare', 'SharesOwnedFollowing']
+
+DATE_COLUMNS = ['Date', 'fileDate']
+
+# Largest absolute error a float32 downcast may introduce per column. Share counts must round
+# trip exactly: float32 holds integers exactly only up to 2**24, so larger counts stay float64.
+# Prices may move by less than half of the 1/100 cent they are quoted to, which float32 holds
+# up to prices of about 800
+FLOAT_TOLERANCES = {'Shares': 0.0, 'PricePerShare': 5e-5, 'SharesOwnedFollowing': 0.0}
+
+# Columns read_csv can type while parsing, so strings never materialize as Python objects
+READ_DTYPES = {**{column: 'category' for column in CATEGORICAL_COLUMNS}, **{column: 'float64' for column in NUMERIC_COLUMNS}}
+
+
+def downcast_float(values: pd.Series, tolerance: float = 0.0) -> pd.Series:
+  # float32 copy of a float column if every value round trips within the absolute tolerance,
+  # exactly by default, else the column itself
+  if values.dtype == np.float32:
+    return values
+  full = values.to_numpy(dtype=np.float64)
+  small = full.astype(np.float32)
+  if np.allclose(small, full, rtol=0, atol=tolerance, equal_nan=True):
+    return pd.Series(small, index=values.index, name=values.name)
+  return values
+
+
+def recode_categories(values: pd.Series, func) -> pd.Series:
+  """
+  Applies a string function to a column once per distinct value rather than once per row.
+
+  Categories that collide after the function ('John Doe' and 'JOHN DOE' when lowercasing) are
+  merged, and a column the function leaves unchanged is returned untouched, so normalizing at
+  every stage of the pipeline is cheap.
+
+  Args:
+    values (pd.Series): Strings or a categorical of strings.
+    func (callable): Maps the pd.Index of categories to a pd.Index of new categories.
+
+  Returns:
+    pd.Series: A categorical with the recoded categories.
+  """
+  if not isinstance(values.dtype, pd.CategoricalDtype):
+    values = values.astype('category')
+  categories = values.cat.categories
+  recoded = func(categories)
+  if recoded.equals(categories):
+    return values
+  codes = values.cat.codes.to_numpy()
+  merged, uniques = pd.factorize(recoded)
+  remapped = np.where(codes < 0, -1, merged[codes])
+  return pd.Series(pd.Categorical.from_codes(remapped, uniques), index=values.index, name=values.name)
+
+
+def as_string_categories(categories: pd.Index) -> pd.Index:
+  return categories.astype(str)
+
+
+def as_lowercase_categories(categories: pd.Index) -> pd.Index:
+  return categories.astype(str).str.lower()
+
+
+def compact_insiders(df: pd.DataFrame, tolerances: dict = FLOAT_TOLERANCES) -> pd.DataFrame:
+  """
+  Cleans a Quiver insider frame in place into the compact schema: categorical strings with
+  lowercase Names, downcast numerics and typed datetimes.
+
+  Rows with missing values and the CSV index column are dropped as the format_qq_insiders
+  methods always did, but without copying the frame.
+
+  Args:
+    df (pd.DataFrame): Raw insider trades, with object or already compact columns.
+    tolerances (dict, optional): Absolute error allowed per column when downcasting floats,
+                                 exact for columns missing from it. Defaults to FLOAT_TOLERANCES.
+
+  Returns:
+    pd.DataFrame: The same frame, cleaned.
+  """
+  df.dropna(axis=0, inplace=True)
+  # The index to_csv wrote, named 'Unnamed: 0' by the C parser and '' by the pyarrow one
+  index_columns = [column for column in df.columns if column == '' or str(column).startswith('Unnamed: ')]
+  if index_columns:
+    df.drop(columns=index_columns, inplace=True)
+  for column in CATEGORICAL_COLUMNS:
+    if column in df.columns:
+      df[column] = recode_categories(df[column], as_lowercase_categories if column == 'Name' else as_string_categories)
+  for column in NUMERIC_COLUMNS:
+    if column in df.columns:
+      df[column] = downcast_float(pd.to_numeric(df[column]), tolerances.get(column, 0.0))
+  for column in DATE_COLUMNS:
+    if column in df.columns and not pd.api.types.is_datetime64_any_dtype(df[column]):
+      df[column] = pd.to_datetime(df[column], format='ISO8601')
+  for column in df.select_dtypes('integer').columns:
+    df[column] = pd.to_numeric(df[column], downcast='integer')
+  return df
+
+
+def read_insiders(file_path: str, tolerances: dict = FLOAT_TOLERANCES) -> pd.DataFrame:
+  # Load a Quiver insider CSV straight into the compact schema, parsing with the multithreaded pyarrow reader
+  df = pd.read_csv(file_path, dtype=READ_DTYPES, engine='pyarrow')
+  return compact_insiders(df, tolerances)
+
+
+def memory_report(before: pd.DataFrame, after: pd.DataFrame) -> pd.DataFrame:
+  """
+  Deep memory footprint per column of a frame before and after compacting.
+
+  Args:
+    before (pd.DataFrame): The frame as loaded.
+    after (pd.DataFrame): The compacted frame.
+
+  Returns:
+    pd.DataFrame: Bytes, dtype and reduction ratio per column, with a total row.
+  """
+  report = pd.DataFrame({'dtype_before': before.dtypes.astype(str),
+                         'bytes_before': before.memory_usage(deep=True, index=False),
+                         'dtype_after': after.dtypes.astype(str),
+                         'bytes_after': after.memory_usage(deep=True, index=False)})
+  report.loc['total', ['bytes_before', 'bytes_after']] = report[['bytes_before', 'bytes_after']].sum()
+  report['ratio'] = report['bytes_before'] / report['bytes_after']
+  return report
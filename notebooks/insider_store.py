@@ -0,0 +1,159 @@
+import pandas as pd
+import os
+import sqlite3
+
+INSIDERS_DB_FILEPATH = '../data/insider-trades/insiders.sqlite'
+
+# Natural key of a reported trade. A repeated pull of the same filing maps onto the same row
+KEY_COLUMNS = ['Ticker', 'Name', 'Date', 'TransactionCode', 'Shares', 'PricePerShare', 'fileDate']
+
+# Every stored column and its SQLite type, in table order
+COLUMN_TYPES = {
+  'Ticker': 'TEXT',
+  'Name': 'TEXT',
+  'Date': 'TEXT',
+  'TransactionCode': 'TEXT',
+  'Shares': 'REAL',
+  'PricePerShare': 'REAL',
+  'fileDate': 'TEXT',
+  'AcquiredDisposedCode': 'TEXT',
+  'SharesOwnedFollowing': 'REAL',
+}
+
+# Secondary indexes for per ticker, date range and per insider reads, and for finding the
+# latest filing. The unique key index already leads with Ticker
+INDEXES = {
+  'insider_trades_ticker_date': ['Ticker', 'Date'],
+  'insider_trades_date': ['Date'],
+  'insider_trades_name': ['Name'],
+  'insider_trades_file_date': ['fileDate'],
+}
+
+DATE_FORMAT = '%Y-%m-%d'
+FILE_DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+class InsiderStore:
+  """
+  Embedded SQLite store of insider trades keyed on the trade itself rather than on the pull
+  it arrived in.
+
+  Upserts are idempotent: a row whose natural key (KEY_COLUMNS) is already stored updates the
+  remaining columns in place, so re-pulling an overlapping live window costs only the rows
+  in the batch and never duplicates. Besides the unique key index, which leads with Ticker,
+  there are indexes on (Ticker, Date), Date and Name so per ticker, date range and per
+  insider reads use an index instead of scanning the history. Dates are kept as ISO text,
+  which sorts and compares chronologically.
+
+  Args:
+    path (str): The SQLite database file. Created with its schema when missing.
+  """
+
+  def __init__(self, path: str = INSIDERS_DB_FILEPATH):
+    self.path = path
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    self.connection = sqlite3.connect(path)
+    self.connection.execute('PRAGMA journal_mode=WAL')
+    self.connection.execute('PRAGMA synchronous=NORMAL')
+    # Room for the key and index pages a large upsert touches
+    self.connection.execute('PRAGMA cache_size=-65536')
+    columns = ', '.join(f'{column} {type_} NOT NULL' if column in KEY_COLUMNS else f'{column} {type_}' for column, type_ in COLUMN_TYPES.items())
+    with self.connection:
+      self.connection.execute(f'CREATE TABLE IF NOT EXISTS insider_trades ({columns}, UNIQUE ({", ".join(KEY_COLUMNS)}))')
+      for name, indexed in INDEXES.items():
+        self.connection.execute(f'CREATE INDEX IF NOT EXISTS {name} ON insider_trades ({", ".join(indexed)})')
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *args):
+    self.close()
+
+  def close(self) -> None:
+    self.connection.close()
+
+  def __len__(self) -> int:
+    return self.connection.execute('SELECT COUNT(*) FROM insider_trades').fetchone()[0]
+
+  @staticmethod
+  def normalize(df: pd.DataFrame) -> pd.DataFrame:
+    # The stored columns as stored: dates as ISO text and numbers parsed, however they were read
+    df = df.reindex(columns=list(COLUMN_TYPES))
+    return df.assign(Date=pd.to_datetime(df['Date'], errors='coerce', format='ISO8601').dt.strftime(DATE_FORMAT),
+                     fileDate=pd.to_datetime(df['fileDate'], errors='coerce', format='ISO8601').dt.strftime(FILE_DATE_FORMAT),
+                     Shares=pd.to_numeric(df['Shares'], errors='coerce'),
+                     PricePerShare=pd.to_numeric(df['PricePerShare'], errors='coerce'),
+                     SharesOwnedFollowing=pd.to_numeric(df['SharesOwnedFollowing'], errors='coerce'))
+
+  @staticmethod
+  def to_rows(df: pd.DataFrame) -> list:
+    # Stored column values per row, with dates as ISO text and rows missing part of the key dropped
+    df = InsiderStore.normalize(df).dropna(subset=KEY_COLUMNS)
+    df = df.astype(object).where(df.notna(), None)
+    return list(df.itertuples(index=False, name=None))
+
+  def upsert(self, df: pd.DataFrame) -> int:
+    """
+    Inserts new trades and updates stored ones in a single transaction.
+
+    Args:
+      df (pd.DataFrame): Trades with the Quiver insider columns. Other columns are ignored.
+
+    Returns:
+      int: Rows written. Rows missing any key column are skipped.
+    """
+    rows = self.to_rows(df)
+    columns = list(COLUMN_TYPES)
+    updates = ', '.join(f'{column} = excluded.{column}' for column in columns if column not in KEY_COLUMNS)
+    with self.connection:
+      self.connection.executemany(f'INSERT INTO insider_trades ({", ".join(columns)}) VALUES ({", ".join("?" * len(columns))}) '
+                                  f'ON CONFLICT ({", ".join(KEY_COLUMNS)}) DO UPDATE SET {updates}', rows)
+    return len(rows)
+
+  def query(self, tickers: list = None, names: list = None, start=None, end=None, transaction_codes: list = None, columns: list = None) -> pd.DataFrame:
+    """
+    Trades matching every given filter, ordered by Ticker and Date.
+
+    Args:
+      tickers (list, optional): Only these tickers.
+      names (list, optional): Only these insiders, as stored.
+      start (optional): First trade Date to include.
+      end (optional): Last trade Date to include.
+      transaction_codes (list, optional): Only these transaction codes, e.g. ['P', 'S'].
+      columns (list, optional): Columns to return. Defaults to all of them.
+
+    Returns:
+      pd.DataFrame: The matching trades with Date and fileDate as datetimes.
+    """
+    conditions, params = [], []
+    for column, values in (('Ticker', tickers), ('Name', names), ('TransactionCode', transaction_codes)):
+      if values is not None:
+        values = list(values)
+        conditions.append(f'{column} IN ({", ".join("?" * len(values))})')
+        params.extend(values)
+    if start is not None:
+      conditions.append('Date >= ?')
+      params.append(pd.Timestamp(start).strftime(DATE_FORMAT))
+    if end is not None:
+      conditions.append('Date <= ?')
+      params.append(pd.Timestamp(end).strftime(DATE_FORMAT))
+    selected = list(COLUMN_TYPES) if columns is None else list(columns)
+    where = f' WHERE {" AND ".join(conditions)}' if conditions else ''
+    sql = f'SELECT {", ".join(selected)} FROM insider_trades{where} ORDER BY Ticker, Date'
+    df = pd.read_sql_query(sql, self.connection, params=params)
+    for column, date_format in (('Date', DATE_FORMAT), ('fileDate', FILE_DATE_FORMAT)):
+      if column in df.columns:
+        df[column] = pd.to_datetime(df[column], format=date_format)
+    return df
+
+  def read_ticker(self, ticker: str, start=None, end=None) -> pd.DataFrame:
+    return self.query(tickers=[ticker], start=start, end=end)
+
+  def tickers(self) -> list:
+    # Distinct stored tickers, read off the key index
+    return [row[0] for row in self.connection.execute('SELECT DISTINCT Ticker FROM insider_trades ORDER BY Ticker')]
+
+  def latest_file_date(self) -> pd.Timestamp:
+    # Most recent filing stored, e.g. to tell how far back a pull has to reach
+    latest = self.connection.execute('SELECT MAX(fileDate) FROM insider_trades').fetchone()[0]
+    return None if latest is None else pd.Timestamp(latest)
@@ -0,0 +1,95 @@
+import json
+import logging
+import os
+import threading
+import time
+from metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_FILEPATH = '../data/jobs/journal.jsonl'
+
+
+class JobJournal:
+  """
+  Append-only JSONL checkpoint journal of finished (endpoint, key) units of a batch pull.
+
+  Every unit's outcome is appended and fsynced as soon as the unit's own output has been
+  written, so a crashed run loses at most the units in flight. Reopening the journal with the
+  same run name replays it: done units are skipped and failed ones are retried, with their
+  last error kept for reporting. A torn last line from a crash mid-write is ignored.
+
+  Args:
+    path (str): The JSONL journal file, shared by any number of runs.
+    run (str, optional): Name of the run to resume. Defaults to today's date, so an interrupted
+                         pull resumes the same day and the next day's pull starts fresh.
+  """
+
+  def __init__(self, path: str = JOURNAL_FILEPATH, run: str = None):
+    self.path = path
+    self.run = time.strftime('%Y-%m-%d') if run is None else run
+    self.lock = threading.Lock()
+    self.units = {}
+    if os.path.exists(path):
+      with open(path, 'r') as f:
+        for line in f:
+          try:
+            entry = json.loads(line)
+          except ValueError:
+            continue
+          if entry.get('run') == self.run:
+            self.units[(entry['endpoint'], entry['key'])] = entry
+
+  def record(self, endpoint: str, key: str, status: str, error: str = None) -> None:
+    entry = {'run': self.run, 'endpoint': endpoint, 'key': key, 'status': status, 'error': error, 'time': time.time()}
+    with self.lock:
+      os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+      with open(self.path, 'a') as f:
+        f.write(json.dumps(entry) + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+      self.units[(endpoint, key)] = entry
+
+  def is_done(self, endpoint: str, key: str) -> bool:
+    entry = self.units.get((endpoint, key))
+    return entry is not None and entry['status'] == 'done'
+
+  def pending(self, endpoint: str, keys: list) -> list:
+    # Keys of an endpoint still to do in this run, failed ones included
+    return [key for key in keys if not self.is_done(endpoint, key)]
+
+  def failed(self, endpoint: str = None) -> dict:
+    # Last error of every unit that has not succeeded since, optionally for one endpoint
+    return {unit: entry['error'] for unit, entry in self.units.items()
+            if entry['status'] == 'failed' and (endpoint is None or unit[0] == endpoint)}
+
+  def run_unit(self, endpoint: str, key: str, task):
+    """
+    Runs one unit unless it is already done in this run, and journals the outcome.
+
+    Args:
+      endpoint (str): The endpoint, or endpoint and variant, the unit belongs to.
+      key (str): The unit within the endpoint, usually a ticker.
+      task (callable): Does the unit and flushes its output before returning.
+
+    Returns:
+      The task's result, or None when the unit was skipped or failed.
+    """
+    if self.is_done(endpoint, key):
+      return None
+    try:
+      result = task()
+    except Exception as e:
+      self.record(endpoint, key, 'failed', str(e))
+      METRICS.inc('job_unit_failures_total', endpoint=endpoint)
+      logger.warning('Unit %s %s failed: %s', endpoint, key, e)
+      return None
+    self.record(endpoint, key, 'done')
+    return result
+
+  def summary(self) -> dict:
+    # Done and failed unit counts per endpoint in this run
+    counts = {}
+    for (endpoint, _), entry in self.units.items():
+      counts.setdefault(endpoint, {'done': 0, 'failed': 0})[entry['status']] += 1
+    return counts
@@ -0,0 +1,82 @@
+import pandas as pd
+import numpy as np
+from sklearn.base import BaseEstimator, TransformerMixin
+from price_store import PriceStore
+from price_index import PriceIndex, to_days
+
+# 1 through 12 weeks ahead, the horizons notebook 03 and FormatData.combine_data label
+WEEKLY_HORIZONS = [7 * week for week in range(1, 13)]
+
+# Calendar days an as-of lookup may fall back, enough for a weekend next to a holiday. A target
+# further from any bar (past the last bar, across a long halt or a delisting) is NaN
+ASOF_TOLERANCE = 4
+
+
+def horizon_column(horizon: int, unit: str = 'days') -> str:
+  # Column name for a horizon, matching the price_N_week labels used downstream
+  if unit == 'trading_days':
+    return f'price_{horizon}_trading_day'
+  if horizon % 7 == 0:
+    return f'price_{horizon // 7}_week'
+  return f'price_{horizon}_day'
+
+
+class ForwardPriceLabeler(BaseEstimator, TransformerMixin):
+  """
+  Labels insider trades with forward prices for any number of horizons in one vectorized pass.
+
+  The price panel is loaded into a PriceIndex once, and every (trade, horizon) target is then
+  resolved with one batched lookup instead of a .loc lookup per row.
+
+  Args:
+    prices (pd.DataFrame or PriceStore): Daily prices with Ticker and Date as columns or as the
+                                         index, or a PriceStore to read only the traded tickers from.
+    horizons (list): Horizons to label, in calendar days or trading days.
+    unit (str): 'days' for calendar days or 'trading_days' for rows of the ticker's series.
+    asof (bool): For calendar days, use the nearest prior trading day when the target date
+                 has no bar (weekends, holidays) instead of NaN. Trading day horizons always
+                 anchor on the last trading day on or before the trade date.
+    tolerance (int, str or pd.Timedelta): Most calendar days the as-of bar or the trading day
+                                          anchor may precede its date. Further back is NaN.
+    pricepoint (str): The price column to label with.
+  """
+
+  def __init__(self, prices: pd.DataFrame = None, horizons: list = WEEKLY_HORIZONS, unit: str = 'days', asof: bool = False, tolerance=ASOF_TOLERANCE, pricepoint: str = 'Close'):
+    self.prices = prices
+    self.horizons = horizons
+    self.unit = unit
+    self.asof = asof
+    self.tolerance = tolerance
+    self.pricepoint = pricepoint
+
+  def fit(self, X=None, y=None):
+    if self.unit not in ('days', 'trading_days'):
+      raise ValueError(f"unit must be 'days' or 'trading_days', not {self.unit}")
+    if isinstance(self.prices, PriceStore):
+      tickers = None if X is None else X['Ticker'].astype(str).unique()
+      self.index_ = PriceIndex.from_store(self.prices, tickers, self.pricepoint)
+    else:
+      self.index_ = PriceIndex(self.prices, self.pricepoint)
+    return self
+
+  def label(self, tickers, dates) -> np.ndarray:
+    # Forward prices for each (ticker, date) pair, one column per horizon
+    days, missing = to_days(dates)
+    codes = self.index_.ticker_codes(tickers)
+    horizons = np.asarray(self.horizons, dtype=np.int64)
+
+    if self.unit == 'days':
+      side = 'backward' if self.asof else 'exact'
+      positions, found = self.index_.locate(codes[:, None], days[:, None] + horizons[None, :], side, self.tolerance)
+    else:
+      anchors, anchored = self.index_.locate(codes, days, 'backward', self.tolerance)
+      positions, found = self.index_.offset(anchors[:, None], anchored[:, None], horizons[None, :])
+
+    found &= ~missing[:, None]
+    return np.where(found, self.index_.values[positions], np.nan)
+
+  def transform(self, X: pd.DataFrame, y=None) -> pd.DataFrame:
+    labels = self.label(X['Ticker'], X['Date'])
+    columns = [horizon_column(horizon, self.unit) for horizon in self.horizons]
+    X[columns] = pd.DataFrame(labels, index=X.index, columns=columns)
+    return X
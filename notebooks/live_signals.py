@@ -0,0 +1,336 @@
+import pandas as pd
+import numpy as np
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import pickle
+import signal
+import socket
+import sqlite3
+import time
+from collections import deque
+from data_collection import QuiverDatasets, ThrottledError, make_qq_header, read_api_key, shared_session
+from insider_features import InsiderFeatureEngine
+from insider_store import InsiderStore, KEY_COLUMNS, COLUMN_TYPES
+from metrics import METRICS
+from training import FEATURE_COLUMNS, feature_frame
+
+logger = logging.getLogger(__name__)
+
+LIVE_EXTENSION = 'beta/live/insiders'
+SIGNALS_FILEPATH = '../data/signals/signals.jsonl'
+MODEL_FILEPATH = '../data/models/live_model.pkl'
+
+# Fields of the filing carried onto every emitted signal
+SIGNAL_COLUMNS = ['Ticker', 'Name', 'Date', 'fileDate', 'TransactionCode', 'Shares', 'PricePerShare', 'total_value']
+
+# Positions of the natural key within InsiderStore.to_rows tuples
+_KEY_POSITIONS = [list(COLUMN_TYPES).index(column) for column in KEY_COLUMNS]
+
+
+def load_model(path: str = MODEL_FILEPATH) -> dict:
+  """
+  Loads a pickled scoring bundle for the daemon.
+
+  Args:
+    path (str): Pickle of a dict with 'model' (a fitted estimator with predict) and optionally
+                'features' and 'breakpoints' as saved with FeatureMatrix.
+
+  Returns:
+    dict: The bundle with FEATURE_COLUMNS and no breakpoints filled in where missing.
+  """
+  with open(path, 'rb') as f:
+    bundle = pickle.load(f)
+  return {'features': FEATURE_COLUMNS, 'breakpoints': None, **bundle}
+
+
+class JsonlSink:
+  # Appends one JSON line per signal and flushes after every batch
+
+  def __init__(self, path: str = SIGNALS_FILEPATH):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    self.file = open(path, 'a')
+
+  def emit(self, records: list) -> None:
+    self.file.write(''.join(json.dumps(record, default=str) + '\n' for record in records))
+    self.file.flush()
+
+  def close(self) -> None:
+    self.file.close()
+
+
+class SqliteSink:
+  # Inserts signals as JSON rows of a signals table, one transaction per batch
+
+  def __init__(self, path: str):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    self.connection = sqlite3.connect(path)
+    self.connection.execute('PRAGMA journal_mode=WAL')
+    with self.connection:
+      self.connection.execute('CREATE TABLE IF NOT EXISTS signals (emitted_at REAL, Ticker TEXT, score REAL, record TEXT)')
+
+  def emit(self, records: list) -> None:
+    with self.connection:
+      self.connection.executemany('INSERT INTO signals VALUES (?, ?, ?, ?)',
+                                  [(record['emitted_at'], record['Ticker'], record['score'], json.dumps(record, default=str)) for record in records])
+
+  def close(self) -> None:
+    self.connection.close()
+
+
+class SocketSink:
+  # Sends one JSON datagram per signal to a local UDP listener, never blocking on a slow reader
+
+  def __init__(self, host: str = '127.0.0.1', port: int = 9999):
+    self.address = (host, port)
+    self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+  def emit(self, records: list) -> None:
+    for record in records:
+      self.socket.sendto(json.dumps(record, default=str).encode(), self.address)
+
+  def close(self) -> None:
+    self.socket.close()
+
+
+class LiveSignalDaemon:
+  """
+  Long running asyncio service turning new live insider filings into scored signals.
+
+  Every interval it polls the Quiver live insider endpoint with a conditional request: the
+  last ETag and Last-Modified are sent back, and a 304 or a body identical to the previous
+  one ends the poll before any parsing. Otherwise the window is diffed against the natural
+  keys (KEY_COLUMNS) already seen, and only the new filings are featurized with the
+  incremental InsiderFeatureEngine, scored with the preloaded model and emitted to the sink.
+  Every signal carries its latency from the start of the poll that found it. The validators,
+  window and seen keys only advance once the poll's signals are emitted, so a failed poll
+  leaves its filings to be found again by the next one.
+
+  The blocking HTTP call runs in a worker thread, so the event loop stays free for the
+  timer and for signal handlers. Failed polls back off exponentially up to max_interval.
+
+  Args:
+    model: Fitted estimator with predict, taking the feature columns.
+    sink: JsonlSink, SqliteSink, SocketSink or any object with emit(records) and close().
+    features (list): Feature columns the model was trained on.
+    breakpoints (np.ndarray, optional): total_value decile edges from training (FeatureMatrix.breakpoints).
+    api_key (str, optional): Quiver API key. Defaults to the key file QuiverDatasets reads.
+    base_url (str): API root, e.g. a local stand-in server.
+    interval (float): Seconds between polls.
+    max_interval (float): Longest back off after failed polls.
+    insider_store (InsiderStore, optional): Seeds the seen keys and feature counts from stored
+                                            trades, and receives every new filing.
+    retention (str): How long seen keys are remembered, measured on fileDate.
+  """
+
+  def __init__(self, model, sink, features: list = FEATURE_COLUMNS, breakpoints: np.ndarray = None, api_key: str = None, base_url: str = QuiverDatasets.QQ_BASE_URL, interval: float = 30.0, max_interval: float = 600.0, insider_store: InsiderStore = None, retention: str = '30D'):
+    self.model = model
+    self.sink = sink
+    self.features = features
+    self.breakpoints = breakpoints
+    self.api_key = api_key if api_key is not None else read_api_key(QuiverDatasets.QQ_KEY_FILE)
+    self.url = base_url + LIVE_EXTENSION
+    self.params = {'limit_codes': 'true'}
+    self.interval = interval
+    self.max_interval = max_interval
+    self.insider_store = insider_store
+    self.retention = pd.Timedelta(retention)
+    self.session = shared_session()
+    self.engine = InsiderFeatureEngine()
+    self.seen = {}
+    self.window_keys = set()
+    # Keys of filings already counted into the engine whose signals are not yet emitted, so a
+    # retried poll does not count them twice
+    self.counted = set()
+    self.etag = None
+    self.last_modified = None
+    self.digest = None
+    self.failures = 0
+    self.counts = {'polls': 0, 'not_modified': 0, 'unchanged': 0, 'errors': 0, 'new_filings': 0, 'signals': 0}
+    self.latencies = deque(maxlen=100_000)
+    self.stopped = None
+    if insider_store is not None:
+      self.seed(insider_store.query())
+
+  def seed(self, history: pd.DataFrame) -> None:
+    # Count stored trades into the features and remember the recent ones as already seen
+    if history.empty:
+      return
+    self.engine.update(history)
+    for row in InsiderStore.to_rows(history):
+      self.seen[tuple(row[i] for i in _KEY_POSITIONS)] = row[list(COLUMN_TYPES).index('fileDate')]
+    self.prune()
+
+  def prune(self) -> None:
+    # Forget keys filed before the retention window, which the live window no longer returns
+    if not self.seen:
+      return
+    cutoff = (pd.Timestamp(max(self.seen.values())) - self.retention).strftime('%Y-%m-%d %H:%M:%S')
+    self.seen = {key: filed for key, filed in self.seen.items() if filed >= cutoff}
+
+  def fetch(self):
+    # The decoded live window and its (ETag, Last-Modified, digest) to commit once it is
+    # processed, or None when the server reports or returns an unchanged one
+    headers = make_qq_header(self.api_key)
+    if self.etag is not None:
+      headers['If-None-Match'] = self.etag
+    if self.last_modified is not None:
+      headers['If-Modified-Since'] = self.last_modified
+    response = self.session.get(self.url, headers=headers, params=self.params, timeout=30)
+    if response.status_code == 304:
+      self.counts['not_modified'] += 1
+      return None
+    if response.status_code == 429:
+      raise ThrottledError(f'Error: {response.status_code}. {response.text}')
+    if response.status_code != 200:
+      raise Exception(f'Error: {response.status_code}. Failed to fetch live insiders: {response.text}')
+    validators = (response.headers.get('ETag'), response.headers.get('Last-Modified'))
+    digest = hashlib.blake2b(response.content, digest_size=16).digest()
+    if digest == self.digest:
+      # The same body as the last processed one, so its validators are safe to keep
+      self.etag, self.last_modified = validators
+      self.counts['unchanged'] += 1
+      return None
+    return response.json(), (*validators, digest)
+
+  def changed_records(self, data) -> tuple:
+    # Records whose raw key fields were not in the previous window, found without pandas, and
+    # the keys of this window. The window slides, so only the few records that entered it
+    # since the last poll survive
+    records = data if isinstance(data, list) else pd.DataFrame(data).to_dict('records')
+    keys = [tuple(record.get(column) for column in KEY_COLUMNS) for record in records]
+    changed = [record for key, record in zip(keys, records) if key not in self.window_keys]
+    return changed, set(keys)
+
+  def new_filings(self, df: pd.DataFrame) -> tuple:
+    # Rows of the live window whose natural key has not been seen, and their keys with their
+    # fileDate, to mark as seen once their signals are out
+    rows = InsiderStore.to_rows(df)
+    keys = [tuple(row[i] for i in _KEY_POSITIONS) for row in rows]
+    filed = list(COLUMN_TYPES).index('fileDate')
+    new = [i for i, key in enumerate(keys) if key not in self.seen]
+    fresh = pd.DataFrame([rows[i] for i in new], columns=list(COLUMN_TYPES))
+    for column, type_ in COLUMN_TYPES.items():
+      if type_ == 'REAL':
+        fresh[column] = pd.to_numeric(fresh[column])
+    fresh['Date'] = pd.to_datetime(fresh['Date'])
+    fresh['fileDate'] = pd.to_datetime(fresh['fileDate'])
+    return fresh, [(keys[i], rows[i][filed]) for i in new]
+
+  def score(self, df: pd.DataFrame, keys: list) -> np.ndarray:
+    # Features of the new filings as NewAttributeCreator derives them, then the model's scores.
+    # Filings a failed poll already counted into the engine are not counted again
+    df['total_value'] = df['Shares'] * df['PricePerShare']
+    df['change_in_holdings'] = df['Shares'] / (df['Shares'] + df['SharesOwnedFollowing'])
+    uncounted = np.array([key not in self.counted for key in keys], dtype=bool)
+    if uncounted.any():
+      self.engine.update(df[uncounted])
+      self.counted.update(keys)
+    features = self.engine.transform(df)
+    df[features.columns] = features
+    return self.model.predict(feature_frame(df, self.features, self.breakpoints).to_numpy())
+
+  def process(self, data, polled_at: float) -> list:
+    # Signals for the new filings of one decoded live window. The window and seen keys are
+    # only updated after the signals are emitted, so any failure leaves them as they were
+    changed, window_keys = self.changed_records(data)
+    fresh, seen = self.new_filings(pd.DataFrame(changed)) if changed else (None, [])
+    records = []
+    if seen:
+      if self.insider_store is not None:
+        self.insider_store.upsert(fresh)
+      scores = self.score(fresh, [key for key, _ in seen])
+      emitted_at = time.time()
+      records = fresh[[column for column in SIGNAL_COLUMNS if column in fresh.columns]].to_dict('records')
+      latency = (emitted_at - polled_at) * 1e3
+      for record, score in zip(records, scores):
+        record.update(score=float(score), polled_at=polled_at, emitted_at=emitted_at, latency_ms=latency)
+      self.sink.emit(records)
+      self.latencies.extend([latency] * len(records))
+      METRICS.inc('signals_emitted_total', len(records))
+      METRICS.observe('signal_latency_seconds', latency / 1e3)
+    self.window_keys = window_keys
+    for key, filed in seen:
+      self.seen[key] = filed
+      self.counted.discard(key)
+    self.counts['new_filings'] += len(seen)
+    self.counts['signals'] += len(records)
+    return records
+
+  async def poll_once(self) -> list:
+    # One poll: fetch off the event loop, then diff, score and emit. Errors are counted, not raised
+    polled_at = time.time()
+    self.counts['polls'] += 1
+    try:
+      fetched = await asyncio.to_thread(self.fetch)
+      records = []
+      if fetched is not None:
+        data, validators = fetched
+        records = self.process(data, polled_at)
+        # Only a processed window's validators are kept, so a failed one is fetched again
+        self.etag, self.last_modified, self.digest = validators
+    except Exception:
+      self.failures += 1
+      self.counts['errors'] += 1
+      METRICS.inc('live_poll_errors_total')
+      logger.exception('Live poll failed')
+      return []
+    self.failures = 0
+    if records:
+      logger.info('Emitted %d signals in %.1f ms', len(records), records[0]['latency_ms'])
+    if self.counts['polls'] % 100 == 0:
+      self.prune()
+    return records
+
+  async def run(self, polls: int = None) -> None:
+    """
+    Polls until stop() is called, or for a number of polls.
+
+    Args:
+      polls (int, optional): Stop after this many polls. Defaults to running until stopped.
+    """
+    self.stopped = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    done = 0
+    while not self.stopped.is_set() and (polls is None or done < polls):
+      started = loop.time()
+      await self.poll_once()
+      done += 1
+      delay = min(self.interval * 2 ** self.failures, self.max_interval) if self.failures else self.interval
+      try:
+        await asyncio.wait_for(self.stopped.wait(), max(0.0, delay - (loop.time() - started)))
+      except asyncio.TimeoutError:
+        pass
+
+  def stop(self) -> None:
+    if self.stopped is not None:
+      self.stopped.set()
+
+  def stats(self) -> dict:
+    # Poll counters and poll to signal latency percentiles in milliseconds
+    latencies = np.fromiter(self.latencies, dtype=np.float64)
+    percentiles = np.percentile(latencies, [50, 95, 99]) if len(latencies) else [np.nan] * 3
+    return {**self.counts, 'latency_p50_ms': percentiles[0], 'latency_p95_ms': percentiles[1],
+            'latency_p99_ms': percentiles[2], 'latency_max_ms': latencies.max() if len(latencies) else np.nan}
+
+
+async def serve(daemon: LiveSignalDaemon) -> None:
+  # Run the daemon until SIGINT or SIGTERM, then close the sink and report
+  loop = asyncio.get_running_loop()
+  for signum in (signal.SIGINT, signal.SIGTERM):
+    loop.add_signal_handler(signum, daemon.stop)
+  try:
+    await daemon.run()
+  finally:
+    daemon.sink.close()
+    logger.info('Live signal daemon stopped: %s', daemon.stats())
+
+
+if __name__ == '__main__':
+  logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+  bundle = load_model()
+  with InsiderStore() as store:
+    daemon = LiveSignalDaemon(bundle['model'], JsonlSink(), bundle['features'], bundle['breakpoints'], insider_store=store)
+    asyncio.run(serve(daemon))
@@ -0,0 +1,209 @@
+import bisect
+import contextlib
+import json
+import logging
+import math
+import os
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+METRICS_FILEPATH = '../data/metrics/'
+
+# Upper bounds in seconds, spanning a cached HTTP call to a full nightly stage
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 900.0, math.inf)
+
+# Finished spans kept for export between write_jsonl calls
+SPAN_BUFFER = 10000
+
+
+class Histogram:
+  """
+  Fixed bucket histogram, cumulative on export as Prometheus expects.
+
+  Args:
+    bounds (tuple): Sorted bucket upper bounds, ending with math.inf.
+  """
+
+  def __init__(self, bounds: tuple = DEFAULT_BUCKETS):
+    self.bounds = bounds
+    self.counts = [0] * len(bounds)
+    self.count = 0
+    self.sum = 0.0
+
+  def observe(self, value: float) -> None:
+    self.counts[bisect.bisect_left(self.bounds, value)] += 1
+    self.count += 1
+    self.sum += value
+
+  def cumulative(self) -> list:
+    # (bound, observations at or below it) per bucket
+    total, buckets = 0, []
+    for bound, count in zip(self.bounds, self.counts):
+      total += count
+      buckets.append((bound, total))
+    return buckets
+
+
+def _label_key(labels: dict) -> tuple:
+  return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(key: tuple, extra: tuple = ()) -> str:
+  pairs = key + extra
+  if not pairs:
+    return ''
+  escaped = (value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+  return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_bound(bound: float) -> str:
+  return '+Inf' if bound == math.inf else repr(float(bound))
+
+
+class MetricsRegistry:
+  """
+  Process wide counters, gauges, histograms and timing spans, exported as JSON lines or in the
+  Prometheus text format.
+
+  Every series is a name plus keyword labels, e.g. inc('http_requests_total', api='av',
+  endpoint='TIME_SERIES_DAILY', status=200). Updates take one lock and a dict lookup, so
+  instrumenting per request or per stage costs microseconds; set enabled to False to make
+  them no-ops. Spans time a block, record it in the stage_seconds histogram and keep the span,
+  with its parent span on the same thread, for the JSON lines export.
+
+  Args:
+    buckets (tuple, optional): Histogram bucket upper bounds. Defaults to DEFAULT_BUCKETS.
+  """
+
+  def __init__(self, buckets: tuple = DEFAULT_BUCKETS):
+    self.buckets = buckets
+    self.enabled = True
+    self.lock = threading.Lock()
+    self.local = threading.local()
+    self.reset()
+
+  def reset(self) -> None:
+    with self.lock:
+      self.counters = {}
+      self.gauges = {}
+      self.histograms = {}
+      self.spans = deque(maxlen=SPAN_BUFFER)
+
+  def inc(self, name: str, value: float = 1, **labels) -> None:
+    if not self.enabled:
+      return
+    key = (name, _label_key(labels))
+    with self.lock:
+      self.counters[key] = self.counters.get(key, 0) + value
+
+  def set(self, name: str, value: float, **labels) -> None:
+    if not self.enabled:
+      return
+    with self.lock:
+      self.gauges[(name, _label_key(labels))] = value
+
+  def observe(self, name: str, value: float, **labels) -> None:
+    if not self.enabled:
+      return
+    key = (name, _label_key(labels))
+    with self.lock:
+      histogram = self.histograms.get(key)
+      if histogram is None:
+        histogram = self.histograms[key] = Histogram(self.buckets)
+      histogram.observe(value)
+
+  @contextlib.contextmanager
+  def span(self, name: str, **labels):
+    """
+    Times the enclosed block as one stage.
+
+    The block may set 'rows' and 'bytes' on the yielded dict; they are added to the
+    rows_processed_total and bytes_processed_total counters of the stage and kept on the span.
+
+    Args:
+      name (str): The stage, e.g. 'format_daily_prices'.
+      **labels: Extra labels of the stage_seconds series, e.g. endpoint.
+
+    Yields:
+      dict: The span record, finished with its duration when the block exits.
+    """
+    if not self.enabled:
+      yield {}
+      return
+    stack = self.local.__dict__.setdefault('stack', [])
+    record = {'type': 'span', 'name': name, 'labels': labels, 'parent': stack[-1] if stack else None, 'start': time.time()}
+    stack.append(name)
+    start = time.perf_counter()
+    try:
+      yield record
+    except BaseException:
+      record['error'] = True
+      raise
+    finally:
+      seconds = time.perf_counter() - start
+      stack.pop()
+      record['seconds'] = seconds
+      self.observe('stage_seconds', seconds, stage=name, **labels)
+      for unit in ('rows', 'bytes'):
+        if unit in record:
+          self.inc(f'{unit}_processed_total', record[unit], stage=name, **labels)
+      with self.lock:
+        self.spans.append(record)
+      logger.info('%s finished in %.2fs%s', name, seconds, f' ({record["rows"]} rows)' if 'rows' in record else '')
+
+  def snapshot(self) -> list:
+    # Every series as a JSON ready dict
+    with self.lock:
+      series = [{'type': 'counter', 'name': name, 'labels': dict(key), 'value': value} for (name, key), value in self.counters.items()]
+      series += [{'type': 'gauge', 'name': name, 'labels': dict(key), 'value': value} for (name, key), value in self.gauges.items()]
+      series += [{'type': 'histogram', 'name': name, 'labels': dict(key), 'count': histogram.count, 'sum': histogram.sum,
+                  'buckets': [[_format_bound(bound), count] for bound, count in histogram.cumulative()]}
+                 for (name, key), histogram in self.histograms.items()]
+    return series
+
+  def write_jsonl(self, path: str) -> None:
+    # Append the spans finished since the last write and a timestamped snapshot of every series
+    now = time.time()
+    with self.lock:
+      spans = list(self.spans)
+      self.spans.clear()
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'a') as f:
+      for record in spans + self.snapshot():
+        f.write(json.dumps({'time': record.get('start', now), **record}, default=str) + '\n')
+
+  def to_prometheus(self) -> str:
+    # The text exposition format, e.g. for a node exporter textfile collector
+    lines, typed = [], set()
+    def declare(name, kind):
+      if name not in typed:
+        typed.add(name)
+        lines.append(f'# TYPE {name} {kind}')
+    with self.lock:
+      for (name, key), value in sorted(self.counters.items()):
+        declare(name, 'counter')
+        lines.append(f'{name}{_format_labels(key)} {value}')
+      for (name, key), value in sorted(self.gauges.items()):
+        declare(name, 'gauge')
+        lines.append(f'{name}{_format_labels(key)} {value}')
+      for (name, key), histogram in sorted(self.histograms.items(), key=lambda item: item[0]):
+        declare(name, 'histogram')
+        for bound, count in histogram.cumulative():
+          lines.append(f'{name}_bucket{_format_labels(key, (("le", _format_bound(bound)),))} {count}')
+        lines.append(f'{name}_sum{_format_labels(key)} {histogram.sum}')
+        lines.append(f'{name}_count{_format_labels(key)} {histogram.count}')
+    return '\n'.join(lines) + '\n'
+
+  def write_prometheus(self, path: str) -> None:
+    # Replace the file atomically so a scraper never reads half an exposition
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path + '.tmp', 'w') as f:
+      f.write(self.to_prometheus())
+    os.replace(path + '.tmp', path)
+
+
+# The registry the pipeline modules report to
+METRICS = MetricsRegistry()
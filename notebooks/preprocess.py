@@ -1,74 +1,68 @@
 import pandas as pd
 import numpy as np
-import json
-import os
 from sklearn.base import BaseEstimator, TransformerMixin
+from labeling import ASOF_TOLERANCE, ForwardPriceLabeler, WEEKLY_HORIZONS
+from prices import load_daily_prices
+from price_store import PriceStore, STORE_FILEPATH
+from price_index import PriceIndex
+from insider_schema import compact_insiders, read_insiders
+from metrics import METRICS
+from combine import partitioned_merge
 
 
 class CombineFrames(BaseEstimator, TransformerMixin):
   
-  def __init__(self, prices_directory: str  = '.../data/ticker-prices/compact_daily/', pricepoint: str = 'Close', insiders_file: str = '.../data/qq_insiders.csv'):
+  def __init__(self, prices_directory: str  = '.../data/ticker-prices/compact_daily/', pricepoint: str = 'Close', insiders_file: str = '.../data/qq_insiders.csv', store_root: str = STORE_FILEPATH, partitioned: bool = False, combined_root: str = None, processes: int = None):
     self.prices_directory = prices_directory
     self.pricepoint = pricepoint
     self.insiders_file = insiders_file
+    self.store_root = store_root
+    # partitioned joins the price store with the trades of format_qq_insiders by ticker batches,
+    # streaming to a store at combined_root when given, see combine.partitioned_merge
+    self.partitioned = partitioned
+    self.combined_root = combined_root
+    self.processes = processes
     self.combined_df = pd.DataFrame()
   
-  def get_price(self, ticker, date):
-    try:
-      return self.data.loc[(ticker, pd.to_datetime(date)), 'Close']
-    except KeyError:
-      return np.nan
-    
-  def format_daily_prices(self):
-    
-    for filename in os.listdir(self.prices_directory):
-        if filename.startswith('av_query_') and filename.endswith('.csv'):
-            file_path = os.path.join(self.prices_directory, filename)
-            print(f'Reading {file_path}')
-            ticker_info = pd.read_csv(file_path, header=None, nrows=3, skiprows=1)
-            ticker = ticker_info.iloc[1, 1]  # 2nd column of the 3rd row
-            
-            if ticker != filename[len('av_query_'):-len('.csv')]:
-              print(f'Warning: filename {filename} does not match ticker {ticker}')
-              
-            df = pd.read_csv(file_path, skiprows=5)
-            
-            # Unearth from the metadata layer
-            df['Date'] = pd.to_datetime(df['5. Time Zone'])
-            df.drop(columns=['US/Eastern', '5. Time Zone'], inplace=True)
-            df[['Open', 'High', 'Low', 'Close', 'Volume']] = df['Unnamed: 2'].apply(lambda x: pd.Series({key: float(json.loads(x.replace("'", '"'))[f'{i}. {key.lower()}'].replace(',', '')) for i, key in enumerate(['Open', 'High', 'Low', 'Close', 'Volume'], 1)}))
-            df.drop(columns=['Unnamed: 2'], inplace=True)
-
-            # Ticker symbol column
-            df['Ticker'] = ticker
-
-            self.combined_df = pd.concat([self.combined_df, df], ignore_index=True)
+  def get_prices(self, tickers, dates, side: str = 'exact', tolerance=None) -> np.ndarray:
+    # Batched lookup against an index built once over the loaded panel. NaN where nothing matches
+    return self.price_index.lookup(tickers, dates, side, tolerance)
   
-    self.combined_df['Date'] = pd.to_datetime(self.combined_df['Date'])
-    self.combined_df.set_index(['Ticker', 'Date'], inplace=True)
-    self.combined_df.to_csv('agg_daily_prices.csv', index=False)
+  def get_price(self, ticker, date, side: str = 'exact', tolerance=None) -> float:
+    return self.get_prices([ticker], [date], side, tolerance)[0]
+    
+  def format_daily_prices(self, processes: int = None, refresh: bool = False):
+    # Read from the price store, building it from the per ticker CSVs when empty or refreshing
+    with METRICS.span('format_daily_prices') as span:
+      store = PriceStore(self.store_root)
+      if refresh or not store.tickers():
+        store.write(load_daily_prices(self.prices_directory, processes=processes))
+      self.combined_df = store.read_tickers()
+      self.price_index = PriceIndex(self.combined_df, self.pricepoint)
+      span['rows'] = len(self.combined_df)
     
     return self.combined_df
   
   def format_qq_insiders(self):  
 
-    try:
-      self.data = pd.read_csv(self.insiders_file)
-    except:
-      raise ValueError("The file name could not be read.")
-    self.data.dropna(axis=0, inplace=True)
-    self.data['Date'] = pd.to_datetime(self.data['Date'])
-    self.data['Ticker'] = self.data['Ticker'].astype(str)
-    self.data['Name'] = self.data['Name'].astype(str).str.lower()
-    self.data['fileDate'] = pd.to_datetime(self.data['fileDate'])
-    self.data.drop(columns=['Unnamed: 0'], inplace=True)
+    with METRICS.span('format_qq_insiders') as span:
+      try:
+        self.data = read_insiders(self.insiders_file)
+      except:
+        raise ValueError("The file name could not be read.")
+      span['rows'] = len(self.data)
     return self.data
 
   def fit(self, X, y=None):
     return self
   
   def transform(self, X, y=None):
-    self.daily_prices = self.daily_prices.merge(self.qq_insiders, on=['Date', 'Ticker'], how='left')
+    if self.partitioned:
+      combined = PriceStore(self.combined_root) if self.combined_root is not None else None
+      return partitioned_merge(PriceStore(self.store_root), self.data, combined, self.processes)
+    with METRICS.span('combine_frames') as span:
+      self.daily_prices = self.daily_prices.merge(self.qq_insiders, on=['Date', 'Ticker'], how='left')
+      span['rows'] = len(self.daily_prices)
     return self.daily_prices
 
 
@@ -76,94 +70,53 @@ class CombineFrames(BaseEstimator, TransformerMixin):
 class FormatData(BaseEstimator, TransformerMixin):
   
   
-  def __init__(self, insiders_data: pd.DataFrame or str or None = None, prices_data: pd.DataFrame or str or None = None):
+  def __init__(self, insiders_data: pd.DataFrame or str or None = None, prices_data: pd.DataFrame or str or None = None, store_root: str = STORE_FILEPATH):
     self.insiders = insiders_data
     self.prices = prices_data
+    self.store_root = store_root
     
-  def get_price(self, ticker, date):
-    try:
-      return self.data.loc[(ticker, pd.to_datetime(date)), 'Close']
-    except KeyError:
-      return np.nan
-    
-  def format_daily_prices(self, directory: str = '../data/ticker-prices/compact_daily/'):
-    directory = '../data/ticker-prices/compact_daily/'
-    combined_df = pd.DataFrame()
-
-    for filename in os.listdir(directory):
-        if filename.startswith('av_query_') and filename.endswith('.csv'):
-            file_path = os.path.join(directory, filename)
-            print(f'Reading {file_path}')
-            ticker_info = pd.read_csv(file_path, header=None, nrows=3, skiprows=1)
-            ticker = ticker_info.iloc[1, 1]  # 2nd column of the 3rd row
-            
-            if ticker != filename[len('av_query_'):-len('.csv')]:
-              print(f'Warning: filename {filename} does not match ticker {ticker}')
-              
-            df = pd.read_csv(file_path, skiprows=5)
-            
-            # Unearth from the metadata layer
-            df['Date'] = pd.to_datetime(df['5. Time Zone'])
-            df.drop(columns=['US/Eastern', '5. Time Zone'], inplace=True)
-            df[['Open', 'High', 'Low', 'Close', 'Volume']] = df['Unnamed: 2'].apply(lambda x: pd.Series({key: float(json.loads(x.replace("'", '"'))[f'{i}. {key.lower()}'].replace(',', '')) for i, key in enumerate(['Open', 'High', 'Low', 'Close', 'Volume'], 1)}))
-            df.drop(columns=['Unnamed: 2'], inplace=True)
-
-            # Ticker symbol column
-            df['Ticker'] = ticker
-
-            combined_df = pd.concat([combined_df, df], ignore_index=True)
+  def get_prices(self, tickers, dates, side: str = 'exact', tolerance=None) -> np.ndarray:
+    # Batched lookup against an index built once over the loaded panel. NaN where nothing matches
+    return self.price_index.lookup(tickers, dates, side, tolerance)
   
-    combined_df['Date'] = pd.to_datetime(combined_df['Date'])
-    combined_df.set_index(['Ticker', 'Date'], inplace=True)
-    self.data = combined_df
-    combined_df.to_csv('agg_daily_prices.csv', index=False)
+  def get_price(self, ticker, date, side: str = 'exact', tolerance=None) -> float:
+    return self.get_prices([ticker], [date], side, tolerance)[0]
+    
+  def format_daily_prices(self, directory: str = '../data/ticker-prices/compact_daily/', processes: int = None, refresh: bool = False):
+    # Read from the price store, building it from the per ticker CSVs when empty or refreshing
+    with METRICS.span('format_daily_prices') as span:
+      store = PriceStore(self.store_root)
+      if refresh or not store.tickers():
+        store.write(load_daily_prices(directory, processes=processes))
+      self.data = store.read_tickers()
+      self.price_index = PriceIndex(self.data)
+      span['rows'] = len(self.data)
     return self.data
   
   def format_qq_insiders(self):
-    if isinstance(self.data, str):
-      try:
-        self.data = pd.read_csv(self.data)
-      except:
-        raise ValueError("The file name could not be read.")
-    elif isinstance(self.data, pd.DataFrame):
-      pass
-    else:
-        raise ValueError("The data must be a pandas DataFrame or a table filename.")
-    self.data.dropna(axis=0, inplace=True)
-    self.data['Date'] = pd.to_datetime(self.data['Date'])
-    self.data['Ticker'] = self.data['Ticker'].astype(str)
-    self.data['Name'] = self.data['Name'].astype(str).str.lower()
-    self.data['fileDate'] = pd.to_datetime(self.data['fileDate'])
-    self.data.drop(columns=['Unnamed: 0'], inplace=True)
+    with METRICS.span('format_qq_insiders') as span:
+      if isinstance(self.data, str):
+        try:
+          self.data = read_insiders(self.data)
+        except:
+          raise ValueError("The file name could not be read.")
+      elif isinstance(self.data, pd.DataFrame):
+        compact_insiders(self.data)
+      else:
+          raise ValueError("The data must be a pandas DataFrame or a table filename.")
+      span['rows'] = len(self.data)
     return self.data
   
-  def combine_data(self):
-    self.insiders['price_1_week'] = self.insiders.apply(lambda x: self.get_price(x['Ticker'], x['Date'] + pd.Timedelta(days=7)), axis=1)
-    print('1 week done')
-    self.insiders['price_2_week'] = self.insiders.apply(lambda x: self.get_price(x['Ticker'], x['Date'] + pd.Timedelta(days=14)), axis=1)
-    print('2 week done')
-    self.insiders['price_3_week'] = self.insiders.apply(lambda x: self.get_price(x['Ticker'], x['Date'] + pd.Timedelta(days=21)), axis=1)
-    print('3 week done')
-    self.insiders['price_4_week'] = self.insiders.apply(lambda x: self.get_price(x['Ticker'], x['Date'] + pd.Timedelta(days=28)), axis=1)
-    print('4 week done')
-    self.insiders['price_5_week'] = self.insiders.apply(lambda x: self.get_price(x['Ticker'], x['Date'] + pd.Timedelta(days=35)), axis=1)
-    print('5 week done')
-    self.insiders['price_6_week'] = self.insiders.apply(lambda x: self.get_price(x['Ticker'], x['Date'] + pd.Timedelta(days=42)), axis=1)
-    print('6 week done')
-    self.insiders['price_7_week'] = self.insiders.apply(lambda x: self.get_price(x['Ticker'], x['Date'] + pd.Timedelta(days=49)), axis=1)
-    print('7 week done')
-    self.insiders['price_8_week'] = self.insiders.apply(lambda x: self.get_price(x['Ticker'], x['Date'] + pd.Timedelta(days=56)), axis=1)
-    print('8 week done')
-    self.insiders['price_9_week'] = self.insiders.apply(lambda x: self.get_price(x['Ticker'], x['Date'] + pd.Timedelta(days=63)), axis=1)
-    print('9 week done')
-    self.insiders['price_10_week'] = self.insiders.apply(lambda x: self.get_price(x['Ticker'], x['Date'] + pd.Timedelta(days=70)), axis=1)
-    print('10 week done')
-    self.insiders['price_11_week'] = self.insiders.apply(lambda x: self.get_price(x['Ticker'], x['Date'] + pd.Timedelta(days=77)), axis=1)
-    print('11 week done')
-    self.insiders['price_12_week'] = self.insiders.apply(lambda x: self.get_price(x['Ticker'], x['Date'] + pd.Timedelta(days=84)), axis=1)
-    print('12 week done')
-    self.insiders.to_csv('full_insiders_with_prices.csv', index=False)
-    return self.data
+  def combine_data(self, horizons: list = WEEKLY_HORIZONS, unit: str = 'days', asof: bool = False, tolerance=ASOF_TOLERANCE):
+    # Label every insider trade with its forward prices in a single vectorized pass over the store.
+    # As-of targets with no bar within tolerance days before them are NaN
+    with METRICS.span('combine_data') as span:
+      labeler = ForwardPriceLabeler(PriceStore(self.store_root), horizons=horizons, unit=unit, asof=asof, tolerance=tolerance)
+      with METRICS.span('label_forward_prices'):
+        self.insiders = labeler.fit_transform(self.insiders)
+      self.insiders.to_csv('full_insiders_with_prices.csv', index=False)
+      span['rows'] = len(self.insiders)
+    return self.insiders
   
   def fit(self, X, y=None):
     return self
@@ -0,0 +1,151 @@
+import pandas as pd
+import numpy as np
+from price_store import PriceStore
+
+# Dates are stored as day offsets from this origin so they pack into the low half of a key
+_DAY_OFFSET = 1 << 31
+
+SIDES = ('exact', 'backward', 'forward')
+
+
+def to_days(dates) -> tuple:
+  # Convert datetimes to integer days since the epoch, with a mask of the missing ones
+  dates = np.asarray(pd.to_datetime(pd.Series(np.ravel(dates))).to_numpy()).reshape(np.shape(dates))
+  missing = np.isnat(dates)
+  days = dates.astype('datetime64[D]').astype(np.int64)
+  days[missing] = 0
+  return days, missing
+
+
+def to_tolerance_days(tolerance) -> int:
+  # A tolerance as whole days, from a day count, a pd.Timedelta or a string such as '3D'
+  if tolerance is None:
+    return None
+  if isinstance(tolerance, (int, np.integer)):
+    return int(tolerance)
+  return pd.Timedelta(tolerance).days
+
+
+class PriceIndex:
+  """
+  Lookup index over a daily price panel, built once and queried in vectorized batches.
+
+  The panel is sorted once by (Ticker, Date) and packed into a single int64 key per bar (ticker
+  code in the high bits, day number in the low bits), so the bars of each ticker sit in one
+  contiguous, date sorted run. A batch of (ticker, date) queries is then answered with one
+  np.searchsorted call, and integer offsets from a hit step through a ticker's own bars.
+
+  Args:
+    prices (pd.DataFrame): Daily prices with Ticker and Date as columns or as the index.
+    pricepoint (str): The price column lookups return.
+  """
+
+  def __init__(self, prices: pd.DataFrame, pricepoint: str = 'Close'):
+    self.pricepoint = pricepoint
+    if not {'Ticker', 'Date'}.issubset(prices.columns):
+      prices = prices.reset_index()
+    prices = prices[['Ticker', 'Date', pricepoint]].dropna(subset=['Ticker', 'Date'])
+    days, _ = to_days(prices['Date'])
+    codes, self.tickers = pd.factorize(prices['Ticker'].astype(str), sort=True)
+    self.tickers = pd.Index(self.tickers)
+
+    # Sort by ticker then date, keeping the last bar when a (ticker, date) pair repeats
+    order = np.lexsort((days, codes))
+    keys = (codes[order].astype(np.int64) << 32) | (days[order] + _DAY_OFFSET)
+    last = np.append(keys[1:] != keys[:-1], True)
+    self.keys = keys[last]
+    self.codes = codes[order][last]
+    self.days = days[order][last]
+    self.values = prices[pricepoint].to_numpy(dtype=np.float64)[order][last]
+
+  @classmethod
+  def from_store(cls, store: PriceStore, tickers: list = None, pricepoint: str = 'Close') -> 'PriceIndex':
+    # Index over stored tickers, reading only the price column
+    return cls(store.read_tickers(tickers, columns=[pricepoint]), pricepoint)
+
+  def __len__(self) -> int:
+    return len(self.keys)
+
+  def ticker_codes(self, tickers) -> np.ndarray:
+    # Code of each ticker, -1 for tickers without prices. Only the distinct tickers are hashed
+    tickers = np.asarray(tickers, dtype=object)
+    queried, uniques = pd.factorize(tickers.ravel())
+    codes = self.tickers.get_indexer(pd.Index(uniques).astype(str))
+    return np.where(queried >= 0, codes[queried], -1).reshape(tickers.shape)
+
+  def search(self, targets: np.ndarray, side: str) -> np.ndarray:
+    # np.searchsorted over the keys, with the targets sorted first: random probes into a large
+    # key array miss the cache on almost every step, sorted ones walk it in order
+    flat = targets.ravel()
+    order = np.argsort(flat, kind='stable')
+    positions = np.empty(len(flat), dtype=np.int64)
+    positions[order] = np.searchsorted(self.keys, flat[order], side=side)
+    return positions.reshape(targets.shape)
+
+  def locate(self, codes: np.ndarray, days: np.ndarray, side: str = 'exact', tolerance=None) -> tuple:
+    """
+    Positions of the bars matching ticker codes and day numbers of any broadcastable shape.
+
+    Args:
+      codes (np.ndarray): Ticker codes from ticker_codes, -1 for unknown tickers.
+      days (np.ndarray): Days since the epoch.
+      side (str): 'exact' for a bar on the day, 'backward' for the last bar on or before it,
+                  'forward' for the first bar on or after it.
+      tolerance (int, str or pd.Timedelta, optional): Largest distance in days between the
+                                                     queried day and a backward or forward match.
+
+    Returns:
+      tuple: Bar positions and a mask of the queries that matched. Positions of misses are 0.
+    """
+    if side not in SIDES:
+      raise ValueError(f'side must be one of {SIDES}, not {side}')
+    codes, days = np.broadcast_arrays(np.asarray(codes, dtype=np.int64), np.asarray(days, dtype=np.int64))
+    if not len(self.keys):
+      return np.zeros(codes.shape, dtype=np.int64), np.zeros(codes.shape, dtype=bool)
+    targets = (codes << 32) | (days + _DAY_OFFSET)
+    if side == 'forward':
+      positions = self.search(targets, 'left')
+      found = positions < len(self.keys)
+    else:
+      positions = self.search(targets, 'right') - 1
+      found = positions >= 0
+    positions = np.where(found, positions, 0)
+    found &= (codes >= 0) & (self.codes[positions] == codes)
+    if side == 'exact':
+      found &= self.days[positions] == days
+    tolerance = to_tolerance_days(tolerance)
+    if tolerance is not None:
+      found &= np.abs(self.days[positions] - days) <= tolerance
+    return np.where(found, positions, 0), found
+
+  def offset(self, positions: np.ndarray, found: np.ndarray, steps) -> tuple:
+    # Move matched positions by a number of the ticker's own bars, missing when that leaves its run
+    positions, found, steps = np.broadcast_arrays(positions, found, np.asarray(steps, dtype=np.int64))
+    shifted = positions + steps
+    within = found & (shifted >= 0) & (shifted < len(self.keys))
+    shifted = np.where(within, shifted, 0)
+    within &= self.codes[shifted] == self.codes[positions]
+    return np.where(within, shifted, 0), within
+
+  def lookup(self, tickers, dates, side: str = 'exact', tolerance=None) -> np.ndarray:
+    """
+    Prices for a batch of (ticker, date) pairs in one call.
+
+    Args:
+      tickers (array-like): Ticker of each query.
+      dates (array-like): Date of each query, the same length as tickers.
+      side (str): 'exact', 'backward' (as of the date) or 'forward'. Defaults to 'exact'.
+      tolerance (int, str or pd.Timedelta, optional): Largest distance in days to a match.
+
+    Returns:
+      np.ndarray: The pricepoint of each query, NaN where nothing matched.
+    """
+    days, missing = to_days(dates)
+    positions, found = self.locate(self.ticker_codes(tickers), days, side, tolerance)
+    found &= ~missing
+    return np.where(found, self.values[positions], np.nan)
+
+  def dates(self, positions: np.ndarray, found: np.ndarray) -> np.ndarray:
+    # Dates of matched bars, NaT for misses
+    dates = self.days[positions].astype('datetime64[D]').astype('datetime64[ns]')
+    return np.where(found, dates, np.datetime64('NaT'))
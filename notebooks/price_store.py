@@ -0,0 +1,115 @@
+import pandas as pd
+import numpy as np
+import os
+import pyarrow as pa
+from urllib.parse import quote, unquote
+from prices import load_daily_prices
+
+STORE_FILEPATH = '../data/ticker-prices/store/'
+PARTITION_SUFFIX = '.arrow'
+
+
+def to_table(df: pd.DataFrame) -> pa.Table:
+  # Keep float NaN as values rather than nulls so float columns map back to numpy without a copy
+  return pa.table({column: pa.array(df[column].to_numpy()) if df[column].dtype.kind == 'f'
+                   else pa.array(df[column], from_pandas=True) for column in df.columns})
+
+
+class PriceStore:
+  """
+  Columnar daily price store with one memory-mapped Arrow IPC partition per ticker.
+
+  Each partition holds a ticker's bars sorted by Date, uncompressed, so reads map the file
+  and hand out Arrow buffers (and numpy views of them) without parsing or copying. Date
+  ranges are cut with a binary search over the sorted Date column.
+  """
+
+  def __init__(self, root: str = STORE_FILEPATH):
+    self.root = root
+
+  def partition_path(self, ticker: str) -> str:
+    return os.path.join(self.root, quote(str(ticker), safe='') + PARTITION_SUFFIX)
+
+  def tickers(self) -> list:
+    # Tickers with a partition in the store
+    if not os.path.isdir(self.root):
+      return []
+    return sorted(unquote(filename[:-len(PARTITION_SUFFIX)]) for filename in os.listdir(self.root)
+                  if filename.endswith(PARTITION_SUFFIX))
+
+  def __contains__(self, ticker: str) -> bool:
+    return os.path.exists(self.partition_path(ticker))
+
+  def write_partition(self, ticker: str, df: pd.DataFrame) -> None:
+    # Replace one ticker's partition with a frame holding a Date column
+    os.makedirs(self.root, exist_ok=True)
+    df = df.drop(columns=['Ticker'], errors='ignore').sort_values('Date', kind='stable')
+    table = to_table(df)
+    path = self.partition_path(ticker)
+    with pa.OSFile(path + '.tmp', 'wb') as sink:
+      with pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    os.replace(path + '.tmp', path)
+
+  def write(self, df: pd.DataFrame) -> None:
+    # Write a (Ticker, Date) panel, either indexed or as columns, one partition per ticker
+    if 'Ticker' not in df.columns:
+      df = df.reset_index()
+    for ticker, partition in df.groupby('Ticker', sort=False, observed=True):
+      self.write_partition(ticker, partition)
+
+  def read_table(self, ticker: str, start=None, end=None) -> pa.Table:
+    # Memory-mapped, zero-copy Arrow table for one ticker, optionally cut to [start, end]. The
+    # table's buffers keep the mapping alive, so the file is closed as soon as it is read
+    with pa.memory_map(self.partition_path(ticker), 'r') as source:
+      table = pa.ipc.open_file(source).read_all()
+    if start is None and end is None:
+      return table
+    dates = table.column('Date').to_numpy()
+    lower = 0 if start is None else np.searchsorted(dates, np.datetime64(pd.Timestamp(start)), side='left')
+    upper = len(dates) if end is None else np.searchsorted(dates, np.datetime64(pd.Timestamp(end)), side='right')
+    return table.slice(lower, upper - lower)
+
+  def column(self, ticker: str, name: str, start=None, end=None) -> np.ndarray:
+    # Read-only numpy view of one column, backed by the mapped file when it has no nulls
+    return self.read_table(ticker, start, end).column(name).to_numpy()
+
+  def read_ticker(self, ticker: str, columns: list = None, start=None, end=None) -> pd.DataFrame:
+    table = self.read_table(ticker, start, end)
+    if columns is not None:
+      table = table.select(['Date'] + [column for column in columns if column != 'Date'])
+    return table.to_pandas()
+
+  def read_tickers(self, tickers: list = None, columns: list = None, start=None, end=None) -> pd.DataFrame:
+    """
+    Reads a set of tickers into one (Ticker, Date) indexed frame.
+
+    Args:
+      tickers (list, optional): Tickers to read. Tickers missing from the store are skipped.
+                                Defaults to every ticker in the store.
+      columns (list, optional): Columns to read besides Date. Defaults to all of them.
+      start, end (optional): Inclusive date bounds.
+
+    Returns:
+      pd.DataFrame: The requested bars indexed by (Ticker, Date).
+    """
+    tickers = self.tickers() if tickers is None else [ticker for ticker in tickers if ticker in self]
+    frames = []
+    for ticker in tickers:
+      df = self.read_ticker(ticker, columns, start, end)
+      df.insert(0, 'Ticker', ticker)
+      frames.append(df)
+    if not frames:
+      return pd.DataFrame(columns=['Ticker', 'Date'] + (columns or [])).set_index(['Ticker', 'Date'])
+    return pd.concat(frames, ignore_index=True).set_index(['Ticker', 'Date'])
+
+  def read_range(self, start=None, end=None, columns: list = None) -> pd.DataFrame:
+    # Every ticker's bars between start and end
+    return self.read_tickers(None, columns, start, end)
+
+  @classmethod
+  def from_csv_directory(cls, directory: str, root: str = STORE_FILEPATH, processes: int = None) -> 'PriceStore':
+    # Build the store from a directory of av_query_<TICKER>.csv files
+    store = cls(root)
+    store.write(load_daily_prices(directory, processes=processes))
+    return store
@@ -0,0 +1,75 @@
+import threading
+import time
+
+
+class TokenBucket:
+  """
+  Thread-safe token bucket refilled continuously at a fixed rate.
+
+  Args:
+    rate (float): Tokens added per second.
+    capacity (float, optional): Maximum tokens held, i.e. the largest burst. Defaults to 1,
+                                which paces calls evenly at the refill rate.
+  """
+
+  def __init__(self, rate: float, capacity: float = 1, clock=time.monotonic):
+    self.rate = rate
+    self.capacity = capacity
+    self.clock = clock
+    self.tokens = capacity
+    self.updated = clock()
+
+  def refill(self) -> None:
+    now = self.clock()
+    self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+    self.updated = now
+
+  def wait_time(self, tokens: float = 1) -> float:
+    # Seconds until the bucket holds enough tokens, after refilling
+    self.refill()
+    return max(0.0, (tokens - self.tokens) / self.rate)
+
+  def consume(self, tokens: float = 1) -> None:
+    self.tokens -= tokens
+
+
+class RateLimiter:
+  """
+  Combines per second, per minute and per day token buckets behind one blocking acquire().
+
+  A call only proceeds once every bucket has a token, and takes one from each atomically, so
+  concurrent workers share the quota without exceeding any of the limits.
+
+  Args:
+    calls_per_second (float, optional): Limit on calls per second.
+    calls_per_minute (float, optional): Limit on calls per minute.
+    calls_per_day (float, optional): Limit on calls per day.
+    burst (float, optional): Calls allowed back to back before per second and per minute pacing
+                             applies. Defaults to 1.
+  """
+
+  def __init__(self, calls_per_second: float = None, calls_per_minute: float = None, calls_per_day: float = None, burst: float = 1):
+    self.buckets = []
+    if calls_per_second is not None:
+      self.buckets.append(TokenBucket(calls_per_second, min(burst, calls_per_second)))
+    if calls_per_minute is not None:
+      self.buckets.append(TokenBucket(calls_per_minute / 60, min(burst, calls_per_minute)))
+    if calls_per_day is not None:
+      # The daily quota can be spent at once, it just never refills faster than the day allows
+      self.buckets.append(TokenBucket(calls_per_day / 86400, calls_per_day))
+    self.lock = threading.Lock()
+    self.waited = 0.0
+
+  def acquire(self) -> float:
+    # Block until a call is allowed and return the seconds spent waiting
+    waited = 0.0
+    while True:
+      with self.lock:
+        wait = max((bucket.wait_time() for bucket in self.buckets), default=0.0)
+        if wait == 0.0:
+          for bucket in self.buckets:
+            bucket.consume()
+          self.waited += waited
+          return waited
+      time.sleep(wait)
+      waited += wait
@@ -0,0 +1,126 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from metrics import METRICS
+
+CACHE_FILEPATH = '../data/cache/'
+
+# Seconds a response stays fresh, by AlphaVantage function or Quiver extension.
+# Endpoints without an entry are not cached unless a default_ttl is given.
+DEFAULT_TTLS = {
+  'OVERVIEW': 7 * 86400,
+  'INCOME_STATEMENT': 7 * 86400,
+  'EMA': 86400,
+  'SMA': 86400,
+  'RSI': 86400,
+  'BBANDS': 86400,
+  'beta/live/insiders': 5 * 60,
+}
+
+# Credentials never take part in the cache key
+SECRET_PARAMS = ('apikey', 'api_key', 'token')
+
+
+class ResponseCache:
+  """
+  On-disk cache of decoded JSON responses with per-endpoint TTLs and size-bounded LRU eviction.
+
+  Entries are keyed by endpoint and normalized params (sorted, API key removed) and stored
+  gzip-compressed. A hit refreshes the entry's mtime, which is what eviction orders by, so
+  the least recently used entries go first once the cache grows past max_bytes.
+
+  Args:
+    directory (str): Where entries are stored.
+    max_bytes (int): Size bound for the compressed entries.
+    ttls (dict, optional): Seconds to keep responses fresh per endpoint. Defaults to DEFAULT_TTLS.
+    default_ttl (float, optional): TTL for endpoints missing from ttls. Defaults to not caching them.
+  """
+
+  def __init__(self, directory: str = CACHE_FILEPATH, max_bytes: int = 512 * 2**20, ttls: dict = None, default_ttl: float = None):
+    self.directory = directory
+    self.max_bytes = max_bytes
+    self.ttls = DEFAULT_TTLS if ttls is None else ttls
+    self.default_ttl = default_ttl
+    self.lock = threading.Lock()
+    self.hits = 0
+    self.misses = 0
+    self.evictions = 0
+    os.makedirs(directory, exist_ok=True)
+    self.size = sum(entry.stat().st_size for entry in os.scandir(directory) if entry.name.endswith('.json.gz'))
+
+  def ttl(self, endpoint: str) -> float:
+    return self.ttls.get(endpoint, self.default_ttl)
+
+  def path(self, endpoint: str, params: dict) -> str:
+    normalized = sorted((str(key), str(value)) for key, value in params.items() if key.lower() not in SECRET_PARAMS)
+    digest = hashlib.sha256(json.dumps([endpoint, normalized]).encode()).hexdigest()
+    return os.path.join(self.directory, f'{endpoint.replace("/", "-")}-{digest}.json.gz')
+
+  def get(self, endpoint: str, params: dict):
+    # The cached payload, or None when the endpoint is uncached, missing or expired
+    ttl = self.ttl(endpoint)
+    if ttl is None:
+      return None
+    path = self.path(endpoint, params)
+    try:
+      with gzip.open(path, 'rt') as f:
+        entry = json.load(f)
+    except (FileNotFoundError, OSError, ValueError):
+      entry = None
+    with self.lock:
+      if entry is None or time.time() - entry['created'] > ttl:
+        self.misses += 1
+        hit = False
+      else:
+        self.hits += 1
+        hit = True
+        # Mark the entry recently used. Another process sharing the directory may have
+        # evicted it since the read, which leaves the payload already read perfectly good
+        try:
+          os.utime(path)
+        except FileNotFoundError:
+          pass
+      ratio = self.hits / (self.hits + self.misses)
+    METRICS.inc('cache_requests_total', endpoint=endpoint, result='hit' if hit else 'miss')
+    METRICS.set('cache_hit_ratio', ratio)
+    if not hit:
+      return None
+    return entry['data']
+
+  def put(self, endpoint: str, params: dict, data) -> None:
+    if self.ttl(endpoint) is None:
+      return
+    path = self.path(endpoint, params)
+    payload = gzip.compress(json.dumps({'created': time.time(), 'data': data}).encode())
+    with self.lock:
+      previous = os.path.getsize(path) if os.path.exists(path) else 0
+      with open(path + '.tmp', 'wb') as f:
+        f.write(payload)
+      os.replace(path + '.tmp', path)
+      self.size += len(payload) - previous
+      if self.size > self.max_bytes:
+        self.evict()
+
+  def evict(self) -> None:
+    # Drop least recently used entries until the cache fits in max_bytes. Caller holds the lock
+    entries = sorted((entry for entry in os.scandir(self.directory) if entry.name.endswith('.json.gz')), key=lambda entry: entry.stat().st_mtime)
+    for entry in entries:
+      if self.size <= self.max_bytes:
+        break
+      size = entry.stat().st_size
+      os.remove(entry.path)
+      self.size -= size
+      self.evictions += 1
+
+  def stats(self) -> dict:
+    # Hit and miss counts, i.e. calls the cache saved from the API quota
+    with self.lock:
+      lookups = self.hits + self.misses
+      return {'hits': self.hits,
+              'misses': self.misses,
+              'hit_ratio': self.hits / lookups if lookups else 0.0,
+              'evictions': self.evictions,
+              'bytes': self.size}
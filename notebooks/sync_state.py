@@ -0,0 +1,51 @@
+import pandas as pd
+import numpy as np
+import json
+import os
+import threading
+
+
+class HighWaterMarks:
+  """
+  Last stored date per (endpoint, key), persisted as JSON so incremental runs only ask for
+  what is missing.
+
+  Args:
+    path (str): JSON file holding {endpoint: {key: 'YYYY-MM-DD'}}.
+  """
+
+  def __init__(self, path: str):
+    self.path = path
+    self.lock = threading.Lock()
+    self.marks = {}
+    if os.path.exists(path):
+      with open(path, 'r') as f:
+        self.marks = json.load(f)
+
+  def get(self, endpoint: str, key: str) -> pd.Timestamp:
+    mark = self.marks.get(endpoint, {}).get(key)
+    return None if mark is None else pd.Timestamp(mark)
+
+  def update(self, endpoint: str, key: str, dates) -> pd.Timestamp:
+    # Move the mark forward to the latest parseable date, ignoring non-date labels
+    latest = pd.to_datetime(pd.Series(dates, dtype=object), errors='coerce', format='%Y-%m-%d').max()
+    if pd.isna(latest):
+      return self.get(endpoint, key)
+    with self.lock:
+      current = self.marks.get(endpoint, {}).get(key)
+      if current is None or pd.Timestamp(current) < latest:
+        self.marks.setdefault(endpoint, {})[key] = latest.strftime('%Y-%m-%d')
+        self.save()
+    return self.get(endpoint, key)
+
+  def save(self) -> None:
+    os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+    with open(self.path + '.tmp', 'w') as f:
+      json.dump(self.marks, f, indent=2, sort_keys=True)
+    os.replace(self.path + '.tmp', self.path)
+
+
+def business_days_since(mark: pd.Timestamp, today: pd.Timestamp = None) -> int:
+  # Trading days after the mark up to and including today, ignoring exchange holidays
+  today = pd.Timestamp.today().normalize() if today is None else today
+  return int(np.busday_count((mark + pd.Timedelta(days=1)).date(), (today + pd.Timedelta(days=1)).date()))
@@ -0,0 +1,253 @@
+import pandas as pd
+import numpy as np
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor
+from sklearn.linear_model import Ridge
+from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
+from sklearn.model_selection import ParameterGrid, TimeSeriesSplit
+from sklearn.neighbors import KNeighborsRegressor
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import StandardScaler
+from sklearn.tree import DecisionTreeRegressor
+from threadpoolctl import threadpool_limits
+from backtest import total_value_deciles
+from labeling import WEEKLY_HORIZONS, horizon_column
+
+logger = logging.getLogger(__name__)
+
+MATRIX_DIRECTORY = '../data/models/feature_matrix/'
+SWEEP_RESULTS_FILEPATH = '../data/models/sweep_results.csv'
+
+# The numeric features notebook 04 trains on, plus the raw trade values they derive from
+FEATURE_COLUMNS = ['Shares', 'PricePerShare', 'SharesOwnedFollowing', 'total_value', 'change_in_holdings',
+                   'TraderFrequency', 'individual_transactions_per_trade', 'investors_per_trade',
+                   'value_cat', 'Purchase', 'Sale', 'Acquired']
+
+MODELS = {
+  'tree': DecisionTreeRegressor,
+  'forest': RandomForestRegressor,
+  'boosting': GradientBoostingRegressor,
+  'ridge': Ridge,
+  'knn': KNeighborsRegressor,
+}
+
+# Models sensitive to feature scale, fitted behind a StandardScaler
+SCALED_MODELS = {'ridge', 'knn'}
+
+
+def feature_frame(df: pd.DataFrame, features: list = FEATURE_COLUMNS, breakpoints: np.ndarray = None) -> pd.DataFrame:
+  # Derived indicator and decile columns of the labeled insider frame, as float32. Scoring new
+  # filings passes the training breakpoints, as a few rows have no deciles of their own
+  derived = pd.DataFrame({
+    'value_cat': total_value_deciles(df['total_value'], breakpoints)[0],
+    'Purchase': df['TransactionCode'].astype(str) == 'P',
+    'Sale': df['TransactionCode'].astype(str) == 'S',
+    'Acquired': df['AcquiredDisposedCode'].astype(str) == 'A',
+  }, index=df.index)
+  frame = pd.concat([df.drop(columns=derived.columns, errors='ignore'), derived], axis=1)
+  return frame[features].astype(np.float32)
+
+
+class FeatureMatrix:
+  """
+  Feature matrix, targets and trade days saved once as .npy files and opened memory-mapped.
+
+  Rows are sorted by trade Date, so every time-ordered fold is a contiguous slice. Worker
+  processes open the same files read-only and share the operating system's page cache
+  instead of each receiving a pickled copy of the matrix.
+
+  Args:
+    directory (str): Directory holding a matrix written by build.
+  """
+
+  def __init__(self, directory: str = MATRIX_DIRECTORY):
+    self.directory = directory
+    with open(os.path.join(directory, 'meta.json'), 'r') as f:
+      meta = json.load(f)
+    self.features = meta['features']
+    self.targets = meta['targets']
+    self.horizon_days = meta['horizon_days']
+    self.breakpoints = np.array(meta['breakpoints']) if 'breakpoints' in meta else None
+    self.X = np.load(os.path.join(directory, 'X.npy'), mmap_mode='r')
+    self.Y = np.load(os.path.join(directory, 'Y.npy'), mmap_mode='r')
+    self.days = np.load(os.path.join(directory, 'days.npy'), mmap_mode='r')
+
+  @classmethod
+  def build(cls, df: pd.DataFrame, directory: str = MATRIX_DIRECTORY, horizons: list = WEEKLY_HORIZONS, features: list = FEATURE_COLUMNS, base_column: str = None) -> 'FeatureMatrix':
+    """
+    Builds the matrix from a labeled insider frame and saves it.
+
+    Args:
+      df (pd.DataFrame): Insider trades with Date, the features and the price_N_week labels
+                         of NewAttributeCreator and ForwardPriceLabeler.
+      directory (str): Where to write the matrix.
+      horizons (list): Calendar day horizons whose labels become targets.
+      features (list): Feature columns, derived ones included.
+      base_column (str, optional): Predict the label relative to this price, label / base - 1,
+                                   instead of the raw forward price.
+
+    Returns:
+      FeatureMatrix: The saved matrix, opened memory-mapped.
+    """
+    df = df[df['Date'].notna()]
+    order = np.argsort(pd.to_datetime(df['Date']).to_numpy(), kind='stable')
+    df = df.iloc[order]
+    targets = [horizon_column(horizon) for horizon in horizons]
+    Y = df[targets].to_numpy(dtype=np.float64)
+    if base_column is not None:
+      with np.errstate(divide='ignore', invalid='ignore'):
+        Y = Y / df[base_column].to_numpy(dtype=np.float64)[:, None] - 1
+      Y[~np.isfinite(Y)] = np.nan
+    days = pd.to_datetime(df['Date']).to_numpy().astype('datetime64[D]').astype(np.int64)
+
+    # Deciles over every row, for a model fitted on the whole history to score new filings with.
+    # Cross-validation refits them per fold, see fold_value_deciles
+    breakpoints = total_value_deciles(df['total_value'])[1]
+    os.makedirs(directory, exist_ok=True)
+    np.save(os.path.join(directory, 'X.npy'), np.ascontiguousarray(feature_frame(df, features, breakpoints).to_numpy()))
+    np.save(os.path.join(directory, 'Y.npy'), Y)
+    np.save(os.path.join(directory, 'days.npy'), days)
+    with open(os.path.join(directory, 'meta.json'), 'w') as f:
+      json.dump({'features': list(features), 'targets': targets, 'horizon_days': list(map(int, horizons)),
+                 'breakpoints': breakpoints.tolist()}, f)
+    logger.info('Saved a %d x %d feature matrix with %d targets to %s', len(days), len(features), len(targets), directory)
+    return cls(directory)
+
+  def __len__(self) -> int:
+    return len(self.days)
+
+  def folds(self, n_splits: int = 5) -> list:
+    # (train_end, test_start, test_end) row bounds of each expanding, time-ordered fold
+    return [(int(train[-1]) + 1, int(test[0]), int(test[-1]) + 1) for train, test in TimeSeriesSplit(n_splits).split(self.days)]
+
+  def train_stop(self, train_end: int, test_start: int, horizon_days: int) -> int:
+    # Last training row (exclusive) whose label window closes before the test period opens.
+    # A trade's label looks horizon_days ahead, so later training rows would overlap the test
+    # period's prices. Rows are date sorted, so the purge only shortens the training prefix
+    purge = np.searchsorted(self.days, self.days[test_start] - horizon_days, side='left')
+    return int(min(train_end, purge))
+
+
+def fold_value_deciles(features: list, X_train: np.ndarray, X_test: np.ndarray) -> None:
+  # Recode value_cat of a fold's rows in place with deciles of its training rows' total_value
+  # alone. The saved column uses deciles of the whole matrix, test periods included
+  if 'value_cat' not in features or 'total_value' not in features:
+    return
+  value, decile = features.index('total_value'), features.index('value_cat')
+  breakpoints = total_value_deciles(X_train[:, value])[1]
+  for X in (X_train, X_test):
+    X[:, decile] = total_value_deciles(X[:, value], breakpoints)[0]
+
+
+def fit_fold(matrix: FeatureMatrix, target: str, model: str, params: dict, fold: tuple) -> dict:
+  """
+  Fits one model on one fold's training rows and scores it on the fold's test rows.
+
+  Args:
+    matrix (FeatureMatrix): The shared feature matrix.
+    target (str): The price_N_week target.
+    model (str): A key of MODELS.
+    params (dict): The model's hyperparameters.
+    fold (tuple): Row bounds from FeatureMatrix.folds.
+
+  Returns:
+    dict: The fold's RMSE, MAE, R2, row counts and fit seconds.
+  """
+  train_end, test_start, test_end = fold
+  column = matrix.targets.index(target)
+  stop = matrix.train_stop(train_end, test_start, matrix.horizon_days[column])
+  X_train, y_train = matrix.X[:stop], matrix.Y[:stop, column]
+  X_test, y_test = matrix.X[test_start:test_end], matrix.Y[test_start:test_end, column]
+  train_rows, test_rows = ~np.isnan(y_train), ~np.isnan(y_test)
+  result = {'train_rows': int(train_rows.sum()), 'test_rows': int(test_rows.sum())}
+  if result['train_rows'] < 2 or result['test_rows'] < 2:
+    return {**result, 'rmse': np.nan, 'mae': np.nan, 'r2': np.nan, 'fit_seconds': 0.0}
+
+  estimator = MODELS[model](**params)
+  # The pool supplies the parallelism, so models stay single threaded
+  if 'n_jobs' in estimator.get_params():
+    estimator.set_params(n_jobs=1)
+  # Seeded unless the grid sets a seed, so scores do not depend on which worker fitted them
+  if 'random_state' in estimator.get_params() and 'random_state' not in params:
+    estimator.set_params(random_state=0)
+  if model in SCALED_MODELS:
+    estimator = make_pipeline(StandardScaler(), estimator)
+  # Boolean indexing copies the rows out of the read-only memory map
+  X_fit, X_score = X_train[train_rows], X_test[test_rows]
+  fold_value_deciles(matrix.features, X_fit, X_score)
+  start = time.perf_counter()
+  estimator.fit(X_fit, y_train[train_rows])
+  fit_seconds = time.perf_counter() - start
+  predicted = estimator.predict(X_score)
+  return {**result,
+          'rmse': np.sqrt(mean_squared_error(y_test[test_rows], predicted)),
+          'mae': mean_absolute_error(y_test[test_rows], predicted),
+          'r2': r2_score(y_test[test_rows], predicted),
+          'fit_seconds': fit_seconds}
+
+
+# The memory-mapped matrix each pool worker fits against, opened once per worker process
+_WORKER_MATRIX = None
+
+
+def _init_worker(directory: str) -> None:
+  global _WORKER_MATRIX
+  # One BLAS/OpenMP thread per worker so the processes do not oversubscribe the cores
+  threadpool_limits(1)
+  _WORKER_MATRIX = FeatureMatrix(directory)
+
+
+def _fit_task(task: tuple) -> dict:
+  target, model, params, fold = task
+  return fit_fold(_WORKER_MATRIX, target, model, params, fold)
+
+
+def run_sweep(matrix: FeatureMatrix, grid: dict, targets: list = None, n_splits: int = 5, processes: int = None, path: str = SWEEP_RESULTS_FILEPATH) -> pd.DataFrame:
+  """
+  Cross-validates every target x model x hyperparameter setting and writes a results table.
+
+  Each (setting, fold) fit is one task, so the pool stays busy until the last few fits and
+  the sweep scales with the number of processes. Workers receive only the matrix directory
+  and open it memory-mapped; tasks carry the target, model, parameters and fold bounds.
+
+  Args:
+    matrix (FeatureMatrix): The saved feature matrix.
+    grid (dict): Model name to a parameter grid for sklearn's ParameterGrid, e.g.
+                 {'tree': {'max_depth': [4, 8]}, 'forest': {'n_estimators': [200], 'max_features': [0.5]}}.
+    targets (list, optional): Targets to fit. Defaults to every target of the matrix.
+    n_splits (int): Number of expanding, time-ordered folds.
+    processes (int, optional): Fit in a process pool of this size. Defaults to fitting serially.
+    path (str, optional): CSV the results table is written to. None to skip writing.
+
+  Returns:
+    pd.DataFrame: One row per target, model and parameter setting with the mean and standard
+                  deviation of each fold score, total fit seconds and the number of folds scored.
+  """
+  targets = matrix.targets if targets is None else targets
+  folds = matrix.folds(n_splits)
+  settings = [(target, model, params) for target in targets for model, model_grid in grid.items() for params in ParameterGrid(model_grid)]
+  # Later folds train on more rows; starting them first leaves the short fits to fill in at the end
+  tasks = [(target, model, params, fold) for fold in reversed(folds) for target, model, params in settings]
+  logger.info('Fitting %d settings x %d folds = %d fits', len(settings), len(folds), len(tasks))
+
+  if processes is not None and processes > 1:
+    with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker, initargs=(matrix.directory,)) as executor:
+      fits = list(executor.map(_fit_task, tasks))
+  else:
+    fits = [fit_fold(matrix, *task) for task in tasks]
+
+  scores = pd.DataFrame(fits)
+  scores['target'] = [task[0] for task in tasks]
+  scores['model'] = [task[1] for task in tasks]
+  scores['params'] = [json.dumps(task[2], sort_keys=True) for task in tasks]
+  results = scores.groupby(['target', 'model', 'params'], sort=False).agg(
+    rmse=('rmse', 'mean'), rmse_std=('rmse', 'std'), mae=('mae', 'mean'), mae_std=('mae', 'std'),
+    r2=('r2', 'mean'), r2_std=('r2', 'std'), fit_seconds=('fit_seconds', 'sum'), folds=('rmse', 'count')).reset_index()
+  if path is not None:
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    results.to_csv(path, index=False)
+  return results
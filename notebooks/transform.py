@@ -3,34 +3,49 @@ import numpy as np
 import os
 import json
 from sklearn.base import BaseEstimator, TransformerMixin
+from insider_features import InsiderFeatureEngine
+from insider_schema import compact_insiders
+from metrics import METRICS
 
 class NewAttributeCreator(BaseEstimator, TransformerMixin):
+  """
+  Adds value, holdings and trader activity features to the insider frame.
+
+  Args:
+    feature_engine (InsiderFeatureEngine, optional): Persistent count state for TraderFrequency,
+                                                     individual_transactions_per_trade and
+                                                     investors_per_trade. transform() folds X into it
+                                                     as a new batch, so only pass new filings. Defaults
+                                                     to a fresh engine per call, i.e. counts over X alone.
+  """
   
-  def __init__(self, remove_zero_shares: bool = True, categorize_movement: bool = False, normalize_movemnt: bool = False, groupby: list = ['Ticker', 'Date', 'Name', 'TransactionCode', 'AcquiredDisposedCode'], format_frame: bool = True):
+  def __init__(self, remove_zero_shares: bool = True, categorize_movement: bool = False, normalize_movemnt: bool = False, groupby: list = ['Ticker', 'Date', 'Name', 'TransactionCode', 'AcquiredDisposedCode'], format_frame: bool = True, feature_engine: InsiderFeatureEngine = None):
     self.remove_zero_shares = remove_zero_shares
     self.categorize = categorize_movement
     self.normalize = normalize_movemnt
     self.groupby = groupby
     self.format_frame = format_frame
+    self.feature_engine = feature_engine
     self.data = pd.DataFrame()
   
   def fit(self, X: pd.DataFrame, y=None):
     self.data = X
     if self.format_frame:
-      self.data.dropna(axis=0, inplace=True)
-      self.data['Date'] = pd.to_datetime(self.data['Date'])
-      self.data['Ticker'] = self.data['Ticker'].astype(str)
-      self.data['Name'] = self.data['Name'].astype(str).str.lower()
-      self.data['fileDate'] = pd.to_datetime(self.data['fileDate'])
+      # Categorical strings and downcast numerics; Names already lowercased upstream are left alone
+      compact_insiders(self.data)
     return self.data
   
   def transform(self, X, y=None):
-    if self.remove_zero_shares:
-      self.data = X[X['Shares'] != 0 and X['PricePerShare'] != 0]
-    self.data['total_value'] = self.data['Shares'] * self.data['PricePerShare']
-    self.data['change_in_holdings'] = (self.data['Shares'] / (x['Shares'] + self.data['SharesOwnedFollowing']))
-    self.data['individual_transactions_per_trade'] = self.data.groupby(['Name', 'Ticker'])['Name'].transform('count')
-    self.data['investors_per_trade'] = self.data.groupby(['TransactionCode', 'Ticker'])['Name'].transform('nunique')
-    self.data['TraderFrequency'] = self.data.groupby('Name')['Name'].transform('count')
+    with METRICS.span('new_attributes') as span:
+      if self.remove_zero_shares:
+        self.data = X[(X['Shares'] != 0) & (X['PricePerShare'] != 0)]
+      self.data['total_value'] = self.data['Shares'] * self.data['PricePerShare']
+      self.data['change_in_holdings'] = (self.data['Shares'] / (self.data['Shares'] + self.data['SharesOwnedFollowing']))
+      # Grouped counts come from the incremental engine, which only has to see the new rows
+      engine = InsiderFeatureEngine() if self.feature_engine is None else self.feature_engine
+      engine.update(self.data)
+      features = engine.transform(self.data)
+      self.data[features.columns] = features
+      span['rows'] = len(self.data)
 
     return self.data
\ No newline at end of file